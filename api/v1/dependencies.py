@@ -0,0 +1,24 @@
+"""
+Providers for the services the routers depend on, injected with Depends(). Each service is
+constructed once per worker process, on first use, and wired to the pooled HTTP client, caches
+and coin index by the lifespan hook in main.py. Tests can swap one through app.dependency_overrides.
+"""
+from functools import lru_cache
+from ciyexa_backend.services.crypto_data_service import CryptoDataService
+from ciyexa_backend.services.enrichment import DataEnricher
+from ciyexa_backend.services.llm_agent import LLMAgentService
+
+
+@lru_cache(maxsize=None)
+def get_crypto_service() -> CryptoDataService:
+    return CryptoDataService()
+
+
+@lru_cache(maxsize=None)
+def get_llm_service() -> LLMAgentService:
+    return LLMAgentService()
+
+
+@lru_cache(maxsize=None)
+def get_data_enricher() -> DataEnricher:
+    return DataEnricher(get_crypto_service()) # One instance, so its concurrency cap spans all requests
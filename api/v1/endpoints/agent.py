@@ -1,108 +1,245 @@
-from fastapi import APIRouter, HTTPException, status
+import json
+from datetime import datetime
+import time
+from typing import AsyncIterator, Callable, Hashable, NamedTuple, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from ciyexa_backend.api.v1.dependencies import get_crypto_service, get_data_enricher, get_llm_service
 from ciyexa_backend.api.v1.schemas.agent import AgentQuery, AgentResponse
-from ciyexa_backend.services.llm_agent import LLMAgentService
-from ciyexa_backend.services.crypto_data_service import CryptoDataService
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.core.metrics import CHAT_STAGE_DURATION, LLM_PROMPT_TOKENS, stage_timer
+from ciyexa_backend.services.admission import AdmissionController, AdmissionRejected
+from ciyexa_backend.services.llm_agent import LLMAgentService, LLMServiceError
+from ciyexa_backend.services.enrichment import DataEnricher, EnrichmentResult
+from ciyexa_backend.services.intent import Intent, IntentClassifier
+from ciyexa_backend.services.llm_cache import LLMResponseCache, normalize_query
+from ciyexa_backend.services.prompt_builder import PromptContextBuilder, count_tokens
 from ciyexa_backend.utils.logger import get_logger
-import re # For simple regex matching for historical queries
+
+DEFAULT_HISTORICAL_DAYS = 7
 
 router = APIRouter()
-llm_service = LLMAgentService()
-crypto_service = CryptoDataService()
+intent_classifier: Optional[IntentClassifier] = None # Installed by warm-up; see get_intent_classifier()
+llm_cache = LLMResponseCache()
+context_builder = PromptContextBuilder()
+admission = AdmissionController() # In front of both chat endpoints
 logger = get_logger(__name__)
 
+class PreparedPrompt(NamedTuple):
+    prompt: str
+    source: str
+    data_as_of: Optional[datetime] = None
+    cache_key: Hashable = None # Normalized query, intent and coins
+    data_version: Hashable = None # Identifies the market data in the prompt; changes when it refreshes
+    tokens: int = 0 # Prompt size, counted by the context builder
+
+def get_intent_classifier() -> IntentClassifier:
+    """The classifier for chat queries; one over the seed coins, built on first use, until warm-up installs the full one."""
+    global intent_classifier
+    if intent_classifier is None:
+        intent_classifier = get_crypto_service().coin_index.build_intent_classifier()
+    return intent_classifier
+
+async def prepare_llm_prompt(user_query: str, data_enricher: DataEnricher) -> PreparedPrompt:
+    """
+    Detects crypto questions in the user's query and enriches the LLM prompt with current or
+    historical data for every coin mentioned (and the top-N list for ranking questions), fetched
+    concurrently and condensed by the context builder to fit PROMPT_TOKEN_BUDGET. Coins whose
+    data could not be fetched in time are left out; with no data at all the original query is used.
+    """
+    # --- Crypto Data Integration Logic ---
+    # One pass over the query yields the intent, the coins mentioned and any time range
+    with stage_timer("intent"):
+        query_intent = get_intent_classifier().classify(user_query)
+        cache_key = (normalize_query(user_query), query_intent.intent.value, query_intent.crypto_ids, query_intent.days)
+    if not query_intent.crypto_ids and Intent.TOP_N not in query_intent.intents:
+        logger.info("No specific crypto ID or price query detected. Proceeding with original query.")
+        return _unenriched_prompt(user_query, cache_key)
+
+    logger.info("Detected crypto query (%s) for: %s", query_intent.intent.value, ', '.join(query_intent.crypto_ids) or "top coins")
+    with stage_timer("enrichment"):
+        enrichment = await data_enricher.enrich(query_intent, DEFAULT_HISTORICAL_DAYS)
+    for kind, crypto_id in enrichment.missing:
+        logger.warning("Could not fetch %s data for %s. Leaving it out of the prompt.", kind, crypto_id)
+
+    with stage_timer("prompt"):
+        return _build_prompt(user_query, enrichment, cache_key)
+
+def _unenriched_prompt(user_query: str, cache_key: Hashable) -> PreparedPrompt:
+    tokens = count_tokens(user_query)
+    LLM_PROMPT_TOKENS.labels("LLM").observe(tokens)
+    return PreparedPrompt(user_query, "LLM", cache_key=cache_key, tokens=tokens)
+
+def _build_prompt(user_query: str, enrichment: EnrichmentResult, cache_key: Hashable) -> PreparedPrompt:
+    built = context_builder.build(
+        user_query,
+        current=enrichment.current.values(),
+        historical=enrichment.historical.items(),
+        days=enrichment.days,
+        top=enrichment.top,
+    )
+    if built is None:
+        if enrichment.is_empty and not enrichment.missing:
+            logger.info("Crypto ID detected but not a specific price query. Proceeding with original query.")
+        else:
+            logger.warning("No usable crypto data for the query. Proceeding with original query.")
+        return _unenriched_prompt(user_query, cache_key)
+
+    if enrichment.historical:
+        response_source = "Hybrid (LLM + Historical Crypto Data)"
+    else:
+        response_source = "Hybrid (LLM + Current Crypto Data)"
+    current = list(enrichment.current.values())
+    timestamps = [crypto_data.as_of for crypto_data in current if crypto_data.as_of]
+    timestamps += [item.as_of for item in enrichment.top if item.as_of]
+    data_as_of = min(timestamps) if timestamps else None # The oldest data point bounds the answer's freshness
+    data_version = (
+        tuple(sorted((crypto_id, series.fingerprint) for crypto_id, series in enrichment.historical.items())),
+        tuple(sorted(
+            (crypto_data.id, crypto_data.as_of, crypto_data.market_data.current_price.get(context_builder.vs_currency) if crypto_data.market_data else None)
+            for crypto_data in current
+        )),
+        tuple((item.id, item.as_of, item.current_price) for item in enrichment.top),
+    )
+    LLM_PROMPT_TOKENS.labels(response_source).observe(built.tokens)
+    logger.info("Enriched LLM prompt with %s data row(s) (%s left out), %s tokens.", built.rows, built.omitted, built.tokens)
+    return PreparedPrompt(built.prompt, response_source, data_as_of, cache_key, data_version, built.tokens)
+
+async def complete_prompt(prepared: PreparedPrompt, llm_service: LLMAgentService) -> str:
+    """
+    Gets the LLM completion for a prepared prompt, from the response cache when the same query
+    was answered from the same market data. Raises LLMServiceError if the LLM call fails.
+    """
+    if not settings.LLM_CACHE_ENABLED:
+        return await llm_service.get_llm_response(prepared.prompt)
+    return await llm_cache.get_or_generate(
+        prepared.cache_key, prepared.data_version, lambda: llm_service.get_llm_response(prepared.prompt),
+    )
+
+def _client_id(request: Request) -> str:
+    """The client a chat request counts against: ADMISSION_CLIENT_HEADER when set and present, else the peer address."""
+    if settings.ADMISSION_CLIENT_HEADER:
+        value = request.headers.get(settings.ADMISSION_CLIENT_HEADER)
+        if value:
+            return value.split(",")[0].strip() # First hop of X-Forwarded-For style lists
+    return request.client.host if request.client else "unknown"
+
+async def _admit(request: Request) -> Callable[[], None]:
+    """Waits for an admission slot and returns its release function. Raises AdmissionRejected (429/503)."""
+    if not settings.ADMISSION_ENABLED:
+        return lambda: None
+    return await admission.acquire(_client_id(request))
+
 @router.post("/agent/chat", response_model=AgentResponse)
-async def chat_with_agent(query_data: AgentQuery):
+async def chat_with_agent(
+    query_data: AgentQuery,
+    request: Request,
+    llm_service: LLMAgentService = Depends(get_llm_service),
+    data_enricher: DataEnricher = Depends(get_data_enricher),
+):
     """
     Endpoint for chatting with the Ciyexa AI agent.
     The agent will process the query, potentially fetch crypto data (current or historical),
-    and then generate a response using the LLM.
+    and then generate a response using the LLM. Requests over the admission limits are
+    answered with 429 (per client) or 503 (server busy) and a Retry-After header.
     """
     user_query = query_data.query
-    logger.info(f"Received chat query: {user_query}")
-
-    llm_prompt = user_query
-    response_source = "LLM"
+    logger.info("Received chat query: %s", user_query)
+    release = await _admit(request)
+    try:
+        return await _answer(user_query, llm_service, data_enricher)
+    finally:
+        release()
 
-    # --- Crypto Data Integration Logic ---
-    # Simple keyword detection for crypto price queries
-    crypto_price_keywords = ["price of", "how much is", "value of", "current price", "what is the price"]
-    is_current_price_query = any(keyword in user_query.lower() for keyword in crypto_price_keywords)
-
-    # NEW: Simple keyword detection for historical price queries
-    historical_price_keywords = ["historical price of", "price of .* on", "price of .* ago", "price of .* last", "what was the price of"]
-    is_historical_price_query = any(re.search(keyword, user_query.lower()) for keyword in historical_price_keywords)
-
-    detected_crypto_id = None
-    for crypto_name in crypto_service.get_supported_cryptos_list():
-        if crypto_name.lower() in user_query.lower() or crypto_name.replace('-', '').lower() in user_query.lower():
-            detected_crypto_id = crypto_name
-            break
-    
-    if detected_crypto_id:
-        if is_historical_price_query:
-            logger.info(f"Detected historical crypto query for: {detected_crypto_id}")
-            # For simplicity, we'll fetch 7 days of data. More advanced parsing would extract 'days' from query.
-            historical_data = await crypto_service.get_historical_prices(detected_crypto_id, days=7)
-            
-            if historical_data and historical_data.prices:
-                # Format historical data for LLM prompt
-                # Take the last price as the most recent historical point
-                latest_historical_price = historical_data.prices[-1][1] if historical_data.prices else "N/A"
-                
-                # You could iterate through more points or summarize trends for the LLM
-                llm_prompt = (
-                    f"The user asked: '{user_query}'. "
-                    f"Here is recent historical data for {detected_crypto_id} (last 7 days):\n"
-                    f"Latest recorded price (approx): ${latest_historical_price:,.2f} USD.\n"
-                    f"Please provide a concise and helpful answer based on this historical information, "
-                    f"and then answer any other parts of the user's original query."
-                )
-                response_source = "Hybrid (LLM + Historical Crypto Data)"
-                logger.info(f"Enriched LLM prompt with historical crypto data for {detected_crypto_id}.")
-            else:
-                logger.warning(f"Could not fetch historical data for {detected_crypto_id}. Proceeding with original query.")
-        elif is_current_price_query:
-            logger.info(f"Detected current price crypto query for: {detected_crypto_id}")
-            crypto_data = await crypto_service.get_market_data(detected_crypto_id)
-            
-            if crypto_data and crypto_data.market_data:
-                price_usd = crypto_data.market_data.current_price.get("usd")
-                price_change_24h = crypto_data.market_data.price_change_percentage_24h
-                
-                if price_usd is not None:
-                    llm_prompt = (
-                        f"The user asked: '{user_query}'. "
-                        f"Here is the current data for {crypto_data.name} ({crypto_data.symbol.upper()}):\n"
-                        f"- Current Price (USD): ${price_usd:,.2f}\n"
-                        f"- 24h Price Change: {price_change_24h:.2f}%\n"
-                        f"Please provide a concise and helpful answer based on this information, "
-                        f"and then answer any other parts of the user's original query."
-                    )
-                    response_source = "Hybrid (LLM + Current Crypto Data)"
-                    logger.info(f"Enriched LLM prompt with current crypto data for {detected_crypto_id}.")
-                else:
-                    logger.warning(f"Could not get USD price for {detected_crypto_id}. Proceeding with original query.")
-            else:
-                logger.warning(f"Could not fetch detailed market data for {detected_crypto_id}. Proceeding with original query.")
-        else:
-            logger.info("Crypto ID detected but not a specific price query. Proceeding with original query.")
-    else:
-        logger.info("No specific crypto ID or price query detected. Proceeding with original query.")
+async def _answer(user_query: str, llm_service: LLMAgentService, data_enricher: DataEnricher) -> AgentResponse:
+    prepared = await prepare_llm_prompt(user_query, data_enricher)
 
     # --- LLM Interaction ---
     try:
-        llm_response_text = await llm_service.get_llm_response(llm_prompt)
-        if "Error" in llm_response_text: # Simple check for error messages from service
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=llm_response_text
-            )
-        return AgentResponse(response=llm_response_text, source=response_source)
-    except HTTPException as e:
-        raise e
+        with stage_timer("llm"):
+            llm_response_text = await complete_prompt(prepared, llm_service)
+        return AgentResponse(response=llm_response_text, source=prepared.source, data_as_of=prepared.data_as_of)
+    except AdmissionRejected:
+        raise # No LLM call slot in time; answered with 503
+    except LLMServiceError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
     except Exception as e:
-        logger.error(f"Failed to process chat query: {e}")
+        logger.error("Failed to process chat query: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An internal server error occurred while processing your request."
         )
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _chat_event_stream(prepared: PreparedPrompt, llm_service: LLMAgentService) -> AsyncIterator[str]:
+    yield _sse_event("meta", {
+        "source": prepared.source,
+        "data_as_of": prepared.data_as_of.isoformat() if prepared.data_as_of else None,
+        "prompt_tokens": prepared.tokens,
+    })
+    if settings.LLM_CACHE_ENABLED:
+        cached = llm_cache.lookup(prepared.cache_key, prepared.data_version)
+        if cached is not None:
+            yield _sse_event("delta", {"text": cached})
+            yield _sse_event("done", {})
+            return
+
+    started = time.monotonic()
+    chunks = []
+    try:
+        async for chunk in llm_service.stream_llm_response(prepared.prompt):
+            if not chunks:
+                CHAT_STAGE_DURATION.labels("llm_first_chunk").observe(time.monotonic() - started)
+            chunks.append(chunk)
+            yield _sse_event("delta", {"text": chunk})
+    except LLMServiceError as e:
+        yield _sse_event("error", {"detail": str(e)})
+        return
+    except AdmissionRejected as e:
+        yield _sse_event("error", {"detail": "The LLM service is busy. Try again later.", "retry_after": e.retry_after})
+        return
+    if settings.LLM_CACHE_ENABLED:
+        # Only completed streams are stored; a disconnect cancels the generator before this point
+        llm_cache.store(prepared.cache_key, prepared.data_version, "".join(chunks), time.monotonic() - started)
+    yield _sse_event("done", {})
+
+async def _released_after(events: AsyncIterator[str], release: Callable[[], None]) -> AsyncIterator[str]:
+    try:
+        async for event in events:
+            yield event
+    finally:
+        release()
+
+@router.post("/agent/chat/stream")
+async def stream_chat_with_agent(
+    query_data: AgentQuery,
+    request: Request,
+    llm_service: LLMAgentService = Depends(get_llm_service),
+    data_enricher: DataEnricher = Depends(get_data_enricher),
+):
+    """
+    Streaming variant of /agent/chat using Server-Sent Events.
+    Emits a `meta` event (response source, data timestamp), one `delta` event per LLM text chunk
+    as it arrives, then `done` (or `error`). Each chunk is sent before the next one is read from
+    the LLM API, and the upstream request is closed if the client disconnects. Cached answers
+    are sent as a single `delta`. The admission slot is held until the stream ends.
+    """
+    logger.info("Received streaming chat query: %s", query_data.query)
+    release = await _admit(request)
+    try:
+        prepared = await prepare_llm_prompt(query_data.query, data_enricher)
+    except BaseException:
+        release()
+        raise
+    return StreamingResponse(
+        _released_after(_chat_event_stream(prepared, llm_service), release),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # Disable proxy buffering
+        background=BackgroundTask(release), # In case the stream is never started
+    )
@@ -1,68 +1,249 @@
-from fastapi import APIRouter, HTTPException, status, Query
-from typing import List
+import json
+import re
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect, status, Query, Path
+from typing import Dict, List, Optional
+from ciyexa_backend.api.v1.dependencies import get_crypto_service
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.core.responses import EncodedResponseCache, encode_payload, payload_response
 from ciyexa_backend.services.crypto_data_service import CryptoDataService
-from ciyexa_backend.api.v1.schemas.crypto import HistoricalPriceData, TopCryptosResponse, CryptoData
+from ciyexa_backend.services.price_feed import PriceFeed
+from ciyexa_backend.services.timeseries import INDICATORS, DownsampleMethod, downsample_and_analyze
+from ciyexa_backend.api.v1.schemas.crypto import (
+    CryptoBatchRequest,
+    CryptoBatchResponse,
+    CryptoData,
+    HistoricalSeriesResponse,
+    TopCrypto,
+    TopCryptosResponse,
+)
 from ciyexa_backend.utils.logger import get_logger
 
 router = APIRouter()
-crypto_service = CryptoDataService()
+encoded_responses = EncodedResponseCache() # Encoded bodies, reused until the data they were built from changes
+price_feed = PriceFeed() # Fed with every market snapshot by the lifespan hook
 logger = get_logger(__name__)
+CURRENCY_RE = re.compile(r"^[a-z0-9]{2,10}$")
 
-@router.get("/crypto/historical/{crypto_id}", response_model=HistoricalPriceData)
+def resolve_crypto_id_or_404(crypto_service: CryptoDataService, crypto_id: str) -> str:
+    """Resolves an id, symbol or name through the coin index, suggesting close matches when it is unknown."""
+    resolved_id = crypto_service.resolve_crypto_id(crypto_id)
+    if resolved_id is None:
+        detail = f"Cryptocurrency '{crypto_id}' not supported or found."
+        suggestions = crypto_service.suggest_crypto_ids(crypto_id)
+        if suggestions:
+            detail += f" Did you mean: {', '.join(suggestions)}?"
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+    return resolved_id
+
+@router.get("/crypto/historical/{crypto_id}", response_model=HistoricalSeriesResponse, response_model_exclude_none=True)
 async def get_historical_crypto_data(
+    request: Request,
     crypto_id: str,
-    days: int = Query(7, ge=1, description="Number of days for historical data (e.g., 1, 7, 30, 365, max).")
+    days: int = Query(7, ge=1, description="Number of days for historical data (e.g., 1, 7, 30, 365, max)."),
+    points: Optional[int] = Query(None, ge=2, le=5000, description="Downsample the series to at most this many points."),
+    method: DownsampleMethod = Query(DownsampleMethod.LTTB, description="Downsampling method: 'lttb' keeps the shape of the line, 'ohlc' buckets into candles."),
+    indicators: Optional[str] = Query(None, description=f"Comma-separated indicators to compute: {', '.join(INDICATORS)}."),
+    window: int = Query(20, ge=2, le=1000, description="Window (in source points) for sma, ema and volatility."),
+    summary: bool = Query(False, description="Include a trend summary of the full series."),
+    crypto_service: CryptoDataService = Depends(get_crypto_service),
 ):
     """
-    Retrieves historical price, market cap, and total volume data for a given cryptocurrency.
+    Retrieves historical price, market cap, and total volume data for a given cryptocurrency,
+    optionally downsampled and with indicators computed server-side.
     """
-    logger.info(f"Fetching historical data for {crypto_id} for {days} days.")
-    if crypto_id not in crypto_service.get_supported_cryptos_list():
+    logger.info("Fetching historical data for %s for %s days.", crypto_id, days)
+    crypto_id = resolve_crypto_id_or_404(crypto_service, crypto_id)
+    requested = tuple(name.strip().lower() for name in indicators.split(",") if name.strip()) if indicators else ()
+    unknown = [name for name in requested if name not in INDICATORS]
+    if unknown:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Cryptocurrency '{crypto_id}' not supported or found."
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown indicator(s): {', '.join(unknown)}. Supported: {', '.join(INDICATORS)}."
         )
-    
-    data = await crypto_service.get_historical_prices(crypto_id, days)
-    if not data:
+
+    series = await crypto_service.get_price_series(crypto_id, days)
+    if not series:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Could not retrieve historical data from external service."
         )
-    return data
+    # Built from typed arrays and encoded directly, which skips per-point response validation
+    payload = encoded_responses.get_or_encode(
+        ("historical", crypto_id, days, points, method, requested, window, summary),
+        series.fingerprint,
+        lambda: downsample_and_analyze(series, points, method, requested, window, summary),
+    )
+    return payload_response(request, payload)
+
+def _top_cryptos_response(data: List[TopCrypto]) -> TopCryptosResponse:
+    timestamps = [item.as_of for item in data if item.as_of is not None]
+    # The items were validated when they were ingested; construct without validating them again
+    return TopCryptosResponse.model_construct(data=data, as_of=min(timestamps) if timestamps else None)
 
 @router.get("/crypto/top/{top_n}", response_model=TopCryptosResponse)
 async def get_top_n_cryptos(
-    top_n: int = Query(10, ge=1, le=250, description="Number of top cryptocurrencies to retrieve.")
+    request: Request,
+    top_n: int = Path(..., ge=1, le=250, description="Number of top cryptocurrencies to retrieve."),
+    crypto_service: CryptoDataService = Depends(get_crypto_service),
 ):
     """
     Retrieves a list of the top N cryptocurrencies by market capitalization.
     """
-    logger.info(f"Fetching top {top_n} cryptocurrencies.")
+    logger.info("Fetching top %s cryptocurrencies.", top_n)
+    snapshot = crypto_service.fresh_snapshot()
+    if snapshot and len(snapshot.top) >= top_n:
+        payload = encoded_responses.get_or_encode(
+            ("top", top_n), snapshot.version, lambda: _top_cryptos_response(list(snapshot.top[:top_n]))
+        )
+        return payload_response(request, payload)
+
     data = await crypto_service.get_top_n_cryptos_by_market_cap(top_n)
     if not data:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Could not retrieve top cryptocurrencies from external service."
         )
-    return TopCryptosResponse(data=data)
+    return payload_response(request, encode_payload(_top_cryptos_response(data)))
+
+async def _market_data_batch(
+    request: Request, crypto_service: CryptoDataService, requested_ids: List[str], vs_currencies: Optional[List[str]]
+):
+    requested_ids = [value.strip() for value in requested_ids if value.strip()]
+    vs_currencies = list(dict.fromkeys(c.strip().lower() for c in vs_currencies or [settings.DEFAULT_VS_CURRENCY] if c.strip()))
+    if not requested_ids or len(requested_ids) > settings.CRYPTO_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Between 1 and {settings.CRYPTO_BATCH_MAX_IDS} ids are required."
+        )
+    invalid = [currency for currency in vs_currencies if not CURRENCY_RE.match(currency)]
+    if not vs_currencies or invalid or len(vs_currencies) > settings.CRYPTO_BATCH_MAX_CURRENCIES:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Between 1 and {settings.CRYPTO_BATCH_MAX_CURRENCIES} currency codes are required."
+            + (f" Invalid: {', '.join(invalid)}." if invalid else "")
+        )
+
+    resolved = {value: crypto_service.resolve_crypto_id(value) for value in requested_ids}
+    crypto_ids = list(dict.fromkeys(crypto_id for crypto_id in resolved.values() if crypto_id is not None))
+    by_id, fetch_errors = await crypto_service.get_market_data_batch(crypto_ids, vs_currencies) if crypto_ids else ({}, {})
+    # Keyed by the values as requested, like errors, so every one is found in either; items carry the resolved id
+    data, errors = {}, {}
+    for value, crypto_id in resolved.items():
+        if crypto_id is None:
+            errors[value] = f"Cryptocurrency '{value}' not supported or found."
+            continue
+        if crypto_id in by_id:
+            data[value] = by_id[crypto_id]
+        if crypto_id in fetch_errors:
+            errors[value] = fetch_errors[crypto_id]
+    response = CryptoBatchResponse.model_construct(vs_currencies=vs_currencies, data=data, errors=errors)
+    return payload_response(request, encode_payload(response))
+
+@router.get("/crypto/batch", response_model=CryptoBatchResponse)
+async def get_market_data_batch(
+    request: Request,
+    ids: str = Query(..., description="Comma-separated CoinGecko ids, symbols or names."),
+    vs_currencies: Optional[str] = Query(None, description="Comma-separated currencies; the first one also gets the 24h change."),
+    crypto_service: CryptoDataService = Depends(get_crypto_service),
+):
+    """
+    Retrieves market data for many cryptocurrencies in several currencies in one request.
+    Coins that cannot be resolved or fetched are reported in `errors` instead of failing the request.
+    """
+    logger.info("Fetching batch market data for %s.", ids)
+    return await _market_data_batch(request, crypto_service, ids.split(","), vs_currencies.split(",") if vs_currencies else None)
+
+@router.post("/crypto/batch", response_model=CryptoBatchResponse)
+async def post_market_data_batch(
+    request: Request, body: CryptoBatchRequest, crypto_service: CryptoDataService = Depends(get_crypto_service)
+):
+    """
+    Same as GET /crypto/batch, for id lists too long for a query string.
+    """
+    logger.info("Fetching batch market data for %s coins.", len(body.ids))
+    return await _market_data_batch(request, crypto_service, body.ids, body.vs_currencies)
 
 @router.get("/crypto/{crypto_id}", response_model=CryptoData)
-async def get_single_crypto_market_data(crypto_id: str):
+async def get_single_crypto_market_data(
+    request: Request, crypto_id: str, crypto_service: CryptoDataService = Depends(get_crypto_service)
+):
     """
     Retrieves detailed current market data for a single cryptocurrency.
     """
-    logger.info(f"Fetching detailed market data for {crypto_id}.")
-    if crypto_id not in crypto_service.get_supported_cryptos_list():
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Cryptocurrency '{crypto_id}' not supported or found."
-        )
-    
+    logger.info("Fetching detailed market data for %s.", crypto_id)
+    crypto_id = resolve_crypto_id_or_404(crypto_service, crypto_id)
+
+    snapshot = crypto_service.fresh_snapshot()
+    if snapshot and crypto_id in snapshot.coins:
+        payload = encoded_responses.get_or_encode(("coin", crypto_id), snapshot.version, lambda: snapshot.coins[crypto_id])
+        return payload_response(request, payload)
+
     data = await crypto_service.get_market_data(crypto_id)
     if not data:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Could not retrieve market data from external service."
         )
-    return data
+    return payload_response(request, encode_payload(data))
+
+def _resolve_subscription_ids(crypto_service: CryptoDataService, requested: List[str]) -> Dict[str, List[str]]:
+    """Splits requested ids, symbols or names into supported coin ids and the ones that are not pushed."""
+    resolved, unknown = [], []
+    for value in requested:
+        crypto_id = crypto_service.resolve_crypto_id(value.strip()) if value.strip() else None
+        if crypto_id in settings.SUPPORTED_CRYPTOS:
+            resolved.append(crypto_id)
+        elif value.strip():
+            unknown.append(value)
+    return {"ids": resolved, "unknown": unknown}
+
+@router.websocket("/ws/prices")
+async def stream_prices(
+    websocket: WebSocket, ids: Optional[str] = Query(None), crypto_service: CryptoDataService = Depends(get_crypto_service)
+):
+    """
+    Pushes price updates for the subscribed coins (ids from SUPPORTED_CRYPTOS, or their symbols
+    or names). Subscribe with `?ids=bitcoin,eth` or by sending
+    `{"action": "subscribe" | "unsubscribe", "ids": [...]}`. Each market data refresh sends one
+    `{"type": "prices", "data": {id: {...}}}` message holding the subscribed coins that changed.
+    """
+    if not settings.WS_PRICES_ENABLED or price_feed.connections >= settings.WS_MAX_CONNECTIONS:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    await websocket.accept()
+    subscriber = price_feed.connect(websocket.send_text, websocket.close)
+
+    def reply(message: dict) -> None:
+        # Sent by the feed's writer for this client, never concurrently with its price updates
+        if not price_feed.send_message(subscriber, message):
+            raise WebSocketDisconnect(code=status.WS_1008_POLICY_VIOLATION) # Not reading its replies
+
+    def subscribe(requested: List[str]) -> None:
+        result = _resolve_subscription_ids(crypto_service, requested)
+        added = price_feed.subscribe(subscriber, result["ids"])
+        rejected = [crypto_id for crypto_id in result["ids"] if crypto_id not in subscriber.topics]
+        reply({"type": "subscribed", "ids": added, "unknown": result["unknown"] + rejected})
+
+    try:
+        if ids:
+            subscribe(ids.split(","))
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                action, requested = message["action"], message["ids"]
+                if not isinstance(requested, list) or not all(isinstance(value, str) for value in requested):
+                    raise TypeError("ids must be a list of strings")
+            except (ValueError, KeyError, TypeError):
+                reply({"type": "error", "detail": 'Expected {"action": "subscribe" | "unsubscribe", "ids": [...]}.'})
+                continue
+            if action == "subscribe":
+                subscribe(requested)
+            elif action == "unsubscribe":
+                removed = price_feed.unsubscribe(subscriber, _resolve_subscription_ids(crypto_service, requested)["ids"])
+                reply({"type": "unsubscribed", "ids": removed})
+            else:
+                reply({"type": "error", "detail": f"Unknown action '{action}'."})
+    except (WebSocketDisconnect, RuntimeError): # RuntimeError: the feed closed a slow connection
+        pass
+    finally:
+        price_feed.disconnect(subscriber)
@@ -1,3 +1,5 @@
+from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel, Field
 
 class AgentQuery(BaseModel):
@@ -6,3 +8,4 @@ class AgentQuery(BaseModel):
 class AgentResponse(BaseModel):
     response: str = Field(..., description="The AI agent's response.")
     source: str = Field("LLM", description="The source of the response (e.g., LLM, Crypto Data).")
+    data_as_of: Optional[datetime] = Field(None, description="When the market data used to enrich the response was fetched.")
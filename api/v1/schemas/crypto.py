@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel, Field
 from typing import Dict, Optional, List
 
@@ -12,6 +13,16 @@ class CryptoData(BaseModel):
     symbol: str = Field(..., description="Symbol of the cryptocurrency.")
     name: str = Field(..., description="Name of the cryptocurrency.")
     market_data: Optional[MarketData] = Field(None, description="Market data for the cryptocurrency.")
+    as_of: Optional[datetime] = Field(None, description="When this data was fetched from CoinGecko.")
+
+class CryptoBatchRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, description="CoinGecko ids, symbols or names.")
+    vs_currencies: Optional[List[str]] = Field(None, min_length=1, description="Currencies to price in, the default currency if omitted; the first one also gets the 24h change.")
+
+class CryptoBatchResponse(BaseModel):
+    vs_currencies: List[str]
+    data: Dict[str, CryptoData] = Field(..., description="Market data per requested id, symbol or name (as given); each item's id is the resolved CoinGecko id.")
+    errors: Dict[str, str] = Field(default_factory=dict, description="Why a requested id, symbol or name (as given) is missing or incomplete in data.")
 
 class CryptoPricesResponse(BaseModel):
     data: Dict[str, Dict[str, float]] = Field(..., description="Dictionary of crypto IDs to their prices in USD.")
@@ -22,6 +33,21 @@ class HistoricalPriceData(BaseModel):
     market_caps: List[List[float]] = Field(..., description="List of [timestamp, market_cap] pairs.")
     total_volumes: List[List[float]] = Field(..., description="List of [timestamp, total_volume] pairs.")
 
+class SeriesSummary(BaseModel):
+    points: int = Field(..., description="Number of points the summary was computed from.")
+    start_price: float
+    end_price: float
+    change_percentage: float = Field(..., description="Price change over the whole series.")
+    high: float
+    low: float
+    volatility_percentage: Optional[float] = Field(None, description="Annualized volatility of log returns.")
+    max_drawdown_percentage: float = Field(..., description="Largest peak-to-trough decline, as a negative percentage.")
+
+class HistoricalSeriesResponse(HistoricalPriceData):
+    ohlc: Optional[List[List[float]]] = Field(None, description="[bucket_start, open, high, low, close] rows when downsampled with method=ohlc.")
+    indicators: Optional[Dict[str, List[List[float]]]] = Field(None, description="Requested indicators as [timestamp, value] pairs.")
+    summary: Optional[SeriesSummary] = None
+
 # NEW: Schema for Top Cryptos
 class TopCrypto(BaseModel):
     id: str
@@ -44,6 +70,8 @@ class TopCrypto(BaseModel):
     atl_date: Optional[str] = None
     roi: Optional[Dict] = None
     last_updated: Optional[str] = None
+    as_of: Optional[datetime] = None
 
 class TopCryptosResponse(BaseModel):
     data: List[TopCrypto] = Field(..., description="List of top cryptocurrencies by market cap.")
+    as_of: Optional[datetime] = Field(None, description="When the oldest entry in this list was fetched from CoinGecko.")
@@ -0,0 +1,68 @@
+"""
+Micro-benchmark for chat query intent/entity detection.
+
+Compares the per-request keyword/regex scan that chat_with_agent used to run against the
+compiled IntentClassifier, for growing coin vocabularies.
+
+    python -m ciyexa_backend.benchmarks.bench_intent
+"""
+import json
+import re
+import timeit
+from typing import Dict, List
+from ciyexa_backend.services.intent import DEFAULT_COIN_ALIASES, IntentClassifier
+
+QUERIES = [
+    "What is the price of Bitcoin?",
+    "What was the price of Ethereum 7 days ago?",
+    "compare solana, cardano and polkadot over the last month",
+    "Explain what decentralized finance (DeFi) is.",
+    "how much is near protocol worth right now",
+]
+
+
+def legacy_detect(user_query: str, supported_cryptos: List[str]):
+    """The detection code chat_with_agent ran on every request before the classifier existed."""
+    crypto_price_keywords = ["price of", "how much is", "value of", "current price", "what is the price"]
+    is_current = any(keyword in user_query.lower() for keyword in crypto_price_keywords)
+    historical_price_keywords = ["historical price of", "price of .* on", "price of .* ago", "price of .* last", "what was the price of"]
+    is_historical = any(re.search(keyword, user_query.lower()) for keyword in historical_price_keywords)
+    detected = None
+    for crypto_name in supported_cryptos:
+        if crypto_name.lower() in user_query.lower() or crypto_name.replace('-', '').lower() in user_query.lower():
+            detected = crypto_name
+            break
+    return detected, is_current, is_historical
+
+
+def vocabulary(size: int) -> Dict[str, List[str]]:
+    coins = {crypto_id: [crypto_id] + aliases for crypto_id, aliases in DEFAULT_COIN_ALIASES.items()}
+    for i in range(size - len(coins)):
+        coins[f"synthetic-coin-{i}"] = [f"synthetic-coin-{i}", f"syn{i}"]
+    return coins
+
+
+def per_call_us(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def run(sizes=(20, 1_000, 10_000), number: int = 2_000) -> List[Dict]:
+    results = []
+    for size in sizes:
+        coins = vocabulary(size)
+        coin_ids = list(coins)
+        classifier = IntentClassifier(coins)
+        # Worst case for the linear scan: the coin is not mentioned at all
+        legacy = per_call_us(lambda: [legacy_detect(q, coin_ids) for q in QUERIES], number // 10 or 1) / len(QUERIES)
+        compiled = per_call_us(lambda: [classifier.classify(q) for q in QUERIES], number) / len(QUERIES)
+        results.append({
+            "vocabulary": size,
+            "legacy_us_per_query": round(legacy, 2),
+            "compiled_us_per_query": round(compiled, 2),
+            "speedup": round(legacy / compiled, 1),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,76 @@
+"""
+Benchmark for the cost of metrics instrumentation.
+
+Reports µs per call for a trivial ASGI app with and without MetricsMiddleware, and for one
+stage_timer block and one histogram observation on their own.
+
+    python -m ciyexa_backend.benchmarks.bench_metrics
+"""
+import asyncio
+import json
+import time
+from typing import Dict
+from ciyexa_backend.core.metrics import CHAT_STAGE_DURATION, MetricsMiddleware, stage_timer
+
+
+class _Route:
+    path = "/api/v1/crypto/coin/{crypto_id}"
+
+
+ROUTE = _Route()
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = ROUTE # What the router leaves in the scope
+    scope["path_params"] = {"crypto_id": "bitcoin"}
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def per_call_us(asgi_app, number: int = 50_000) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(number):
+            scope = {"type": "http", "method": "GET", "path": "/api/v1/crypto/coin/bitcoin"}
+            await asgi_app(scope, receive, send)
+        best = min(best, (time.perf_counter() - started) / number)
+    return best * 1e6
+
+
+def sync_per_call_us(fn, number: int = 200_000) -> float:
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best * 1e6
+
+
+def timed_stage():
+    with stage_timer("bench"):
+        pass
+
+
+async def run() -> Dict[str, float]:
+    bare = await per_call_us(endpoint)
+    instrumented = await per_call_us(MetricsMiddleware(endpoint))
+    histogram = CHAT_STAGE_DURATION.labels("bench")
+    return {
+        "request_bare_us": round(bare, 2),
+        "request_instrumented_us": round(instrumented, 2),
+        "middleware_overhead_us": round(instrumented - bare, 2),
+        "stage_timer_us": round(sync_per_call_us(timed_stage), 2),
+        "histogram_observe_us": round(sync_per_call_us(lambda: histogram.observe(0.01)), 2),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(run()), indent=2))
@@ -0,0 +1,150 @@
+"""
+Benchmark for the JSON response path of the large crypto endpoints.
+
+Calls each route directly through the ASGI interface (no HTTP client in the loop) and reports µs
+per response for:
+- legacy: the pre-change routes, returning Pydantic models through `response_model`, so FastAPI
+  re-validates and serializes every field;
+- fast: the current routes (orjson, no re-validation), with snapshot-backed bodies pre-encoded;
+- not_modified: the current routes answering If-None-Match with a 304 (the saving there is the
+  bytes on the wire, which this in-process benchmark does not measure).
+
+    python -m ciyexa_backend.benchmarks.bench_serialization
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+from unittest.mock import patch
+from fastapi import FastAPI, Path, Query
+from ciyexa_backend.api.v1.dependencies import get_crypto_service
+from ciyexa_backend.api.v1.schemas.crypto import HistoricalPriceData, TopCrypto, TopCryptosResponse
+from ciyexa_backend.main import app
+from ciyexa_backend.services.crypto_data_service import crypto_data_from_markets_item
+from ciyexa_backend.services.timeseries import PriceSeries
+
+HOUR_MS = 3600 * 1000
+
+
+def markets_rows(count: int) -> List[Dict]:
+    fetched_at = time.time()
+    return [{
+        "id": f"coin-{i}", "symbol": f"c{i}", "name": f"Coin {i}", "image": f"https://example.com/{i}.png",
+        "current_price": 1000.0 / (i + 1), "market_cap": 1e12 / (i + 1), "market_cap_rank": i + 1,
+        "total_volume": 1e10 / (i + 1), "price_change_percentage_24h": 1.5, "circulating_supply": 1e7,
+        "total_supply": 2.1e7, "max_supply": 2.1e7, "ath": 2000.0, "ath_change_percentage": -50.0,
+        "ath_date": "2024-03-14T07:10:36.635Z", "atl": 0.1, "atl_change_percentage": 1e6,
+        "atl_date": "2013-07-06T00:00:00.000Z", "roi": None, "last_updated": "2024-05-01T12:00:00.000Z",
+        "fetched_at": fetched_at,
+    } for i in range(count)]
+
+
+def market_chart(points: int) -> Dict[str, List[List[float]]]:
+    start = int(time.time() * 1000) - points * HOUR_MS
+    timestamps = range(start, start + points * HOUR_MS, HOUR_MS)
+    return {
+        "prices": [[t, 60000.0 + (t % 997)] for t in timestamps],
+        "market_caps": [[t, 1.2e12 + (t % 991)] for t in timestamps],
+        "total_volumes": [[t, 3e10 + (t % 983)] for t in timestamps],
+    }
+
+
+def legacy_app(top: List[TopCrypto], chart: Dict) -> FastAPI:
+    """The routes as they were: Pydantic models returned through response_model."""
+    legacy = FastAPI()
+
+    @legacy.get("/top/{top_n}", response_model=TopCryptosResponse)
+    async def top_route(top_n: int = Path(..., ge=1, le=250)):
+        timestamps = [item.as_of for item in top if item.as_of is not None]
+        return TopCryptosResponse(data=top, as_of=min(timestamps) if timestamps else None)
+
+    @legacy.get("/historical/{crypto_id}", response_model=HistoricalPriceData)
+    async def historical_route(crypto_id: str, days: int = Query(7, ge=1)):
+        return HistoricalPriceData(**chart)
+
+    return legacy
+
+
+async def call(asgi_app, path: str, query: str = "", headers: Dict[str, str] = None):
+    messages = []
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("bench", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app(scope, receive, send)
+    status = messages[0]["status"]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    etag = dict(messages[0]["headers"]).get(b"etag", b"").decode()
+    return status, body, etag
+
+
+async def per_call_us(asgi_app, path: str, query: str = "", headers: Dict[str, str] = None, number: int = 200) -> float:
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(number):
+            await call(asgi_app, path, query, headers)
+        best = min(best, (time.perf_counter() - started) / number)
+    return best * 1e6
+
+
+async def run() -> List[Dict]:
+    rows = markets_rows(250)
+    top = [TopCrypto(**{**row, "as_of": datetime.fromtimestamp(row["fetched_at"], tz=timezone.utc)}) for row in rows]
+    results = []
+
+    # /crypto/top/250 from a fresh snapshot
+    get_crypto_service().snapshots.publish({row["id"]: crypto_data_from_markets_item(row, "usd") for row in rows}, top, "usd")
+    legacy = legacy_app(top, market_chart(1))
+    _, legacy_body, _ = await call(legacy, "/top/250")
+    _, fast_body, etag = await call(app, "/api/v1/crypto/top/250")
+    assert json.loads(legacy_body) == json.loads(fast_body)
+    results.append({
+        "response": "top_250",
+        "bytes": len(fast_body),
+        "legacy_us": round(await per_call_us(legacy, "/top/250"), 1),
+        "fast_us": round(await per_call_us(app, "/api/v1/crypto/top/250"), 1),
+        "not_modified_us": round(await per_call_us(app, "/api/v1/crypto/top/250", headers={"If-None-Match": etag}), 1),
+    })
+
+    # /crypto/historical for growing ranges (hourly points); the parsed series is memoized upstream
+    for points in (168, 2_160, 8_760):
+        chart = market_chart(points)
+        series = PriceSeries.from_market_chart(chart)
+        legacy = legacy_app(top, chart)
+        async def get_price_series(*args, series=series, **kwargs):
+            return series
+
+        with patch.object(get_crypto_service(), "get_price_series", new=get_price_series):
+            _, legacy_body, _ = await call(legacy, "/historical/bitcoin", "days=90")
+            _, fast_body, etag = await call(app, "/api/v1/crypto/historical/bitcoin", "days=90")
+            assert json.loads(legacy_body) == json.loads(fast_body)
+            number = max(5, 20_000 // points)
+            results.append({
+                "response": f"historical_{points}_points",
+                "bytes": len(fast_body),
+                "legacy_us": round(await per_call_us(legacy, "/historical/bitcoin", "days=90", number=number), 1),
+                "fast_us": round(await per_call_us(app, "/api/v1/crypto/historical/bitcoin", "days=90", number=number), 1),
+                "not_modified_us": round(await per_call_us(
+                    app, "/api/v1/crypto/historical/bitcoin", "days=90", {"If-None-Match": etag}, number=number
+                ), 1),
+            })
+    for result in results:
+        result["speedup"] = round(result["legacy_us"] / result["fast_us"], 1)
+    return results
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO) # Request logging would dominate the timings
+    print(json.dumps(asyncio.run(run()), indent=2))
@@ -0,0 +1,139 @@
+"""
+Benchmark for cold-start time against a budget.
+
+Reports, for a synthetic coin list the size of CoinGecko's:
+- the time to import the app (median of fresh interpreters);
+- the time to build the coin index and intent classifier, against loading them from the startup bundle;
+- the time from launching a uvicorn worker to /ready answering 200, without a bundle (first
+  start, which writes one) and with it.
+Upstream calls go to a local fake CoinGecko. Pass --check to exit with status 1 when a figure
+is over its budget, e.g. in CI.
+
+    python -m ciyexa_backend.benchmarks.bench_startup --coins 17000 --check
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+import httpx
+from ciyexa_backend.benchmarks.fake_servers import FakeCoinGecko, run_server
+from ciyexa_backend.services.coin_index import CoinIndex, load_startup_bundle, save_coin_index, save_startup_bundle
+
+# Seconds; a worker over budget makes autoscaling react too slowly to bursts
+BUDGETS = {
+    "import_seconds": 1.5,
+    "bundle_load_seconds": 0.5,
+    "ready_seconds": 3.0, # With the bundle in place
+}
+PACKAGE_PARENT = str(Path(__file__).absolute().parent.parent.parent) # Put on PYTHONPATH of the child interpreters
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import ciyexa_backend.main; print(time.perf_counter() - t)"
+
+
+def synthetic_coins(count: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+
+    def word(length: int) -> str:
+        return "".join(rng.choices(string.ascii_lowercase, k=length))
+
+    return [{"id": f"{word(6)}-{i}", "symbol": word(4), "name": f"{word(7)} {word(5)}".title()} for i in range(count)]
+
+
+def import_seconds(env: Dict[str, str], runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=env, capture_output=True, text=True, check=True)
+        samples.append(float(output.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def artifact_seconds(rows: List[Dict], bundle_path: Path, snapshot_path: Path) -> Dict[str, float]:
+    started = time.perf_counter()
+    index = CoinIndex.from_coins_list(rows, fetched_at=time.time())
+    classifier = index.build_intent_classifier()
+    built = time.perf_counter() - started
+    save_startup_bundle(index, classifier, bundle_path)
+    started = time.perf_counter()
+    assert load_startup_bundle(bundle_path, snapshot_path) is not None
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    index.build_fuzzy_index() # Left out of the bundle, built during warm-up
+    fuzzy = time.perf_counter() - started
+    bundle_path.unlink()
+    return {"build_seconds": round(built, 3), "bundle_load_seconds": round(loaded, 3), "fuzzy_index_seconds": round(fuzzy, 3)}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def ready_seconds(env: Dict[str, str], timeout: float = 60.0) -> float:
+    """Seconds from launching a uvicorn worker until /ready answers 200."""
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "ciyexa_backend.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/ready", timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"Worker was not ready within {timeout}s.")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def run(coins: int, runs: int) -> Dict:
+    rows = synthetic_coins(coins)
+    with tempfile.TemporaryDirectory() as data_dir, run_server(FakeCoinGecko().app) as coingecko_url:
+        snapshot_path = Path(data_dir) / "coins_list.json.gz"
+        bundle_path = Path(data_dir) / "startup_bundle.pickle"
+        save_coin_index(CoinIndex.from_coins_list(rows, fetched_at=time.time()), snapshot_path)
+        env = dict(
+            os.environ,
+            PYTHONPATH=os.pathsep.join(filter(None, [PACKAGE_PARENT, os.environ.get("PYTHONPATH")])),
+            COINGECKO_API_BASE_URL=coingecko_url,
+            COIN_INDEX_PATH=str(snapshot_path),
+            COIN_INDEX_BUNDLE_PATH=str(bundle_path),
+            COIN_INDEX_REFRESH_ENABLED="false",
+            HISTORY_STORE_PATH=str(Path(data_dir) / "history"),
+            LOG_LEVEL="WARNING",
+        )
+        results = {"coins": coins, "import_seconds": round(import_seconds(env, runs), 3)}
+        results.update(artifact_seconds(rows, bundle_path, snapshot_path))
+        results["ready_without_bundle_seconds"] = round(ready_seconds(env), 3) # Writes the bundle
+        results["ready_seconds"] = round(statistics.median(ready_seconds(env) for _ in range(runs)), 3)
+    results["budgets"] = BUDGETS
+    results["over_budget"] = [key for key, budget in BUDGETS.items() if results[key] > budget]
+    return results
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--coins", type=int, default=17000, help="Size of the synthetic coin list.")
+    parser.add_argument("--runs", type=int, default=3, help="Samples per timing; the median is reported.")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 when a figure is over budget.")
+    args = parser.parse_args(argv)
+    results = run(args.coins, args.runs)
+    print(json.dumps(results, indent=2))
+    return 1 if args.check and results["over_budget"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
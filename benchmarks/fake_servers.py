@@ -0,0 +1,215 @@
+"""
+Local fake upstream servers for tests and benchmarks.
+
+Each fake is a small Starlette app; `run_server` serves an ASGI app with uvicorn on a free
+localhost port in a background thread, so the backend talks to it over real sockets.
+Latency, jitter and random 5xx/429 responses can be configured per fake.
+"""
+import asyncio
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from collections import Counter, deque
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+
+class FaultInjection:
+    """
+    Latency and random failures shared by the fakes: every request waits `latency` plus up to
+    `jitter` seconds, then fails with a 429 (with Retry-After) with probability `throttle_rate`
+    or with a 500 with probability `error_rate`. Seeded, so runs are repeatable.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: str = "1", seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.injected: Counter = Counter() # Status code -> random failures returned
+        self._random = random.Random(seed)
+
+    async def delay(self) -> None:
+        seconds = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if seconds:
+            await asyncio.sleep(seconds)
+
+    def failure(self) -> Optional[JSONResponse]:
+        if not (self.throttle_rate or self.error_rate):
+            return None
+        draw = self._random.random()
+        if draw < self.throttle_rate:
+            self.injected[429] += 1
+            return JSONResponse({"status": {"error_code": 429}}, status_code=429, headers={"Retry-After": self.retry_after})
+        if draw < self.throttle_rate + self.error_rate:
+            self.injected[500] += 1
+            return JSONResponse({"status": {"error_code": 500}}, status_code=500)
+        return None
+
+
+class FakeLLM(FaultInjection):
+    """
+    Stand-in for the Next.js LLM route. Requests with `"stream": true` get the completion as plain
+    text chunks spaced `chunk_delay` seconds apart; other requests get `{"response": ...}` once
+    the whole completion would have been generated. Injected latency comes before the first chunk.
+    """
+
+    def __init__(self, chunks: List[str], chunk_delay: float = 0.05, **faults):
+        super().__init__(**faults)
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.requests = 0
+        self.streams_completed = 0
+        self.streams_aborted = 0
+        self.app = Starlette(routes=[Route("/api/chat", self.chat, methods=["POST"])])
+
+    async def chat(self, request: Request):
+        self.requests += 1
+        body = await request.json()
+        await self.delay()
+        failure = self.failure()
+        if failure is not None:
+            return failure
+        if not body.get("stream"):
+            await asyncio.sleep(self.chunk_delay * len(self.chunks))
+            return JSONResponse({"response": "".join(self.chunks)})
+        return StreamingResponse(self._stream(), media_type="text/plain")
+
+    async def _stream(self):
+        try:
+            for chunk in self.chunks:
+                yield chunk
+                await asyncio.sleep(self.chunk_delay)
+            self.streams_completed += 1
+        except (asyncio.CancelledError, GeneratorExit):
+            self.streams_aborted += 1
+            raise
+
+
+class FakeCoinGecko(FaultInjection):
+    """
+    Stand-in for the CoinGecko endpoints the backend calls, serving deterministic synthetic data
+    for any coin id. Failures can be scripted: `fail_next` queues error responses (optionally with
+    Retry-After) that are returned, in order, before normal responses resume.
+    """
+
+    def __init__(self, latency: float = 0.0, **faults):
+        super().__init__(latency=latency, **faults)
+        self.requests: Counter = Counter() # Path -> requests received, including failed ones
+        self._failures: Deque[Tuple[int, Optional[str]]] = deque()
+        self.app = Starlette(routes=[
+            Route("/coins/markets", self.markets),
+            Route("/coins/list", self.coins_list),
+            Route("/simple/price", self.simple_price),
+            Route("/coins/{crypto_id}/market_chart", self.market_chart),
+            Route("/coins/{crypto_id}/market_chart/range", self.market_chart),
+        ])
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def fail_next(self, status_code: int, times: int = 1, retry_after: Optional[str] = None) -> None:
+        self._failures.extend([(status_code, retry_after)] * times)
+
+    @staticmethod
+    def _price(crypto_id: str) -> float:
+        return float(sum(map(ord, crypto_id)) % 1000 + 1)
+
+    async def _respond(self, request: Request, build) -> JSONResponse:
+        self.requests[request.url.path] += 1
+        await self.delay()
+        if self._failures:
+            status_code, retry_after = self._failures.popleft()
+            headers = {"Retry-After": retry_after} if retry_after is not None else None
+            return JSONResponse({"status": {"error_code": status_code}}, status_code=status_code, headers=headers)
+        return self.failure() or JSONResponse(build())
+
+    async def markets(self, request: Request):
+        ids = request.query_params.get("ids")
+        per_page = int(request.query_params.get("per_page", 100))
+        crypto_ids = ids.split(",") if ids else [f"coin-{rank}" for rank in range(1, per_page + 1)]
+
+        def rows() -> List[Dict]:
+            return [{
+                "id": crypto_id, "symbol": crypto_id[:3], "name": crypto_id.title(), "image": f"https://example.com/{crypto_id}.png",
+                "current_price": self._price(crypto_id), "market_cap": self._price(crypto_id) * 1e6,
+                "market_cap_rank": rank, "total_volume": self._price(crypto_id) * 1e4,
+                "price_change_percentage_24h": 1.0,
+            } for rank, crypto_id in enumerate(crypto_ids, start=1)]
+
+        return await self._respond(request, rows)
+
+    async def coins_list(self, request: Request):
+        return await self._respond(request, lambda: [{"id": "bitcoin", "symbol": "btc", "name": "Bitcoin"}])
+
+    async def simple_price(self, request: Request):
+        crypto_ids = request.query_params["ids"].split(",")
+        currencies = request.query_params["vs_currencies"].split(",")
+        market_data = request.query_params.get("include_market_cap") == "true"
+
+        def prices() -> Dict[str, Dict[str, float]]:
+            result = {}
+            for crypto_id in crypto_ids:
+                price = self._price(crypto_id)
+                result[crypto_id] = {currency: price for currency in currencies}
+                if market_data:
+                    result[crypto_id].update({f"{currency}_market_cap": price * 1e6 for currency in currencies})
+                    result[crypto_id].update({f"{currency}_24h_vol": price * 1e4 for currency in currencies})
+            return result
+
+        return await self._respond(request, prices)
+
+    async def market_chart(self, request: Request):
+        price = self._price(request.path_params["crypto_id"])
+        now = time.time()
+        if "from" in request.query_params:
+            start, end = float(request.query_params["from"]), min(float(request.query_params["to"]), now)
+        else:
+            start, end = now - float(request.query_params.get("days", 1)) * 86400, now
+        # CoinGecko's automatic granularity: 5-minute points for 1 day, hourly up to 90 days, then daily
+        days = (end - start) / 86400
+        step_ms = 300_000 if days <= 1 else 3_600_000 if days <= 90 else 86_400_000
+
+        def chart() -> Dict[str, List[List[float]]]:
+            timestamps = range(int(start * 1000) // step_ms * step_ms + step_ms, int(end * 1000) + 1, step_ms)
+            return {
+                "prices": [[t, price] for t in timestamps],
+                "market_caps": [[t, price * 1e6] for t in timestamps],
+                "total_volumes": [[t, price * 1e4] for t in timestamps],
+            }
+
+        return await self._respond(request, chart)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def run_server(app, lifespan: str = "off") -> Iterator[str]:
+    """Serves `app` on a free localhost port for the duration of the block and yields its base URL."""
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan=lifespan, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Fake server did not start in time.")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
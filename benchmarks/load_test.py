@@ -0,0 +1,214 @@
+"""
+Load test of the whole backend against local fake CoinGecko and LLM servers.
+
+Starts the fakes and the app (lifespan included, so the poller, caches and governor are live)
+on localhost ports, drives scripted scenarios through a pool of concurrent HTTP connections and
+prints one JSON document: per scenario, throughput, latency percentiles, status codes and the
+upstream calls the scenario caused. Pass --baseline with the output of an earlier run to get
+the relative change of each figure, and --micro to include the intent and serialization
+micro-benchmarks.
+
+    python -m ciyexa_backend.benchmarks.load_test --output baseline.json
+    python -m ciyexa_backend.benchmarks.load_test --upstream-latency 0.2 --error-rate 0.05 --baseline baseline.json
+
+Application logging is disabled during the run so it does not interleave with the results.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+from ciyexa_backend.api.v1.dependencies import get_crypto_service, get_llm_service
+from ciyexa_backend.benchmarks.fake_servers import FakeCoinGecko, FakeLLM, run_server
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.main import app
+
+# (method, path, JSON body) of one request
+Call = Tuple[str, str, Optional[Dict]]
+
+CHAT_QUERIES = [
+    "What is the price of Bitcoin?",
+    "How much is bitcoin worth right now?",
+    "what is the price of BTC",
+    "What was the price of Bitcoin 7 days ago?",
+    "Is bitcoin up or down today?",
+]
+CLIENT_ID_HEADER = "X-Load-Client"
+LLM_CHUNKS = ["Bitcoin ", "is ", "trading ", "near ", "its ", "recent ", "range."]
+
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    next_call: Callable[[random.Random], Call]
+
+
+def chat_burst(rng: random.Random) -> Call:
+    return "POST", "/api/v1/agent/chat", {"query": rng.choice(CHAT_QUERIES)}
+
+
+def mixed_crypto(rng: random.Random) -> Call:
+    crypto_id = rng.choice(settings.SUPPORTED_CRYPTOS)
+    draw = rng.random()
+    if draw < 0.4:
+        return "GET", f"/api/v1/crypto/{crypto_id}", None
+    if draw < 0.6:
+        return "GET", f"/api/v1/crypto/top/{rng.choice((10, 50, 100))}", None
+    if draw < 0.85:
+        return "GET", f"/api/v1/crypto/historical/{crypto_id}?days={rng.choice((1, 7, 30))}", None
+    return "GET", f"/api/v1/crypto/historical/{crypto_id}?days=30&points=200&indicators=sma,volatility", None
+
+
+def long_historical(rng: random.Random) -> Call:
+    crypto_id = rng.choice(settings.SUPPORTED_CRYPTOS[:5])
+    days = rng.choice((365, 1825, 3650))
+    return "GET", f"/api/v1/crypto/historical/{crypto_id}?days={days}&points=500&summary=true", None
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (
+    Scenario("chat_burst", "Concurrent chat queries about one coin", chat_burst),
+    Scenario("mixed_crypto", "Coin, top-N and short historical lookups across the supported coins", mixed_crypto),
+    Scenario("long_historical", "Multi-year historical series, downsampled with a summary", long_historical),
+)}
+
+
+def coingecko_endpoint(path: str) -> str:
+    return re.sub(r"^/coins/(?!markets$|list$)[^/]+", "/coins/{id}", path)
+
+
+async def run_scenario(base_url: str, scenario: Scenario, requests: int, concurrency: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    calls = [scenario.next_call(rng) for _ in range(requests)]
+    latencies = np.zeros(requests)
+    statuses: Counter = Counter()
+    pending = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient, client_id: str) -> None:
+        for i in pending:
+            method, path, body = calls[i]
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body, headers={CLIENT_ID_HEADER: client_id})
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies[i] = time.perf_counter() - started
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, f"load-{n}") for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    p50, p90, p99 = np.percentile(latencies, (50, 90, 99)) * 1000
+    return {
+        "scenario": scenario.name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(float(p50), 2),
+        "p90_ms": round(float(p90), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(latencies.max()) * 1000, 2),
+        "statuses": dict(sorted(statuses.items())),
+        "error_ratio": round(sum(n for status, n in statuses.items() if not status.startswith(("2", "3"))) / requests, 4),
+    }
+
+
+def upstream_calls(coingecko: FakeCoinGecko, llm: FakeLLM) -> Counter:
+    calls = Counter({"llm": llm.requests})
+    for path, count in coingecko.requests.items():
+        calls[f"coingecko{coingecko_endpoint(path)}"] += count
+    return calls
+
+
+def compare(results: List[Dict], baseline: Dict) -> None:
+    """Adds the change against the same scenario of the baseline run to each result, in percent."""
+    previous = {result["scenario"]: result for result in baseline.get("scenarios", [])}
+    for result in results:
+        before = previous.get(result["scenario"])
+        if before is None:
+            continue
+        result["change_pct"] = {
+            key: round((result[key] - before[key]) / before[key] * 100, 1) if before[key] else None
+            for key in ("rps", "p50_ms", "p99_ms", "upstream_calls_total")
+        }
+
+
+async def run_load(args: argparse.Namespace) -> List[Dict]:
+    faults = dict(jitter=args.upstream_jitter, error_rate=args.error_rate, throttle_rate=args.throttle_rate, seed=args.seed)
+    coingecko = FakeCoinGecko(latency=args.upstream_latency, **faults)
+    llm = FakeLLM(LLM_CHUNKS, chunk_delay=args.llm_chunk_delay, latency=args.upstream_latency, **faults)
+
+    # Read when the app's lifespan builds the governor and history store
+    settings.COINGECKO_RATE_LIMIT_PER_MINUTE = args.upstream_rate_limit
+    settings.COIN_INDEX_REFRESH_ENABLED = False # The fake's /coins/list would replace the bundled index
+    settings.ADMISSION_CLIENT_HEADER = CLIENT_ID_HEADER # Each worker is its own client, not one shared peer address
+    results = []
+    with tempfile.TemporaryDirectory() as history_dir, run_server(coingecko.app) as coingecko_url, run_server(llm.app) as llm_url:
+        settings.HISTORY_STORE_PATH = history_dir
+        get_crypto_service().base_url = coingecko_url # The instance injected into both routers
+        get_llm_service().llm_api_url = get_llm_service().llm_stream_url = f"{llm_url}/api/chat"
+        with run_server(app, lifespan="on") as app_url:
+            for offset, name in enumerate(args.scenario or SCENARIOS):
+                before = upstream_calls(coingecko, llm)
+                result = await run_scenario(app_url, SCENARIOS[name], args.requests, args.concurrency, args.seed + offset)
+                calls = upstream_calls(coingecko, llm) - before
+                result["upstream_calls_total"] = sum(calls.values())
+                result["upstream_calls"] = dict(sorted(calls.items()))
+                results.append(result)
+    return results
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="Run only this scenario (repeatable).")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario.")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent connections.")
+    parser.add_argument("--upstream-latency", type=float, default=0.05, help="Seconds each fake upstream call takes.")
+    parser.add_argument("--upstream-jitter", type=float, default=0.02, help="Extra random latency, up to this many seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream calls answered with a 500.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of upstream calls answered with a 429.")
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.02, help="Seconds between LLM completion chunks.")
+    parser.add_argument("--upstream-rate-limit", type=float, default=6000.0, help="CoinGecko calls per minute the governor allows.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--micro", action="store_true", help="Also run the intent and serialization micro-benchmarks.")
+    parser.add_argument("--baseline", help="JSON output of an earlier run to compare against.")
+    parser.add_argument("--output", help="Write the results to this file instead of stdout.")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> Dict:
+    args = parse_args(argv)
+    logging.disable(logging.CRITICAL)
+    report = {"config": {key: value for key, value in vars(args).items() if key not in ("baseline", "output")}}
+    if args.micro:
+        from ciyexa_backend.benchmarks import bench_intent, bench_serialization
+        report["micro"] = {"intent": bench_intent.run(), "serialization": asyncio.run(bench_serialization.run())}
+    report["scenarios"] = asyncio.run(run_load(args))
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report["scenarios"], json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,17 +1,144 @@
 import os
+from pathlib import Path
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Ciyexa AI LLM Crypto Agent Backend"
     VERSION: str = "0.2.0" # Updated version
     DESCRIPTION: str = "Backend for Ciyexa, an AI LLM Crypto Agent with advanced data features."
     LLM_API_BASE_URL: str = "http://localhost:3000/api/chat" # URL to your Next.js LLM API
+    LLM_STREAM_API_URL: str = "" # Streaming route returning plain text chunks, defaults to LLM_API_BASE_URL
 
     # CoinGecko API configuration
     COINGECKO_API_BASE_URL: str = "https://api.coingecko.com/api/v3"
     COINGECKO_API_KEY: Optional[str] = None # Optional API key for CoinGecko (for higher rate limits)
     DEFAULT_VS_CURRENCY: str = "usd" # Default currency for price comparisons
+    COINGECKO_REQUEST_TIMEOUT: float = 15.0 # Seconds
+
+    # Client-side CoinGecko rate limiting, retries and circuit breaker
+    COINGECKO_FREE_RATE_LIMIT_PER_MINUTE: float = 30.0 # Public/demo plan
+    COINGECKO_PRO_RATE_LIMIT_PER_MINUTE: float = 500.0 # Used when COINGECKO_API_KEY is set
+    COINGECKO_RATE_LIMIT_PER_MINUTE: Optional[float] = None # Overrides the plan default; the budget is per worker process
+    COINGECKO_RATE_LIMIT_BURST: float = 10.0 # Calls that may go out back to back
+    COINGECKO_BACKGROUND_RESERVE: float = 2.0 # Tokens background refreshes leave for user requests
+    COINGECKO_MAX_QUEUE_WAIT: float = 10.0 # Seconds a call may wait for a token before failing
+    COINGECKO_MAX_RETRIES: int = 2 # On 429, 5xx and network errors
+    COINGECKO_BACKOFF_BASE: float = 0.5 # Seconds, doubled per attempt with full jitter
+    COINGECKO_BACKOFF_MAX: float = 8.0 # Seconds
+    COINGECKO_MAX_RETRY_AFTER: float = 30.0 # Longer Retry-After values (or ones over COINGECKO_MAX_QUEUE_WAIT) fail the call instead of waiting
+    COINGECKO_BREAKER_FAILURE_THRESHOLD: int = 5 # Consecutive failed calls (after their retries) that open the breaker
+    COINGECKO_BREAKER_RECOVERY_TIMEOUT: float = 30.0 # Seconds before a probe call is let through
+
+    # CoinGecko response cache (TTL + stale-while-revalidate)
+    CACHE_BACKEND: str = "memory" # "memory" (per worker) or "redis" (shared across workers)
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024 # Memory backend capacity
+    CACHE_DEFAULT_TTL: float = 30.0 # Seconds
+    CACHE_TTLS: Dict[str, float] = {
+        "simple_price": 10.0,
+        "coin": 30.0,
+        "markets": 60.0,
+        "market_chart_5m": 60.0, # days=1, 5-minute points
+        "market_chart_hourly": 600.0, # days 2-90, hourly points
+        "market_chart_daily": 3600.0, # days > 90, daily points
+    }
+    CACHE_STALE_TTL_RATIO: float = 5.0 # Serve stale data for up to ttl * ratio while refreshing
+    RESPONSE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024 # Pre-encoded JSON bodies of the crypto endpoints
+
+    # Micro-batching of single-coin market data lookups into one /coins/markets call
+    MARKET_DATA_BATCHING_ENABLED: bool = True
+    MARKET_DATA_BATCH_WINDOW_MS: float = 10.0 # How long the first lookup waits for others to join
+    MARKET_DATA_BATCH_MAX_SIZE: int = 100 # CoinGecko accepts up to 250 ids per page
+    CRYPTO_BATCH_MAX_IDS: int = 250 # Coins per /crypto/batch request
+    CRYPTO_BATCH_MAX_CURRENCIES: int = 10 # vs_currencies per /crypto/batch request
+
+    # Background market data poller feeding the in-memory snapshot
+    MARKET_POLLER_ENABLED: bool = True
+    MARKET_POLLER_INTERVAL: float = 15.0 # Seconds between refreshes
+    MARKET_POLLER_TOP_N: int = 100 # Size of the top-by-market-cap list kept in the snapshot
+    SNAPSHOT_MAX_AGE: float = 60.0 # Older snapshots are ignored and requests fall back to a live fetch
+    READY_SNAPSHOT_TIMEOUT: float = 10.0 # Seconds /ready waits for the first snapshot before reporting ready anyway
+    SNAPSHOT_MODE: str = "local" # "local" (each worker runs its poller) or "shared" (workers follow the snapshot_refresher process)
+    SNAPSHOT_SHARED_PATH: str = "" # mmap'd file, defaults to /dev/shm/ciyexa-<uid>/market-snapshot (or the temp dir); its directory must be private to the service user
+    SNAPSHOT_SHARED_MAX_BYTES: int = 4 * 1024 * 1024 # Largest encoded snapshot the region holds
+    SNAPSHOT_SHARED_POLL_INTERVAL: float = 0.5 # Seconds between workers' checks for a new snapshot
+
+    # WebSocket price push (/ws/prices), fed by the poller's snapshots
+    WS_PRICES_ENABLED: bool = True
+    WS_MAX_CONNECTIONS: int = 20000 # Per worker; further connections are closed with 1013 (try again later)
+    WS_MAX_SUBSCRIPTIONS: int = 100 # Coins per connection
+    WS_SEND_TIMEOUT: float = 5.0 # Seconds; clients that do not accept an update within this are disconnected
+
+    DATA_DIR: str = "" # Writable directory for the files below, defaults to ~/.cache/ciyexa (or $XDG_CACHE_HOME/ciyexa)
+
+    # Index over CoinGecko's /coins/list used to resolve ids, symbols and names
+    COIN_INDEX_PATH: str = "" # Snapshot file, defaults to coins_list.json.gz in DATA_DIR
+    COIN_INDEX_BUNDLE_PATH: str = "" # Prebuilt index and intent classifier, defaults to startup_bundle.pickle next to it
+    COIN_INDEX_REFRESH_ENABLED: bool = True
+    COIN_INDEX_REFRESH_INTERVAL: float = 24 * 3600.0 # Seconds
+    COIN_INDEX_RETRY_INTERVAL: float = 300.0 # Seconds before retrying a failed refresh
+    COIN_INDEX_WATCH_INTERVAL: float = 60.0 # Seconds between shared-mode workers' checks for a coin list written by the refresher
+    COIN_INDEX_FUZZY_MAX_DISTANCE: int = 1 # Typo tolerance; each extra edit multiplies index memory
+
+    # On-disk historical series store behind get_price_series (one file per coin, currency and granularity)
+    HISTORY_STORE_ENABLED: bool = True
+    HISTORY_STORE_PATH: str = "" # Directory, defaults to history in DATA_DIR
+    HISTORY_STORE_MAX_BYTES: int = 512 * 1024 * 1024 # Least recently synced series are deleted beyond this
+    HISTORY_RETENTION_DAYS: Dict[str, int] = { # Per market_chart granularity; longer requests bypass the store
+        "market_chart_5m": 2,
+        "market_chart_hourly": 90,
+        "market_chart_daily": 3650,
+    }
+
+    # Chat prompt enrichment (concurrent CoinGecko fetches per query)
+    ENRICHMENT_DEADLINE: float = 3.0 # Seconds; fetches still running after this are dropped from the prompt
+    ENRICHMENT_MAX_CONCURRENCY: int = 32 # Enrichment fetches in flight across all requests
+    ENRICHMENT_MAX_COINS: int = 5 # Coins per query that get data fetched
+
+    LLM_REQUEST_TIMEOUT: float = 60.0 # Seconds, LLM completions can be slow
+    LLM_CONCURRENCY_INITIAL: int = 16 # Starting AIMD limit on concurrent LLM API calls (per worker)
+    LLM_CONCURRENCY_MIN: int = 2
+    LLM_CONCURRENCY_MAX: int = 128
+    LLM_LATENCY_TARGET: float = 20.0 # Seconds; slower (or failed) calls shrink the limit, faster ones grow it
+    LLM_CONCURRENCY_BACKOFF: float = 0.7 # Multiplier applied to the limit on a slow or failed call
+    LLM_CONCURRENCY_MAX_WAIT: float = 10.0 # Seconds a call may wait for a slot before the request gets 503
+    PROMPT_TOKEN_BUDGET: int = 800 # Most tokens an enriched prompt may take; data rows beyond it are left out
+
+    # Admission control for /agent/chat and /agent/chat/stream (per worker)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_IN_FLIGHT: int = 64 # Chat requests processed at once; more wait in the queue
+    ADMISSION_MAX_PER_CLIENT: int = 4 # Running plus waiting requests per client; more get 429
+    ADMISSION_MAX_QUEUE: int = 256 # Waiting requests; more get 503
+    ADMISSION_QUEUE_TIMEOUT: float = 10.0 # Seconds a request may wait; requests expected to wait longer get 503 at once
+    ADMISSION_CLIENT_HEADER: str = "" # Header identifying the client (e.g. X-API-Key, X-Forwarded-For), defaults to the peer address
+
+    # Cache of LLM answers per normalized query, invalidated when the market data in the prompt changes
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL: float = 300.0 # Seconds; also bounds answers to queries without market data
+    LLM_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+
+    # Prometheus-style metrics
+    METRICS_ENABLED: bool = True
+    METRICS_PATH: str = "/metrics"
+    METRICS_LOOP_LAG_INTERVAL: float = 0.5 # Seconds between event-loop lag samples
+
+    # Logging (records are queued and written to stdout by a background thread)
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text" # "text" or "json" (one object per line, for log shippers)
+    LOG_QUEUE_SIZE: int = 10000 # Records waiting to be written; new records are dropped when full
+    LOG_SAMPLING_RATES: Dict[str, float] = {} # Logger name -> share of its INFO/DEBUG records kept, e.g. {"httpx": 0.1}
+    LOG_REQUEST_ID_HEADER: str = "X-Request-ID" # Read from requests (or generated) and echoed in responses
+
+    # Shared pooled HTTP client (created in the FastAPI lifespan hook)
+    HTTP_CLIENT_HTTP2: bool = True # Requires the 'h2' package, falls back to HTTP/1.1 otherwise
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 100
+    HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = 30.0 # Seconds an idle connection is kept open
+    HTTP_CLIENT_CONNECT_TIMEOUT: float = 5.0
+    HTTP_CLIENT_READ_TIMEOUT: float = 15.0 # Default, overridden per request by the services
+    HTTP_CLIENT_POOL_TIMEOUT: float = 5.0 # Seconds to wait for a free connection from the pool
+    HTTP_CLIENT_SHUTDOWN_GRACE: float = 10.0 # Seconds to let in-flight requests drain on shutdown
 
     # List of supported cryptocurrencies (CoinGecko IDs)
     SUPPORTED_CRYPTOS: list[str] = [
@@ -23,4 +150,12 @@ class Settings(BaseSettings):
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
+    @property
+    def data_dir(self) -> Path:
+        # Per user, and not the package directory, which is often read-only in deployments
+        if self.DATA_DIR:
+            return Path(self.DATA_DIR)
+        cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return Path(cache_home) / "ciyexa"
+
 settings = Settings()
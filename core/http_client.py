@@ -0,0 +1,100 @@
+import asyncio
+import importlib.util
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class HTTPClientManager:
+    """
+    Owns the process-wide pooled httpx.AsyncClient shared by the services.
+
+    The client is started from the FastAPI lifespan hook so connections to CoinGecko
+    and the LLM API are kept alive across requests. Until it is started (scripts, tests),
+    `session()` falls back to a one-shot client per call.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._in_flight = 0
+        self._idle: Optional[asyncio.Event] = None
+
+    @property
+    def is_started(self) -> bool:
+        return self._client is not None
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def start(self) -> httpx.AsyncClient:
+        """Creates the pooled client using the limits and timeouts from settings."""
+        if self._client is not None:
+            return self._client
+
+        http2 = settings.HTTP_CLIENT_HTTP2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed. Falling back to HTTP/1.1.")
+            http2 = False
+
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                settings.HTTP_CLIENT_READ_TIMEOUT,
+                connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT,
+                pool=settings.HTTP_CLIENT_POOL_TIMEOUT,
+            ),
+        )
+        self._idle = asyncio.Event()
+        self._idle.set()
+        logger.info("Started shared HTTP client (http2=%s, max_connections=%s).", http2, settings.HTTP_CLIENT_MAX_CONNECTIONS)
+        return self._client
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        Yields the shared client and tracks the request as in-flight so shutdown can drain it.
+        """
+        if self._client is None:
+            async with httpx.AsyncClient() as client:
+                yield client
+            return
+
+        self._in_flight += 1
+        self._idle.clear()
+        try:
+            yield self._client
+        finally:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.set()
+
+    async def close(self, grace_period: Optional[float] = None) -> None:
+        """
+        Waits up to `grace_period` seconds for in-flight requests to finish, then closes the pool.
+        """
+        if self._client is None:
+            return
+
+        grace_period = settings.HTTP_CLIENT_SHUTDOWN_GRACE if grace_period is None else grace_period
+        if self._in_flight:
+            logger.info("Draining %s in-flight upstream request(s) before shutdown.", self._in_flight)
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=grace_period)
+            except asyncio.TimeoutError:
+                logger.warning("%s upstream request(s) still in flight after %ss. Closing anyway.", self._in_flight, grace_period)
+
+        client, self._client = self._client, None
+        await client.aclose()
+        logger.info("Shared HTTP client closed.")
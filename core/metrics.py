@@ -0,0 +1,384 @@
+"""
+In-process metrics in the Prometheus text exposition format: counters, gauges and histograms
+with labels, an ASGI middleware for per-route request metrics, stage timers for the chat
+pipeline and upstream calls, and an event-loop lag monitor.
+
+Recording a sample is a dict lookup plus a bisect, so instrumentation costs around a microsecond;
+component statistics (cache hit ratios, governor state) are pulled from their stats() only when
+/metrics is scraped.
+"""
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+MAX_MEMOIZED_PATHS = 10_000 # Route labels remembered per concrete path by MetricsMiddleware
+LOOP_LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+PROMPT_TOKEN_BUCKETS = (25, 50, 100, 200, 400, 800, 1600, 3200)
+
+Sample = Tuple[str, Dict[str, str], float] # (metric name with suffix, labels, value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        ...
+
+    def samples(self) -> Iterator[Sample]:
+        for values, child in list(self._children.items()):
+            yield from child.samples(self.name, dict(zip(self.labelnames, values)))
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterator[Sample]:
+        yield f"{name}_total", labels, self.value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterator[Sample]:
+        yield name, labels, self.value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # Per bucket, not cumulative; the last is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterator[Sample]:
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            yield f"{name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        child = self.labels(*labels)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            child.observe(time.perf_counter() - started)
+
+
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class MetricsRegistry:
+    """
+    Holds the metrics of one process. Collectors are called at scrape time and return
+    (name, type, help, [(labels, value)]) families, e.g. built from a component's stats().
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Collector] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, name: str, collector: Collector) -> None:
+        """Registers (or replaces) a scrape-time collector under `name`."""
+        self._collectors[name] = collector
+
+    def remove_collector(self, name: str) -> None:
+        self._collectors.pop(name, None)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            family = f"{metric.name}_total" if metric.kind == "counter" else metric.name
+            lines.append(f"# HELP {family} {metric.documentation}")
+            lines.append(f"# TYPE {family} {metric.kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in metric.samples())
+        # Collectors of similar components emit the same family names; each family is written once
+        collected: Dict[str, Tuple[str, str, List[Tuple[Dict[str, str], float]]]] = {}
+        for name, collector in list(self._collectors.items()):
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.error("Metrics collector %s failed: %s", name, e)
+                continue
+            for family, kind, documentation, samples in families:
+                collected.setdefault(family, (kind, documentation, []))[2].extend(samples)
+        for family, (kind, documentation, samples) in collected.items():
+            lines.append(f"# HELP {family} {documentation}")
+            lines.append(f"# TYPE {family} {kind}")
+            lines.extend(f"{family}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter("ciyexa_http_requests", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "ciyexa_http_request_duration_seconds", "Time until the response body was fully sent.", ("method", "route")
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge("ciyexa_http_requests_in_flight", "HTTP requests being handled.")
+CHAT_STAGE_DURATION = REGISTRY.histogram(
+    "ciyexa_chat_stage_duration_seconds", "Time spent in each stage of the chat pipeline.", ("stage",)
+)
+LLM_PROMPT_TOKENS = REGISTRY.histogram(
+    "ciyexa_llm_prompt_tokens", "Tokens in the prompts sent to the LLM.", ("source",), buckets=PROMPT_TOKEN_BUCKETS
+)
+UPSTREAM_DURATION = REGISTRY.histogram(
+    "ciyexa_upstream_request_duration_seconds",
+    "Upstream calls as seen by callers, including rate limiting and retries.",
+    ("upstream", "endpoint", "outcome"),
+)
+UPSTREAM_RESPONSES = REGISTRY.counter("ciyexa_upstream_responses", "Upstream HTTP responses by status code.", ("upstream", "status"))
+EVENT_LOOP_LAG = REGISTRY.histogram(
+    "ciyexa_event_loop_lag_seconds", "How late the event loop ran a timer scheduled by the lag monitor.", buckets=LOOP_LAG_BUCKETS
+)
+
+
+class stage_timer:
+    """Context manager recording the duration of a chat pipeline stage (a class, as generator-based ones cost several µs)."""
+    __slots__ = ("child", "started")
+
+    def __init__(self, stage: str):
+        self.child = CHAT_STAGE_DURATION.labels(stage)
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.child.observe(time.perf_counter() - self.started)
+
+
+def stats_collector(prefix: str, component: str, stats: Callable[[], Dict[str, float]], counters: Sequence[str] = ()) -> Collector:
+    """
+    Exposes a component's stats() dict: keys listed in `counters` as `<prefix>_<key>_total`
+    counters, every other numeric key as a `<prefix>_<key>` gauge, all labelled with `component`.
+    Components reporting hits and misses also get a `<prefix>_hit_ratio` gauge.
+    """
+    def collect():
+        values = stats()
+        if "hits" in values and "misses" in values and "hit_ratio" not in values:
+            lookups = values["hits"] + values["misses"]
+            values = {**values, "hit_ratio": values["hits"] / lookups if lookups else 0.0}
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            kind = "counter" if key in counters else "gauge"
+            name = f"{prefix}_{key}_total" if kind == "counter" else f"{prefix}_{key}"
+            yield name, kind, f"{key.replace('_', ' ').capitalize()} ({prefix}).", [({"component": component}, value)]
+    return collect
+
+
+def _route_template(scope: Scope) -> str:
+    """
+    The request path with path parameter values replaced by their names, e.g. /crypto/coin/{crypto_id}.
+    Derived from the parameters rather than the matched route object, whose path may not include
+    the prefixes of the routers it was included through.
+    """
+    if scope.get("route") is None:
+        return "unmatched"
+    params = scope.get("path_params")
+    if not params:
+        return scope["path"]
+    names = {str(value): f"{{{name}}}" for name, value in params.items()}
+    return "/".join(names.get(segment, segment) for segment in scope["path"].split("/"))
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request count, latency and in-flight requests per route.
+    Requests are labelled with the matched route's path template, so ids in URLs do not create
+    new series; unmatched paths share one label. /metrics itself is not recorded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.metrics_path = settings.METRICS_PATH
+        self._in_flight = HTTP_IN_FLIGHT.labels()
+        self._series: Dict[Tuple[str, str, int], Tuple[_HistogramChild, _CounterChild]] = {}
+        self._templates: Dict[Tuple[int, str], str] = {} # (route id, path) -> label; building one costs a few µs
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] == self.metrics_path:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self._in_flight.value += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self._in_flight.value -= 1
+            path_key = (id(scope.get("route")), scope["path"]) # Routes live as long as the app; some are unhashable
+            template = self._templates.get(path_key)
+            if template is None:
+                if len(self._templates) >= MAX_MEMOIZED_PATHS:
+                    self._templates.clear()
+                template = self._templates[path_key] = _route_template(scope)
+            key = (scope["method"], template, status_code)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = (
+                    HTTP_REQUEST_DURATION.labels(key[0], key[1]),
+                    HTTP_REQUESTS.labels(key[0], key[1], str(status_code)),
+                )
+            series[0].observe(time.perf_counter() - started)
+            series[1].value += 1
+
+
+class EventLoopLagMonitor:
+    """Sleeps `interval` seconds at a time and records how much later than requested it woke up."""
+
+    def __init__(self, interval: float = None):
+        self.interval = interval or settings.METRICS_LOOP_LAG_INTERVAL
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(max(0.0, loop.time() - scheduled))
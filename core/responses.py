@@ -0,0 +1,113 @@
+"""
+Fast JSON response path: orjson encoding (with a stdlib fallback), payloads encoded once per data
+version, and ETag / If-None-Match revalidation.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+import numpy as np
+from pydantic import BaseModel
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from ciyexa_backend.core.config import settings
+
+try:
+    import orjson
+except ImportError: # Optional dependency; falls back to the standard library encoder
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        # Already validated on ingest, so only dump it; orjson encodes the nested datetimes itself
+        return value.model_dump() if orjson is not None else value.model_dump(mode="json")
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_json(content: Any) -> bytes:
+    """Encodes JSON-like content, Pydantic models and NumPy arrays to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z,
+        )
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class; renders with encode_json instead of json.dumps."""
+
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+
+class EncodedPayload(NamedTuple):
+    body: bytes
+    etag: str # Strong validator derived from the body, identical across worker processes
+
+
+def encode_payload(content: Any) -> EncodedPayload:
+    body = encode_json(content)
+    return EncodedPayload(body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def payload_response(request: Request, payload: EncodedPayload, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Sends a pre-encoded payload, or an empty 304 if the client already has this version."""
+    headers = {"ETag": payload.etag, **(headers or {})}
+    if etag_matches(request, payload.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(payload.body, media_type="application/json", headers=headers)
+
+
+class EncodedResponseCache:
+    """
+    Encoded payloads keyed by request, each tagged with the version of the data it was built
+    from (e.g. a market snapshot version). A payload is encoded once per version and reused until
+    the version changes; least recently used payloads are dropped beyond `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes or settings.RESPONSE_CACHE_MAX_BYTES
+        self.current_bytes = 0
+        self._payloads: "OrderedDict[Hashable, Tuple[Hashable, EncodedPayload]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_encode(self, key: Hashable, version: Hashable, build: Callable[[], Any]) -> EncodedPayload:
+        entry = self._payloads.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            self._payloads.move_to_end(key)
+            return entry[1]
+
+        self.misses += 1
+        payload = encode_payload(build())
+        if entry is not None:
+            self.current_bytes -= len(entry[1].body)
+        self._payloads[key] = (version, payload)
+        self._payloads.move_to_end(key)
+        self.current_bytes += len(payload.body)
+        while self.current_bytes > self.max_bytes and len(self._payloads) > 1:
+            _, (_, evicted) = self._payloads.popitem(last=False)
+            self.current_bytes -= len(evicted.body)
+        return payload
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._payloads), "bytes": self.current_bytes}
@@ -1,11 +1,150 @@
-from fastapi import FastAPI
+import asyncio
+import gc
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from ciyexa_backend.api.v1.dependencies import get_crypto_service, get_llm_service
 from ciyexa_backend.api.v1.endpoints import agent, crypto # Import new crypto endpoints
 from ciyexa_backend.core.config import settings
-from ciyexa_backend.utils.logger import setup_logging
+from ciyexa_backend.core.http_client import HTTPClientManager
+from ciyexa_backend.core.metrics import CONTENT_TYPE, REGISTRY, EventLoopLagMonitor, MetricsMiddleware, stats_collector
+from ciyexa_backend.core.responses import FastJSONResponse
+from ciyexa_backend.services.admission import AdmissionRejected
+from ciyexa_backend.services.cache import TTLCache, create_cache_backend
+from ciyexa_backend.services.coin_index import CoinIndexRefresher, CoinIndexWatcher, load_coin_artifacts
+from ciyexa_backend.services.governor import UpstreamGovernor
+from ciyexa_backend.services.history_store import HistoryStore
+from ciyexa_backend.services.market_poller import MarketDataPoller
+from ciyexa_backend.services.market_snapshot import SnapshotStore
+from ciyexa_backend.services.shared_snapshot import SharedSnapshotFollower
+from ciyexa_backend.services.singleflight import SingleFlight
+from ciyexa_backend.utils.logger import RequestIdMiddleware, get_logger, logging_stats, setup_logging
 
-# Setup logging
-setup_logging()
+logger = get_logger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    # Startup only wires components together; loading heavy artifacts is left to warm_up(), tracked by /ready
+    app.state.ready = asyncio.Event()
+    crypto_service = get_crypto_service() # The one instance both routers use
+    llm_service = get_llm_service()
+
+    # One pooled HTTP client per worker process, shared by every service instance
+    http_client = HTTPClientManager()
+    await http_client.start()
+    app.state.http_client = http_client
+    for service in (llm_service, crypto_service):
+        service.http_client = http_client
+
+    coingecko_cache = TTLCache(create_cache_backend(), name="coingecko")
+    coingecko_single_flight = SingleFlight(name="coingecko")
+    coingecko_governor = UpstreamGovernor() # One rate limit budget and breaker per worker
+    app.state.coingecko_cache = coingecko_cache
+    app.state.coingecko_single_flight = coingecko_single_flight
+    app.state.coingecko_governor = coingecko_governor
+    market_snapshots = SnapshotStore()
+    app.state.market_snapshots = market_snapshots
+    first_snapshot = asyncio.Event()
+    market_snapshots.add_listener(lambda snapshot: first_snapshot.set())
+    if settings.WS_PRICES_ENABLED:
+        market_snapshots.add_listener(crypto.price_feed.publish)
+    crypto_service.cache = coingecko_cache
+    crypto_service.single_flight = coingecko_single_flight
+    crypto_service.governor = coingecko_governor
+    crypto_service.snapshots = market_snapshots
+    if settings.HISTORY_STORE_ENABLED:
+        history_store = HistoryStore()
+        app.state.history_store = history_store
+        crypto_service.history_store = history_store
+
+    def use_coin_index(index, classifier):
+        crypto_service.coin_index = index
+        agent.intent_classifier = classifier
+
+    shared_snapshot = settings.SNAPSHOT_MODE == "shared"
+    coin_index_refresher = CoinIndexRefresher(crypto_service.fetch_coins_list, use_coin_index)
+    coin_index_watcher = CoinIndexWatcher(use_coin_index) # Picks up the refresher process's coin list in shared mode
+    market_poller = MarketDataPoller(crypto_service, market_snapshots)
+    snapshot_follower = SharedSnapshotFollower(market_snapshots)
+    if shared_snapshot:
+        # The snapshot_refresher process polls CoinGecko and refreshes the coin list for every worker on the host
+        await snapshot_follower.start()
+        REGISTRY.add_collector("shared_snapshot", stats_collector(
+            "ciyexa_shared_snapshot", "follower", snapshot_follower.stats, ("updates", "errors", "torn_reads")
+        ))
+    elif settings.MARKET_POLLER_ENABLED:
+        await market_poller.start()
+
+    async def warm_up():
+        try:
+            await _warm_up()
+        except Exception as e:
+            logger.error("Warm-up failed: %s. Staying unready.", e)
+
+    async def _warm_up():
+        started = time.perf_counter()
+        # From the prebuilt bundle when it is current, so the index is not rebuilt on every cold start
+        coin_index, classifier = await asyncio.to_thread(load_coin_artifacts)
+        use_coin_index(coin_index, classifier)
+        if shared_snapshot:
+            await coin_index_watcher.start(coin_index)
+        elif settings.COIN_INDEX_REFRESH_ENABLED:
+            await coin_index_refresher.start(coin_index)
+        await asyncio.to_thread(coin_index.build_fuzzy_index)
+        if shared_snapshot or settings.MARKET_POLLER_ENABLED:
+            try:
+                await asyncio.wait_for(first_snapshot.wait(), settings.READY_SNAPSHOT_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("No market snapshot within %ss. Reporting ready without one.", settings.READY_SNAPSHOT_TIMEOUT)
+        # Everything loaded so far lives as long as the process; moving it out of the collected
+        # generations keeps full collections from walking the coin index every time
+        gc.freeze()
+        app.state.ready.set()
+        logger.info("Warm-up finished in %.2fs (%s coins indexed).", time.perf_counter() - started, len(coin_index))
+
+    warm_up_task = asyncio.create_task(warm_up())
+
+    # Component statistics are read when /metrics is scraped
+    cache_counters = ("hits", "stale_hits", "misses", "refreshes", "refresh_errors", "evictions", "invalidations", "expirations")
+    REGISTRY.add_collector("coingecko_cache", stats_collector("ciyexa_cache", "coingecko", coingecko_cache.stats, cache_counters))
+    REGISTRY.add_collector("llm_cache", stats_collector("ciyexa_cache", "llm", agent.llm_cache.stats, cache_counters))
+    REGISTRY.add_collector("encoded_responses", stats_collector("ciyexa_cache", "encoded_responses", crypto.encoded_responses.stats, cache_counters))
+    REGISTRY.add_collector("coingecko_single_flight", stats_collector(
+        "ciyexa_single_flight", "coingecko", coingecko_single_flight.stats, ("executions", "coalesced", "cancelled")
+    ))
+    REGISTRY.add_collector("coingecko_governor", stats_collector(
+        "ciyexa_upstream_governor", "coingecko", coingecko_governor.stats, ("calls", "retries", "throttled", "breaker_opened", "breaker_rejected")
+    ))
+    REGISTRY.add_collector("price_feed", stats_collector(
+        "ciyexa_price_feed", "websocket", crypto.price_feed.stats, ("broadcasts", "updates", "messages_sent", "coalesced", "slow_disconnects")
+    ))
+    REGISTRY.add_collector("admission", stats_collector(
+        "ciyexa_admission", "chat", agent.admission.stats,
+        ("admitted", "rejected_client_limit", "rejected_queue_full", "rejected_shed", "rejected_timeout"),
+    ))
+    REGISTRY.add_collector("llm_concurrency", stats_collector(
+        "ciyexa_llm_concurrency", "llm", llm_service.concurrency.stats, ("increases", "decreases", "rejected")
+    ))
+    REGISTRY.add_collector("logging", stats_collector("ciyexa_log_records", "queue", logging_stats, ("dropped", "sampled_out")))
+    loop_lag_monitor = EventLoopLagMonitor()
+    if settings.METRICS_ENABLED:
+        await loop_lag_monitor.start()
+    try:
+        yield
+    finally:
+        app.state.ready.clear() # Shutting down: out of the load balancer's rotation
+        warm_up_task.cancel()
+        await asyncio.gather(warm_up_task, return_exceptions=True)
+        await loop_lag_monitor.stop()
+        await snapshot_follower.stop()
+        await market_poller.stop()
+        await coin_index_refresher.stop()
+        await coin_index_watcher.stop()
+        await coingecko_cache.close()
+        await http_client.close()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -13,6 +152,8 @@ app = FastAPI(
     description=settings.DESCRIPTION,
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # Configure CORS
@@ -22,8 +163,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[settings.LOG_REQUEST_ID_HEADER],
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get(settings.METRICS_PATH, include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+ADMISSION_REJECTED_DETAIL = {
+    429: "Too many concurrent chat requests from this client. Try again later.",
+    503: "The chat service is busy. Try again later.",
+}
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": ADMISSION_REJECTED_DETAIL[exc.status_code], "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# Outermost, so every log record written while handling a request carries its id
+app.add_middleware(RequestIdMiddleware)
+
 # Include API routers
 app.include_router(agent.router, prefix="/api/v1", tags=["Agent"])
 app.include_router(crypto.router, prefix="/api/v1", tags=["Crypto Data"]) # Include new crypto router
@@ -31,3 +196,11 @@ app.include_router(crypto.router, prefix="/api/v1", tags=["Crypto Data"]) # Incl
 @app.get("/")
 async def root():
     return {"message": "Welcome to Ciyexa AI LLM Crypto Agent Backend!"}
+
+@app.get("/ready", include_in_schema=False)
+async def ready(request: Request):
+    """Readiness probe: 503 until warm-up has loaded the coin index and the first market snapshot."""
+    warm = getattr(request.app.state, "ready", None)
+    if warm is not None and warm.is_set():
+        return {"status": "ready"}
+    return JSONResponse(status_code=503, content={"status": "warming_up"})
@@ -0,0 +1,234 @@
+"""
+Admission control for the chat endpoints: per-client and global in-flight limits in front of a
+bounded wait queue that sheds requests it could not start in time, and an adaptive (AIMD)
+concurrency limit for calls to the LLM API.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SERVICE_TIME_WEIGHT = 0.2 # Weight of the latest sample in the moving average of slot hold times
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is turned away; answered with `status_code` and a Retry-After header."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionController:
+    """
+    Admits up to `max_in_flight` requests at once, at most `max_per_client` of them (running or
+    waiting) from the same client. Requests over the global limit wait in a FIFO queue of at most
+    `max_queue` entries for up to `queue_timeout` seconds. A request whose expected wait (from the
+    queue length and the average time a request holds its slot) exceeds the timeout is rejected
+    up front rather than after waiting in vain: 429 for clients over their limit, 503 otherwise.
+    """
+
+    def __init__(self, max_in_flight: int = None, max_per_client: int = None, max_queue: int = None, queue_timeout: float = None):
+        self.max_in_flight = max_in_flight or settings.ADMISSION_MAX_IN_FLIGHT
+        self.max_per_client = max_per_client or settings.ADMISSION_MAX_PER_CLIENT
+        self.max_queue = max_queue if max_queue is not None else settings.ADMISSION_MAX_QUEUE
+        self.queue_timeout = queue_timeout or settings.ADMISSION_QUEUE_TIMEOUT
+        self.in_flight = 0
+        self.service_time: Optional[float] = None # Moving average of seconds a request holds its slot
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"client_limit": 0, "queue_full": 0, "shed": 0, "timeout": 0}
+        self._clients: Dict[str, int] = {} # Running plus waiting requests per client
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for future in self._waiters if not future.done())
+
+    def expected_wait(self, position: int) -> float:
+        """Seconds until the request at `position` in the queue (1 = head) should get a slot."""
+        if self.service_time is None:
+            return 0.0
+        return self.service_time * position / self.max_in_flight
+
+    def _reject(self, client_id: str, status_code: int, reason: str, retry_after: float) -> AdmissionRejected:
+        self.rejected[reason] += 1
+        self._leave(client_id)
+        logger.warning("Rejected chat request from %s (%s).", client_id, reason)
+        return AdmissionRejected(status_code, reason, retry_after)
+
+    def _leave(self, client_id: str) -> None:
+        count = self._clients.get(client_id, 0) - 1
+        if count > 0:
+            self._clients[client_id] = count
+        else:
+            self._clients.pop(client_id, None)
+
+    async def acquire(self, client_id: str) -> Callable[[], None]:
+        """
+        Waits for a slot and returns the function that gives it back; calling it more than once
+        is harmless. Raises AdmissionRejected instead of waiting when the request cannot be
+        admitted within the queue timeout.
+        """
+        if self._clients.get(client_id, 0) >= self.max_per_client:
+            self.rejected["client_limit"] += 1
+            logger.warning("Rejected chat request from %s (client_limit).", client_id)
+            raise AdmissionRejected(429, "client_limit", self.service_time or 1.0)
+        self._clients[client_id] = self._clients.get(client_id, 0) + 1
+
+        if self.in_flight < self.max_in_flight and not self.queued:
+            self.in_flight += 1
+        else:
+            position = self.queued + 1
+            if position > self.max_queue:
+                raise self._reject(client_id, 503, "queue_full", self.expected_wait(position))
+            if self.expected_wait(position) > self.queue_timeout:
+                raise self._reject(client_id, 503, "shed", self.expected_wait(position))
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await asyncio.wait((future,), timeout=self.queue_timeout)
+            except asyncio.CancelledError: # The client went away while waiting
+                if future.done():
+                    self._release_slot() # Granted just as the caller gave up; hand the slot on
+                future.cancel()
+                self._leave(client_id)
+                raise
+            if not future.done():
+                future.cancel()
+                raise self._reject(client_id, 503, "timeout", self.expected_wait(self.queued + 1))
+
+        self.admitted += 1
+        started = time.monotonic()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if released:
+                return
+            released = True
+            elapsed = time.monotonic() - started
+            self.service_time = elapsed if self.service_time is None else (
+                SERVICE_TIME_WEIGHT * elapsed + (1 - SERVICE_TIME_WEIGHT) * self.service_time
+            )
+            self._leave(client_id)
+            self._release_slot()
+
+        return release
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < self.max_in_flight:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "limit": self.max_in_flight,
+            "queue_limit": self.max_queue,
+            "clients": len(self._clients),
+            "admitted": self.admitted,
+            **{f"rejected_{reason}": count for reason, count in self.rejected.items()},
+            "service_time_seconds": self.service_time or 0.0,
+        }
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit for LLM API calls that adapts to the API's latency: each call that completes
+    within `latency_target` raises the limit by 1/limit (about +1 per limit's worth of calls),
+    while a slower or failed call multiplies it by `backoff`, at most once per `latency_target`
+    so one burst of slow calls does not collapse it. Calls over the limit wait up to `max_wait`.
+    """
+
+    def __init__(
+        self,
+        initial: int = None,
+        min_limit: int = None,
+        max_limit: int = None,
+        latency_target: float = None,
+        backoff: float = None,
+        max_wait: float = None,
+    ):
+        self.min_limit = min_limit or settings.LLM_CONCURRENCY_MIN
+        self.max_limit = max_limit or settings.LLM_CONCURRENCY_MAX
+        self.limit = float(initial or settings.LLM_CONCURRENCY_INITIAL)
+        self.latency_target = latency_target or settings.LLM_LATENCY_TARGET
+        self.backoff = backoff or settings.LLM_CONCURRENCY_BACKOFF
+        self.max_wait = max_wait or settings.LLM_CONCURRENCY_MAX_WAIT
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self.rejected = 0
+        self._last_decrease = float("-inf")
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        """Raises AdmissionRejected (503) when no slot frees up within `max_wait`."""
+        if self.in_flight < int(self.limit) and not any(not f.done() for f in self._waiters):
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait((future,), timeout=self.max_wait)
+        except asyncio.CancelledError:
+            if future.done():
+                self._dispatch(released=True)
+            future.cancel()
+            raise
+        if not future.done():
+            future.cancel()
+            self.rejected += 1
+            logger.warning("No LLM call slot within %ss (limit %s). Rejecting the request.", self.max_wait, int(self.limit))
+            raise AdmissionRejected(503, "llm_overloaded", self.max_wait)
+
+    def release(self, latency: float, overloaded: bool = False, skip_adjust: bool = False) -> None:
+        """
+        Gives the slot back and adjusts the limit from the call's latency (or failure). Calls
+        abandoned before they said anything about the API's latency pass `skip_adjust`.
+        """
+        if skip_adjust:
+            self._dispatch(released=True)
+            return
+        now = time.monotonic()
+        if overloaded or latency > self.latency_target:
+            if now - self._last_decrease >= self.latency_target:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+                self.decreases += 1
+                logger.info("LLM concurrency limit lowered to %s (latency %.1fs).", int(self.limit), latency)
+        elif self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.increases += 1
+        self._dispatch(released=True)
+
+    def _dispatch(self, released: bool = False) -> None:
+        if released:
+            self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": sum(1 for future in self._waiters if not future.done()),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "rejected": self.rejected,
+        }
+
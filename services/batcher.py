@@ -0,0 +1,74 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+BatchDispatch = Callable[[List[Hashable]], Awaitable[Optional[Dict[Hashable, Any]]]]
+
+
+class MicroBatcher:
+    """
+    Collects single-key lookups that arrive within a short window and serves them with one bulk call.
+
+    The first submission opens a window of `window` seconds. Every key submitted before it closes
+    (or until `max_batch_size` distinct keys are pending) goes out in a single `dispatch` call, whose
+    result is split back to the callers by key. Keys missing from the result resolve to None, and a
+    dispatch exception is raised in every caller of that batch.
+    """
+
+    def __init__(self, dispatch: BatchDispatch, window: float, max_batch_size: int, name: str = "batcher"):
+        self.dispatch = dispatch
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.name = name
+        self.submitted = 0
+        self.batches = 0
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def submit(self, key: Hashable) -> Any:
+        self.submitted += 1
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            # Retrieve the outcome even if every caller was cancelled, to avoid "never retrieved" warnings
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch_size:
+                self.flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self.flush)
+        # Several callers may share one future: a cancelled caller must not cancel it for the rest
+        return await asyncio.shield(future)
+
+    def flush(self) -> None:
+        """Dispatches everything pending right away."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.create_task(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "submitted": self.submitted,
+            "batches": self.batches,
+            "avg_batch_size": (self.submitted / self.batches) if self.batches else 0.0,
+        }
+
+    async def _run(self, batch: Dict[Hashable, asyncio.Future]) -> None:
+        self.batches += 1
+        try:
+            results = await self.dispatch(list(batch)) or {}
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(results.get(key))
@@ -0,0 +1,235 @@
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+def json_size(value: Any) -> int:
+    """Approximates the memory cost of a JSON-like value by its compact encoded length."""
+    return len(json.dumps(value, separators=(",", ":")))
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    size: int
+    stored_at: float # Wall-clock time so entries stay comparable across worker processes
+    ttl: float
+    stale_ttl: float
+
+    def is_fresh(self, now: float) -> bool:
+        return now - self.stored_at < self.ttl
+
+    def is_servable(self, now: float) -> bool:
+        """True while the entry may still be served (possibly stale) during a refresh."""
+        return now - self.stored_at < self.ttl + self.stale_ttl
+
+
+class CacheBackend(ABC):
+    """Storage interface for TTLCache. Implementations must be safe to share across coroutines."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, entry: CacheEntry) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    async def clear(self) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU capped by the total estimated size of its entries."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not entry.is_servable(time.time()):
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: CacheEntry) -> None:
+        if entry.size > self.max_bytes:
+            logger.warning("Not caching %s: %s bytes exceeds the cache capacity of %s bytes.", key, entry.size, self.max_bytes)
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.current_bytes += entry.size
+        while self.current_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self.current_bytes, "evictions": self.evictions}
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Stores entries in any Redis-compatible server so several uvicorn workers share one cache.
+    Memory is bounded by the server's own `maxmemory` policy. Values must be JSON-serializable.
+    """
+
+    def __init__(self, url: str, key_prefix: str = "ciyexa:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND='redis' requires the 'redis' package (pip install redis).") from e
+        self._redis = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        raw = await self._redis.get(self.key_prefix + key)
+        if raw is None:
+            return None
+        return CacheEntry(**json.loads(raw))
+
+    async def set(self, key: str, entry: CacheEntry) -> None:
+        payload = json.dumps(entry.__dict__, separators=(",", ":"))
+        expire_ms = max(1, int((entry.ttl + entry.stale_ttl) * 1000))
+        await self._redis.set(self.key_prefix + key, payload, px=expire_ms)
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(self.key_prefix + key)
+
+    async def clear(self) -> None:
+        async for key in self._redis.scan_iter(match=f"{self.key_prefix}*"):
+            await self._redis.delete(key)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_cache_backend() -> CacheBackend:
+    """Builds the backend selected by settings.CACHE_BACKEND."""
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCacheBackend(settings.CACHE_REDIS_URL)
+    if settings.CACHE_BACKEND != "memory":
+        raise ValueError(f"Unknown CACHE_BACKEND '{settings.CACHE_BACKEND}'. Expected 'memory' or 'redis'.")
+    return MemoryCacheBackend(settings.CACHE_MAX_BYTES)
+
+
+class TTLCache:
+    """
+    TTL cache with stale-while-revalidate semantics.
+
+    Fresh entries are returned directly. Entries past their TTL but within their stale window
+    are returned immediately while a single background task reloads them. Misses and expired
+    entries are loaded inline. Loaders returning None (upstream failure) are never cached.
+    """
+
+    def __init__(self, backend: CacheBackend, name: str = "cache"):
+        self.backend = backend
+        self.name = name
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Loader,
+        ttl: float,
+        stale_ttl: float = 0.0,
+        size_of: Callable[[Any], int] = json_size,
+    ) -> Any:
+        entry = await self.backend.get(key)
+        now = time.time()
+        if entry is not None and entry.is_fresh(now):
+            self.hits += 1
+            return entry.value
+        if entry is not None and entry.is_servable(now):
+            self.stale_hits += 1
+            self._schedule_refresh(key, loader, ttl, stale_ttl, size_of)
+            return entry.value
+
+        self.misses += 1
+        value = await loader()
+        await self._store(key, value, ttl, stale_ttl, size_of)
+        return value
+
+    async def invalidate(self, key: str) -> None:
+        await self.backend.delete(key)
+
+    async def close(self) -> None:
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        await self.backend.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            **self.backend.stats(),
+        }
+
+    async def _store(self, key: str, value: Any, ttl: float, stale_ttl: float, size_of: Callable[[Any], int]) -> None:
+        if value is None:
+            return
+        entry = CacheEntry(value=value, size=size_of(value), stored_at=time.time(), ttl=ttl, stale_ttl=stale_ttl)
+        await self.backend.set(key, entry)
+
+    def _schedule_refresh(self, key: str, loader: Loader, ttl: float, stale_ttl: float, size_of: Callable[[Any], int]) -> None:
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(key, loader, ttl, stale_ttl, size_of))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, key: str, loader: Loader, ttl: float, stale_ttl: float, size_of: Callable[[Any], int]) -> None:
+        self.refreshes += 1
+        try:
+            await self._store(key, await loader(), ttl, stale_ttl, size_of)
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.error("Background refresh of %s entry %s failed: %s", self.name, key, e)
@@ -0,0 +1,535 @@
+import asyncio
+import gzip
+import json
+import os
+import pickle
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple, Union
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.services.intent import CHAT_STOPWORDS, DEFAULT_COIN_ALIASES, IntentClassifier, normalize_phrase
+from ciyexa_backend.utils.files import owned_privately
+from ciyexa_backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Enough to run without a /coins/list snapshot: the default supported coins
+SEED_COINS: List[Tuple[str, str, str]] = [
+    ("bitcoin", "btc", "Bitcoin"),
+    ("ethereum", "eth", "Ethereum"),
+    ("ripple", "xrp", "XRP"),
+    ("cardano", "ada", "Cardano"),
+    ("solana", "sol", "Solana"),
+    ("dogecoin", "doge", "Dogecoin"),
+    ("polkadot", "dot", "Polkadot"),
+    ("litecoin", "ltc", "Litecoin"),
+    ("chainlink", "link", "Chainlink"),
+    ("stellar", "xlm", "Stellar"),
+    ("binancecoin", "bnb", "BNB"),
+    ("tron", "trx", "TRON"),
+    ("avalanche-2", "avax", "Avalanche"),
+    ("shiba-inu", "shib", "Shiba Inu"),
+    ("uniswap", "uni", "Uniswap"),
+    ("cosmos", "atom", "Cosmos Hub"),
+    ("near-protocol", "near", "NEAR Protocol"),
+    ("algorand", "algo", "Algorand"),
+    ("vechain", "vet", "VeChain"),
+    ("elrond-egld", "egld", "MultiversX"),
+]
+
+MIN_FUZZY_LENGTH = 4
+# Ordinary English words. Across the full coin list many ids and names are such words ("just",
+# "doing"), so a single-word phrase of a non-priority coin is never matched in chat when it is one.
+COMMON_WORDS_PATH = Path(__file__).with_name("common_words.txt")
+
+
+def _load_word_list(path: Path) -> FrozenSet[str]:
+    lines = path.read_text(encoding="utf-8").splitlines()
+    return frozenset(word for line in lines if not line.startswith("#") for word in line.split())
+
+
+COMMON_WORDS = CHAT_STOPWORDS | _load_word_list(COMMON_WORDS_PATH)
+BUNDLE_FORMAT = 2 # Bump when CoinIndex or IntentClassifier internals change
+
+
+@dataclass(frozen=True)
+class CoinEntry:
+    id: str
+    symbol: str
+    name: str
+
+
+def _add_value(mapping: Dict[str, Union[str, List[str]]], key: str, value: str) -> None:
+    """Multimap insert that stores a lone value as a bare string; most keys never collide."""
+    existing = mapping.get(key)
+    if existing is None:
+        mapping[key] = value
+    elif isinstance(existing, str):
+        if existing != value:
+            mapping[key] = [existing, value]
+    elif value not in existing:
+        existing.append(value)
+
+
+def _values(entry: Union[None, str, List[str]]) -> List[str]:
+    if entry is None:
+        return []
+    return [entry] if isinstance(entry, str) else entry
+
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    """Every string obtainable from `word` by removing up to `max_distance` characters."""
+    results = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        results |= frontier
+    return results
+
+
+def _edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment distance, or max_distance + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class CoinIndex:
+    """
+    Immutable lookup index over CoinGecko's /coins/list.
+
+    Exact lookups by id, symbol or name are dict hits. Prefix lookups bisect a sorted key list.
+    Fuzzy lookups use a symmetric-delete index (every key with up to `max_distance` characters
+    removed), so a typo is resolved by a handful of dict hits plus verification of the few
+    candidates rather than by scanning every coin.
+
+    Symbols and names are not unique on CoinGecko. Ambiguous keys resolve to the coin with the
+    best priority: the order of `priority_ids` (the supported coins), then the order of `coins`.
+    """
+
+    def __init__(
+        self,
+        coins: Iterable[Tuple[str, str, str]],
+        priority_ids: Sequence[str] = (),
+        max_distance: int = 1,
+        fetched_at: Optional[float] = None,
+    ):
+        self.max_distance = max_distance
+        self.fetched_at = fetched_at
+        self.priority_ids = tuple(priority_ids)
+        self._by_id: Dict[str, CoinEntry] = {}
+        # Normalized id/symbol/name -> id, or list of ids by priority when ambiguous
+        self._by_key: Dict[str, Union[str, List[str]]] = {}
+        rank = {crypto_id: i for i, crypto_id in enumerate(self.priority_ids)}
+
+        ordered = sorted(coins, key=lambda c: rank.get(c[0], len(rank)))
+        for crypto_id, symbol, name in ordered:
+            if crypto_id in self._by_id:
+                continue
+            self._by_id[crypto_id] = CoinEntry(crypto_id, symbol.lower(), name)
+            normalized_id, normalized_name = normalize_phrase(crypto_id), normalize_phrase(name)
+            for key in (crypto_id, normalized_id, symbol.lower(), normalized_name):
+                if key:
+                    _add_value(self._by_key, key, crypto_id)
+
+        self._sorted_keys = sorted(self._by_key)
+        # Most of the build time and memory; built on first fuzzy lookup or by build_fuzzy_index()
+        self._fuzzy: Optional[Dict[str, Union[str, List[str]]]] = None
+
+    def __getstate__(self) -> Dict:
+        # Bundles leave out the fuzzy index: rebuilding it is faster than unpickling it
+        state = self.__dict__.copy()
+        state["_fuzzy"] = None
+        return state
+
+    def build_fuzzy_index(self) -> None:
+        """Builds the symmetric-delete index used by fuzzy(); a no-op once built."""
+        if self._fuzzy is not None:
+            return
+        fuzzy: Dict[str, Union[str, List[str]]] = {}
+        if self.max_distance > 0:
+            # Typos are tolerated on ids and names only: tickers are too short to correct reliably
+            keys = {
+                key
+                for entry in self._by_id.values()
+                for key in (normalize_phrase(entry.id), normalize_phrase(entry.name))
+                if len(key) >= MIN_FUZZY_LENGTH
+            }
+            for key in keys:
+                for deleted in _deletes(key, self.max_distance):
+                    _add_value(fuzzy, deleted, key)
+        self._fuzzy = fuzzy
+
+    @classmethod
+    def seed(cls) -> "CoinIndex":
+        return cls(SEED_COINS, priority_ids=settings.SUPPORTED_CRYPTOS, max_distance=settings.COIN_INDEX_FUZZY_MAX_DISTANCE)
+
+    @classmethod
+    def from_coins_list(cls, rows: Iterable[Dict], fetched_at: Optional[float] = None) -> "CoinIndex":
+        """Builds an index from raw /coins/list rows, keeping the seed coins as a fallback."""
+        coins = [(row["id"], row.get("symbol") or "", row.get("name") or "") for row in rows if row.get("id")]
+        return cls(
+            SEED_COINS + coins,
+            priority_ids=settings.SUPPORTED_CRYPTOS,
+            max_distance=settings.COIN_INDEX_FUZZY_MAX_DISTANCE,
+            fetched_at=fetched_at,
+        )
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, crypto_id: str) -> bool:
+        return crypto_id in self._by_id
+
+    def get(self, crypto_id: str) -> Optional[CoinEntry]:
+        return self._by_id.get(crypto_id)
+
+    def lookup(self, text: str) -> Optional[str]:
+        """Exact resolution of an id, symbol or name (case-insensitive) to a CoinGecko id."""
+        if text in self._by_id:
+            return text
+        ids = _values(self._by_key.get(text.lower()) or self._by_key.get(normalize_phrase(text)))
+        return ids[0] if ids else None
+
+    def prefix(self, text: str, limit: int = 10) -> List[CoinEntry]:
+        """Coins whose id, symbol or name starts with `text`."""
+        text = normalize_phrase(text)
+        if not text:
+            return []
+        results: Dict[str, CoinEntry] = {}
+        for i in range(bisect_left(self._sorted_keys, text), len(self._sorted_keys)):
+            key = self._sorted_keys[i]
+            if not key.startswith(text):
+                break
+            for crypto_id in _values(self._by_key[key]):
+                results.setdefault(crypto_id, self._by_id[crypto_id])
+            if len(results) >= limit:
+                break
+        return list(results.values())[:limit]
+
+    def fuzzy(self, text: str, limit: int = 5) -> List[Tuple[str, int]]:
+        """(id, edit distance) pairs for keys within `max_distance` edits of `text`, closest first."""
+        text = normalize_phrase(text)
+        if len(text) < MIN_FUZZY_LENGTH or self.max_distance <= 0:
+            return []
+        self.build_fuzzy_index()
+        best: Dict[str, int] = {}
+        checked: Set[str] = set()
+        for deleted in _deletes(text, self.max_distance):
+            for key in _values(self._fuzzy.get(deleted)):
+                if key in checked:
+                    continue
+                checked.add(key)
+                distance = _edit_distance(text, key, self.max_distance)
+                if distance <= self.max_distance:
+                    crypto_id = _values(self._by_key[key])[0]
+                    best[crypto_id] = min(distance, best.get(crypto_id, distance))
+        return sorted(best.items(), key=lambda item: item[1])[:limit]
+
+    def resolve(self, text: str) -> Optional[str]:
+        """Exact lookup, falling back to the closest fuzzy match."""
+        crypto_id = self.lookup(text)
+        if crypto_id is not None:
+            return crypto_id
+        matches = self.fuzzy(text, limit=1)
+        return matches[0][0] if matches else None
+
+    def chat_aliases(self) -> Dict[str, List[str]]:
+        """Phrases that identify the priority coins anywhere in chat: id, name, ticker and common aliases."""
+        aliases: Dict[str, List[str]] = {}
+        for crypto_id in self.priority_ids:
+            entry = self._by_id.get(crypto_id)
+            if entry is not None:
+                phrases = [entry.id, entry.name, entry.symbol] + DEFAULT_COIN_ALIASES.get(entry.id, [])
+                aliases[entry.id] = [phrase for phrase in phrases if normalize_phrase(phrase) not in CHAT_STOPWORDS]
+        return aliases
+
+    def signal_aliases(self) -> Dict[str, List[str]]:
+        """
+        Ids and names of the other coins that are unlikely to appear in chat by chance: a multi-word
+        phrase (hyphenated ids included) with at least one uncommon word, or a single word of at
+        least MIN_FUZZY_LENGTH letters that is not in COMMON_WORDS. The classifier still requires
+        a signal for single words (see IntentClassifier).
+        """
+        return {
+            entry.id: [phrase for phrase in (entry.id, entry.name) if self._is_distinctive(phrase)]
+            for entry in self._by_id.values() if entry.id not in self.priority_ids
+        }
+
+    def chat_tickers(self) -> Dict[str, str]:
+        """Tickers of the other coins, for when a query writes them as one; the first coin listed wins a shared ticker."""
+        tickers: Dict[str, str] = {}
+        for entry in self._by_id.values():
+            symbol = normalize_phrase(entry.symbol)
+            if entry.id not in self.priority_ids and symbol and symbol not in COMMON_WORDS:
+                tickers.setdefault(symbol, entry.id)
+        return tickers
+
+    @staticmethod
+    def _is_distinctive(phrase: str) -> bool:
+        words = normalize_phrase(phrase).split()
+        if len(words) > 1:
+            return any(word not in COMMON_WORDS for word in words) # "Bitcoin Cash", not "Just Do It"
+        return bool(words) and len(words[0]) >= MIN_FUZZY_LENGTH and words[0] not in COMMON_WORDS
+
+    def build_intent_classifier(self) -> IntentClassifier:
+        return IntentClassifier(self.chat_aliases(), self.signal_aliases(), self.chat_tickers())
+
+    def to_rows(self) -> List[List[str]]:
+        return [[entry.id, entry.symbol, entry.name] for entry in self._by_id.values()]
+
+
+def default_coin_index_path() -> Path:
+    if settings.COIN_INDEX_PATH:
+        return Path(settings.COIN_INDEX_PATH)
+    return settings.data_dir / "coins_list.json.gz"
+
+
+def load_coin_index(path: Optional[Path] = None) -> CoinIndex:
+    """Loads the on-disk snapshot written by save_coin_index, or the seed index if there is none."""
+    path = path or default_coin_index_path()
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+    except FileNotFoundError:
+        logger.info("No coin list snapshot at %s. Starting from the seed index.", path)
+        return CoinIndex.seed()
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read coin list snapshot at %s: %s. Starting from the seed index.", path, e)
+        return CoinIndex.seed()
+    rows = [{"id": c[0], "symbol": c[1], "name": c[2]} for c in payload["coins"]]
+    return CoinIndex.from_coins_list(rows, fetched_at=payload.get("fetched_at"))
+
+
+def save_coin_index(index: CoinIndex, path: Optional[Path] = None) -> None:
+    """Writes a compact gzipped [id, symbol, name] snapshot, replacing the old file atomically."""
+    path = path or default_coin_index_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump({"fetched_at": index.fetched_at, "coins": index.to_rows()}, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def default_bundle_path() -> Path:
+    if settings.COIN_INDEX_BUNDLE_PATH:
+        return Path(settings.COIN_INDEX_BUNDLE_PATH)
+    return default_coin_index_path().with_name("startup_bundle.pickle")
+
+
+def _bundle_key() -> Tuple:
+    """Settings the bundled index and classifier were built with; a bundle built with others is ignored."""
+    return (BUNDLE_FORMAT, tuple(settings.SUPPORTED_CRYPTOS), settings.COIN_INDEX_FUZZY_MAX_DISTANCE)
+
+
+def save_startup_bundle(index: CoinIndex, classifier: IntentClassifier, path: Optional[Path] = None) -> None:
+    """
+    Pickles the built index and intent classifier so the next worker start can skip building them.
+    The file is only readable by this user, and a new directory is created private (0700).
+    """
+    path = path or default_bundle_path()
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp") # Several workers may write at once
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_NOFOLLOW", 0), 0o600)
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump({"key": _bundle_key(), "index": index, "classifier": classifier}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_startup_bundle(
+    path: Optional[Path] = None, snapshot_path: Optional[Path] = None
+) -> Optional[Tuple[CoinIndex, IntentClassifier]]:
+    """
+    The bundled index and classifier, or None when there is no bundle, it was built with other
+    settings, or the coin list snapshot was written after it. Unpickling runs code from the file,
+    so a bundle is also ignored unless it and its directory belong to this user and no other user
+    can write to either.
+    """
+    path = path or default_bundle_path()
+    snapshot_path = snapshot_path or default_coin_index_path()
+    try:
+        if snapshot_path.exists() and snapshot_path.stat().st_mtime > path.stat().st_mtime:
+            logger.info("Startup bundle at %s is older than the coin list snapshot. Rebuilding.", path)
+            return None
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+        with os.fdopen(fd, "rb") as f:
+            if not (owned_privately(os.fstat(f.fileno())) and owned_privately(os.stat(path.parent))):
+                logger.warning("Startup bundle at %s is not owned by this user or is writable by others. Rebuilding.", path)
+                return None
+            bundle = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Could not read startup bundle at %s: %s. Rebuilding.", path, e)
+        return None
+    if bundle.get("key") != _bundle_key():
+        logger.info("Startup bundle at %s was built with other settings. Rebuilding.", path)
+        return None
+    return bundle["index"], bundle["classifier"]
+
+
+def load_coin_artifacts() -> Tuple[CoinIndex, IntentClassifier]:
+    """
+    The coin index and intent classifier for startup: from the bundle when it is current,
+    otherwise built from the coin list snapshot and bundled for the next start.
+    """
+    bundled = load_startup_bundle()
+    if bundled is not None:
+        return bundled
+    index = load_coin_index()
+    classifier = index.build_intent_classifier()
+    if index.fetched_at: # Nothing worth bundling for the seed index
+        try:
+            save_startup_bundle(index, classifier)
+        except OSError as e:
+            logger.warning("Could not write startup bundle: %s", e)
+    return index, classifier
+
+
+class CoinIndexRefresher:
+    """
+    Keeps the coin index current: reloads /coins/list when the snapshot is older than the refresh
+    interval, rebuilds the index and intent classifier off the event loop, hands both to
+    `on_update`, then persists the snapshot and startup bundle if the data directory is writable.
+    """
+
+    def __init__(
+        self,
+        fetch_coins_list: Callable[[], Awaitable[Optional[List[Dict]]]],
+        on_update: Callable[[CoinIndex, IntentClassifier], None],
+        path: Optional[Path] = None,
+        interval: float = None,
+    ):
+        self.fetch_coins_list = fetch_coins_list
+        self.on_update = on_update
+        self.path = path or default_coin_index_path()
+        self.interval = interval or settings.COIN_INDEX_REFRESH_INTERVAL
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh_once(self) -> Optional[CoinIndex]:
+        rows = await self.fetch_coins_list()
+        if not rows:
+            logger.warning("Could not fetch the CoinGecko coin list. Keeping the current index.")
+            return None
+        index = await asyncio.to_thread(CoinIndex.from_coins_list, rows, time.time())
+        classifier = await asyncio.to_thread(index.build_intent_classifier)
+        self.on_update(index, classifier)
+        logger.info("Coin index refreshed with %s coins.", len(index))
+        try:
+            # Best effort: the refreshed index is already in use, the files only speed up the next start
+            await asyncio.to_thread(save_coin_index, index, self.path)
+            await asyncio.to_thread(save_startup_bundle, index, classifier)
+        except OSError as e:
+            logger.warning("Could not persist the refreshed coin index: %s", e)
+        return index
+
+    async def start(self, current: CoinIndex) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(current))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self, current: CoinIndex) -> None:
+        age = time.time() - current.fetched_at if current.fetched_at else None
+        if age is not None and age < self.interval:
+            await asyncio.sleep(self.interval - age)
+        while True:
+            index = None
+            try:
+                index = await self.refresh_once()
+            except Exception as e:
+                logger.error("Unexpected error while refreshing the coin index: %s", e)
+            # Retry failed refreshes sooner than the regular interval
+            await asyncio.sleep(self.interval if index else min(self.interval, settings.COIN_INDEX_RETRY_INTERVAL))
+
+
+class CoinIndexWatcher:
+    """
+    Follows a coin list snapshot that another process keeps current (the snapshot_refresher in
+    SNAPSHOT_MODE=shared): when the file changes, reloads the index and intent classifier off the
+    event loop, from the startup bundle when it is current, and hands both to `on_update`.
+    """
+
+    def __init__(self, on_update: Callable[[CoinIndex, IntentClassifier], None], interval: float = None):
+        self.on_update = on_update
+        self.path = default_coin_index_path()
+        self.interval = interval or settings.COIN_INDEX_WATCH_INTERVAL
+        self.fetched_at: Optional[float] = None
+        self._mtime: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _current_mtime(self) -> Optional[int]:
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    async def refresh_once(self) -> Optional[CoinIndex]:
+        mtime = self._current_mtime()
+        if mtime is None or mtime == self._mtime:
+            return None
+        self._mtime = mtime
+        index, classifier = await asyncio.to_thread(load_coin_artifacts)
+        if not index.fetched_at or (self.fetched_at and index.fetched_at <= self.fetched_at):
+            return None
+        await asyncio.to_thread(index.build_fuzzy_index)
+        self.on_update(index, classifier)
+        self.fetched_at = index.fetched_at
+        logger.info("Coin index reloaded from %s with %s coins.", self.path, len(index))
+        return index
+
+    async def start(self, current: CoinIndex) -> None:
+        """Starts watching; `current` is the index already in use, loaded from the file as it is now."""
+        if self._task is None:
+            self.fetched_at = current.fetched_at
+            self._mtime = self._current_mtime()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                logger.error("Unexpected error while reloading the coin index: %s", e)
+
+
+if __name__ == "__main__":
+    # Prebuilds the startup bundle from the coin list snapshot, e.g. while building an image.
+    # Imported under the package name so the pickled classes are not recorded as __main__ ones.
+    from ciyexa_backend.services import coin_index
+    built = coin_index.load_coin_index()
+    coin_index.save_startup_bundle(built, built.build_intent_classifier())
+    print(f"Wrote {coin_index.default_bundle_path()} ({len(built)} coins).")
@@ -1,13 +1,86 @@
+import asyncio
 import httpx
-from typing import List, Dict, Optional
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, List, Dict, Optional, Tuple
+import numpy as np
 from ciyexa_backend.core.config import settings
+from ciyexa_backend.core.http_client import HTTPClientManager
+from ciyexa_backend.core.metrics import UPSTREAM_DURATION, UPSTREAM_RESPONSES
+from ciyexa_backend.services.batcher import MicroBatcher
+from ciyexa_backend.services.cache import TTLCache, create_cache_backend
+from ciyexa_backend.services.coin_index import CoinIndex
+from ciyexa_backend.services.governor import Priority, UpstreamGovernor, UpstreamUnavailable, upstream_priority
+from ciyexa_backend.services.history_store import HistoryStore, rows_from_series, series_from_rows
+from ciyexa_backend.services.market_snapshot import MarketSnapshot, SnapshotStore
+from ciyexa_backend.services.singleflight import SingleFlight
+from ciyexa_backend.services.timeseries import PriceSeries
 from ciyexa_backend.utils.logger import get_logger
-from ciyexa_backend.api.v1.schemas.crypto import CryptoData, HistoricalPriceData, TopCrypto
+from ciyexa_backend.api.v1.schemas.crypto import CryptoData, HistoricalPriceData, MarketData, TopCrypto
 
 logger = get_logger(__name__)
 
+PRICE_SERIES_MEMO_SIZE = 256 # Parsed market_chart responses kept alongside the response cache
+MARKETS_MAX_PER_PAGE = 250 # Most ids one /coins/markets call returns
+
+DAY_MS = 24 * 3600 * 1000
+MARKET_CHART_STEP_MS = { # Point spacing CoinGecko uses for each market_chart granularity
+    "market_chart_5m": 5 * 60 * 1000,
+    "market_chart_hourly": 3600 * 1000,
+    "market_chart_daily": DAY_MS,
+}
+MARKET_CHART_RANGE_MAX_DAYS = { # /market_chart/range only keeps this granularity for shorter ranges
+    "market_chart_5m": 1,
+    "market_chart_hourly": 90,
+}
+
+def _fetched_at(item: Dict) -> Optional[datetime]:
+    fetched_at = item.get("fetched_at")
+    return datetime.fromtimestamp(fetched_at, tz=timezone.utc) if fetched_at is not None else None
+
+def crypto_data_from_markets_item(item: Dict, vs_currency: str) -> CryptoData:
+    """Maps one /coins/markets row onto the CryptoData shape returned by /coins/{id}."""
+    def per_currency(value: Optional[float]) -> Dict[str, float]:
+        return {vs_currency: value} if value is not None else {}
+
+    return CryptoData(
+        id=item["id"],
+        symbol=item["symbol"],
+        name=item["name"],
+        market_data=MarketData(
+            current_price=per_currency(item.get("current_price")),
+            market_cap=per_currency(item.get("market_cap")),
+            total_volume=per_currency(item.get("total_volume")),
+            price_change_percentage_24h=item.get("price_change_percentage_24h"),
+        ),
+        as_of=_fetched_at(item),
+    )
+
+def top_crypto_from_markets_item(item: Dict) -> TopCrypto:
+    return TopCrypto(**{**item, "as_of": _fetched_at(item)})
+
 class CryptoDataService:
-    def __init__(self):
+    def __init__(
+        self,
+        http_client: Optional[HTTPClientManager] = None,
+        cache: Optional[TTLCache] = None,
+        single_flight: Optional[SingleFlight] = None,
+        snapshots: Optional[SnapshotStore] = None,
+        coin_index: Optional[CoinIndex] = None,
+        history_store: Optional[HistoryStore] = None,
+        governor: Optional[UpstreamGovernor] = None,
+    ):
+        self.http_client = http_client or HTTPClientManager()
+        self.cache = cache or TTLCache(create_cache_backend(), name="coingecko")
+        self.single_flight = single_flight or SingleFlight(name="coingecko")
+        self.governor = governor or UpstreamGovernor() # Rate limit, retries and circuit breaker for every CoinGecko call
+        self.market_batchers: Dict[str, MicroBatcher] = {} # One per vs_currency
+        self.snapshots = snapshots or SnapshotStore() # Filled by MarketDataPoller when it runs
+        self.coin_index = coin_index or CoinIndex.seed() # Replaced by the full /coins/list index at startup
+        self._price_series: "OrderedDict[str, Tuple[Any, PriceSeries]]" = OrderedDict() # url -> (cached payload, parsed series)
+        self.history_store = history_store # Set by the lifespan hook when HISTORY_STORE_ENABLED
+        self._history_live_points: Dict[str, Any] = {} # Latest fetched row per stored series, newer than its last stored bucket
         self.base_url = settings.COINGECKO_API_BASE_URL
         self.supported_cryptos = settings.SUPPORTED_CRYPTOS
         self.vs_currency = settings.DEFAULT_VS_CURRENCY
@@ -16,25 +89,72 @@ class CryptoDataService:
             self.headers["x-cg-pro-api-key"] = settings.COINGECKO_API_KEY # For paid CoinGecko API
 
     async def _make_request(self, url: str) -> Optional[Dict]:
-        """Helper for making HTTP requests to CoinGecko API."""
+        """
+        Helper for making HTTP requests to CoinGecko API. Calls are paced and retried by the
+        governor; while its circuit breaker is open they fail fast without reaching CoinGecko.
+        """
+        async def send() -> httpx.Response:
+            async with self.http_client.session() as client:
+                response = await client.get(url, headers=self.headers, timeout=settings.COINGECKO_REQUEST_TIMEOUT)
+            UPSTREAM_RESPONSES.labels("coingecko", str(response.status_code)).inc()
+            return response
+
         try:
-            async with httpx.AsyncClient(headers=self.headers) as client:
-                response = await client.get(url, timeout=15.0)
-                response.raise_for_status()
-                return response.json()
+            response = await self.governor.call(send)
+            response.raise_for_status()
+            return response.json()
+        except UpstreamUnavailable as e:
+            logger.warning("Skipped CoinGecko API call to %s: %s", url, e)
+            return None
         except httpx.RequestError as e:
-            logger.error(f"CoinGecko API request failed for {url}: {e}")
+            logger.error("CoinGecko API request failed for %s: %s", url, e)
             return None
         except httpx.HTTPStatusError as e:
-            logger.error(f"CoinGecko API returned error status {e.response.status_code} for {url}: {e.response.text}")
+            logger.error("CoinGecko API returned error status %s for %s: %s", e.response.status_code, url, e.response.text)
             return None
         except Exception as e:
-            logger.error(f"An unexpected error occurred during CoinGecko API call to {url}: {e}")
+            logger.error("An unexpected error occurred during CoinGecko API call to %s: %s", url, e)
             return None
 
-    async def get_current_prices(self, crypto_ids: List[str], vs_currencies: str = None) -> Optional[Dict[str, Dict[str, float]]]:
+    async def _coalesced_request(self, endpoint: str, url: str) -> Optional[Any]:
+        """
+        Issues a CoinGecko call, sharing one upstream request between concurrent identical callers.
+        """
+        started = time.perf_counter()
+        result = await self.single_flight.do((endpoint, url), lambda: self._make_request(url))
+        UPSTREAM_DURATION.labels("coingecko", endpoint, "ok" if result is not None else "error").observe(time.perf_counter() - started)
+        return result
+
+    async def _cached_request(self, endpoint: str, url: str) -> Optional[Any]:
+        """
+        Serves a CoinGecko call through the response cache using the TTL configured for `endpoint`.
+        """
+        ttl = settings.CACHE_TTLS.get(endpoint, settings.CACHE_DEFAULT_TTL)
+        return await self.cache.get_or_load(
+            f"{endpoint}:{url}",
+            lambda: self._coalesced_request(endpoint, url),
+            ttl=ttl,
+            stale_ttl=ttl * settings.CACHE_STALE_TTL_RATIO,
+        )
+
+    @staticmethod
+    def _market_chart_endpoint(days: int) -> str:
+        """CoinGecko picks the point granularity from `days`, so each tier gets its own TTL."""
+        if days <= 1:
+            return "market_chart_5m"
+        if days <= 90:
+            return "market_chart_hourly"
+        return "market_chart_daily"
+
+    async def get_current_prices(
+        self,
+        crypto_ids: List[str],
+        vs_currencies: str = None,
+        include_market_data: bool = False,
+    ) -> Optional[Dict[str, Dict[str, float]]]:
         """
         Fetches current prices for a list of cryptocurrency IDs.
+        With `include_market_data`, each coin also gets `<currency>_market_cap` and `<currency>_24h_vol`.
         """
         if not crypto_ids:
             return None
@@ -42,47 +162,299 @@ class CryptoDataService:
         vs_currencies = vs_currencies or self.vs_currency
         ids_str = ",".join(crypto_ids)
         url = f"{self.base_url}/simple/price?ids={ids_str}&vs_currencies={vs_currencies}"
-        return await self._make_request(url)
+        if include_market_data:
+            url += "&include_market_cap=true&include_24hr_vol=true"
+        return await self._cached_request("simple_price", url)
+
+    async def fetch_markets(
+        self,
+        vs_currency: str = None,
+        crypto_ids: Optional[List[str]] = None,
+        top_n: int = 100,
+    ) -> Optional[List[Dict]]:
+        """
+        Fetches /coins/markets rows, ordered by market cap, for `crypto_ids` or else the top N coins.
+        Bypasses the response cache. Each row is stamped with the epoch time it was fetched at.
+        """
+        vs_currency = vs_currency or self.vs_currency
+        url = f"{self.base_url}/coins/markets?vs_currency={vs_currency}&order=market_cap_desc&page=1&sparkline=false"
+        if crypto_ids:
+            # Sorted so identical batches share cache and single-flight keys
+            url += f"&ids={','.join(sorted(crypto_ids))}&per_page={len(crypto_ids)}"
+        else:
+            url += f"&per_page={top_n}"
+        rows = await self._coalesced_request("markets", url)
+        if rows is None:
+            return None
+        fetched_at = time.time()
+        for row in rows:
+            row.setdefault("fetched_at", fetched_at)
+        return rows
+
+    async def _fetch_markets_batch(self, crypto_ids: List[str], vs_currency: str) -> Dict[str, Dict]:
+        """
+        Fetches /coins/markets rows for several coins in one upstream call, keyed by coin ID.
+        """
+        rows = await self.fetch_markets(vs_currency, crypto_ids=crypto_ids)
+        return {row["id"]: row for row in rows} if rows else {}
+
+    def _market_batcher(self, vs_currency: str) -> MicroBatcher:
+        batcher = self.market_batchers.get(vs_currency)
+        if batcher is None:
+            batcher = MicroBatcher(
+                lambda crypto_ids: self._fetch_markets_batch(crypto_ids, vs_currency),
+                window=settings.MARKET_DATA_BATCH_WINDOW_MS / 1000,
+                max_batch_size=settings.MARKET_DATA_BATCH_MAX_SIZE,
+                name=f"markets:{vs_currency}",
+            )
+            self.market_batchers[vs_currency] = batcher
+        return batcher
+
+    def fresh_snapshot(self, vs_currency: str = None) -> Optional[MarketSnapshot]:
+        """
+        The poller's latest snapshot, if it is fresh enough to serve and priced in `vs_currency`.
+        While the circuit breaker is open any age is accepted, since a live fetch would fail anyway.
+        """
+        if self.governor.breaker.is_open:
+            return self.last_snapshot(vs_currency)
+        vs_currency = vs_currency or self.vs_currency
+        snapshot = self.snapshots.fresh(settings.SNAPSHOT_MAX_AGE)
+        return snapshot if snapshot and snapshot.vs_currency == vs_currency else None
+
+    def last_snapshot(self, vs_currency: str = None) -> Optional[MarketSnapshot]:
+        """The poller's latest snapshot regardless of age; the fallback when CoinGecko is unavailable."""
+        vs_currency = vs_currency or self.vs_currency
+        snapshot = self.snapshots.current
+        return snapshot if snapshot and snapshot.vs_currency == vs_currency else None
 
     async def get_market_data(self, crypto_id: str, vs_currencies: str = None) -> Optional[CryptoData]:
         """
         Fetches detailed market data for a single cryptocurrency.
+        Served from the poller's snapshot while it is fresh; otherwise lookups arriving within a few
+        milliseconds of each other are batched into one /coins/markets call.
         """
         vs_currencies = vs_currencies or self.vs_currency
-        url = f"{self.base_url}/coins/{crypto_id}?localization=false&tickers=false&market_data=true&community_data=false&developer_data=false&sparkline=false"
-        data = await self._make_request(url)
-        return CryptoData(**data) if data else None
+        snapshot = self.fresh_snapshot(vs_currencies)
+        if snapshot and crypto_id in snapshot.coins:
+            return snapshot.coins[crypto_id]
+
+        if settings.MARKET_DATA_BATCHING_ENABLED:
+            ttl = settings.CACHE_TTLS.get("markets", settings.CACHE_DEFAULT_TTL)
+            item = await self.cache.get_or_load(
+                f"coin_market:{vs_currencies}:{crypto_id}",
+                lambda: self._market_batcher(vs_currencies).submit(crypto_id),
+                ttl=ttl,
+                stale_ttl=ttl * settings.CACHE_STALE_TTL_RATIO,
+            )
+            if item:
+                return crypto_data_from_markets_item(item, vs_currencies)
+        else:
+            url = f"{self.base_url}/coins/{crypto_id}?localization=false&tickers=false&market_data=true&community_data=false&developer_data=false&sparkline=false"
+            data = await self._cached_request("coin", url)
+            if data:
+                return CryptoData(**data)
+
+        stale = self.last_snapshot(vs_currencies)
+        if stale and crypto_id in stale.coins:
+            logger.warning("Serving %s from a %.0fs old snapshot; CoinGecko is unavailable.", crypto_id, stale.age)
+            return stale.coins[crypto_id]
+        return None
+
+    async def get_market_data_batch(self, crypto_ids: List[str], vs_currencies: List[str]) -> Tuple[Dict[str, CryptoData], Dict[str, str]]:
+        """
+        Market data for many coins in several currencies with a few bulk calls instead of one call
+        per coin. The first currency comes from the snapshot or /coins/markets (sharing the
+        single-coin micro-batches and their cache when batching is enabled); the other currencies
+        are added from one /simple/price call. Returns the data per coin id and, per coin id, why
+        it is missing or incomplete.
+        """
+        primary, others = vs_currencies[0], vs_currencies[1:]
+        snapshot = self.fresh_snapshot(primary)
+        found = {crypto_id: snapshot.coins[crypto_id] for crypto_id in crypto_ids if snapshot and crypto_id in snapshot.coins}
+        missing = [crypto_id for crypto_id in crypto_ids if crypto_id not in found]
+
+        async def fetch_missing() -> Dict[str, CryptoData]:
+            if not missing:
+                return {}
+            if settings.MARKET_DATA_BATCHING_ENABLED:
+                values = await asyncio.gather(*(self.get_market_data(crypto_id, primary) for crypto_id in missing))
+                return {crypto_id: data for crypto_id, data in zip(missing, values) if data is not None}
+            pages = await asyncio.gather(*(
+                self._fetch_markets_batch(missing[i:i + MARKETS_MAX_PER_PAGE], primary)
+                for i in range(0, len(missing), MARKETS_MAX_PER_PAGE)
+            ))
+            return {crypto_id: crypto_data_from_markets_item(row, primary) for page in pages for crypto_id, row in page.items()}
+
+        async def fetch_other_currencies() -> Optional[Dict[str, Dict[str, float]]]:
+            if not others:
+                return None
+            return await self.get_current_prices(sorted(crypto_ids), ",".join(others), include_market_data=True)
+
+        fetched, other_prices = await asyncio.gather(fetch_missing(), fetch_other_currencies())
+        found.update(fetched)
+
+        errors = {}
+        for crypto_id in crypto_ids:
+            data = found.get(crypto_id)
+            if data is None:
+                errors[crypto_id] = "Market data unavailable from external service."
+                continue
+            if not others:
+                continue
+            prices = (other_prices or {}).get(crypto_id) or {}
+            unavailable = [currency for currency in others if currency not in prices]
+            if unavailable:
+                errors[crypto_id] = f"No data in {', '.join(unavailable)}."
+            market_data = data.market_data or MarketData(current_price={}, market_cap={}, total_volume={})
+            # Snapshot entries are shared, so extend a copy
+            found[crypto_id] = data.model_copy(update={"market_data": market_data.model_copy(update={
+                "current_price": {**market_data.current_price, **{c: prices[c] for c in others if c in prices}},
+                "market_cap": {**market_data.market_cap, **{c: prices[f"{c}_market_cap"] for c in others if f"{c}_market_cap" in prices}},
+                "total_volume": {**market_data.total_volume, **{c: prices[f"{c}_24h_vol"] for c in others if f"{c}_24h_vol" in prices}},
+            })})
+        return {crypto_id: found[crypto_id] for crypto_id in crypto_ids if crypto_id in found}, errors
+
+    async def get_price_series(self, crypto_id: str, days: int = 7, vs_currency: str = None) -> Optional[PriceSeries]:
+        """
+        Fetches historical market data (prices, market caps, volumes) for a cryptocurrency as NumPy arrays.
+        'days' can be 1, 7, 14, 30, 90, 180, 365, max.
+        The cache holds the raw payload; its parsed arrays are memoized for as long as the cache
+        keeps returning that same payload object, so repeated requests skip parsing entirely.
+        """
+        vs_currency = vs_currency or self.vs_currency
+        endpoint = self._market_chart_endpoint(days)
+        if self.history_store is not None and days <= settings.HISTORY_RETENTION_DAYS.get(endpoint, 0):
+            return await self._stored_price_series(crypto_id, days, vs_currency, endpoint)
+
+        url = f"{self.base_url}/coins/{crypto_id}/market_chart?vs_currency={vs_currency}&days={days}"
+        data = await self._cached_request(endpoint, url)
+        if not data:
+            return None
+        memoized = self._price_series.get(url)
+        if memoized is not None and memoized[0] is data:
+            self._price_series.move_to_end(url)
+            return memoized[1]
+        series = PriceSeries.from_market_chart(data)
+        self._price_series[url] = (data, series)
+        self._price_series.move_to_end(url)
+        while len(self._price_series) > PRICE_SERIES_MEMO_SIZE:
+            self._price_series.popitem(last=False)
+        return series
+
+    async def _stored_price_series(self, crypto_id: str, days: int, vs_currency: str, endpoint: str) -> Optional[PriceSeries]:
+        """
+        Serves a historical series from the on-disk store, syncing it first if it does not cover
+        the requested range or was last synced longer ago than the endpoint's cache TTL.
+        The returned arrays are views of the store's file mapping.
+        """
+        key = f"{crypto_id}.{vs_currency}.{endpoint}"
+        step_ms = MARKET_CHART_STEP_MS[endpoint]
+        now = time.time()
+        since_ms = int(now * 1000) - days * DAY_MS
+        stored = await asyncio.to_thread(self.history_store.read, key, since_ms)
+        covered = stored is not None and stored.first_timestamp is not None and stored.first_timestamp <= since_ms + step_ms
+        sync_interval = settings.CACHE_TTLS.get(endpoint, settings.CACHE_DEFAULT_TTL)
+        if not covered or now - stored.last_sync >= sync_interval:
+            await self.single_flight.do(
+                ("history_sync", key, days if not covered else None),
+                lambda: self._sync_history(key, crypto_id, days, vs_currency, endpoint, stored if covered else None),
+            )
+            stored = await asyncio.to_thread(self.history_store.read, key, since_ms)
+        if stored is None or len(stored.rows) == 0:
+            return None
+
+        rows = stored.rows
+        live = self._history_live_points.get(key)
+        if live is not None and live["timestamp"][0] > rows["timestamp"][-1]:
+            rows = np.concatenate([rows, live]) # Copies the range, only when a newer price than the stored tail is known
+        return series_from_rows(rows)
+
+    async def _sync_history(self, key: str, crypto_id: str, days: int, vs_currency: str, endpoint: str, stored) -> None:
+        """
+        Fetches only the tail after the last stored point when the store covers the range, or the
+        full range otherwise, and merges it into the store. On failure the stored data is kept.
+        """
+        now = time.time()
+        now_ms = int(now * 1000)
+        max_gap_days = MARKET_CHART_RANGE_MAX_DAYS.get(endpoint)
+        if stored is not None and (max_gap_days is None or now_ms - stored.last_timestamp < max_gap_days * DAY_MS):
+            url = (
+                f"{self.base_url}/coins/{crypto_id}/market_chart/range"
+                f"?vs_currency={vs_currency}&from={stored.last_timestamp // 1000}&to={int(now)}"
+            )
+            data = await self._coalesced_request("market_chart_range", url)
+        else:
+            url = f"{self.base_url}/coins/{crypto_id}/market_chart?vs_currency={vs_currency}&days={days}"
+            data = await self._coalesced_request(endpoint, url)
+        if data is None:
+            logger.warning("Could not sync historical data for %s. Serving stored data.", key)
+            return
+
+        rows = rows_from_series(PriceSeries.from_market_chart(data))
+        if len(rows):
+            self._history_live_points[key] = rows[-1:].copy()
+        added = await asyncio.to_thread(self.history_store.write, key, rows, MARKET_CHART_STEP_MS[endpoint], now)
+        logger.info("Synced historical data for %s: %s new point(s).", key, added)
+
+        retention_ms = settings.HISTORY_RETENTION_DAYS[endpoint] * DAY_MS
+        if stored is not None and stored.first_timestamp < now_ms - 1.5 * retention_ms:
+            # Trimming rewrites the file, so let it grow past retention before compacting
+            await asyncio.to_thread(self.history_store.trim, key, now_ms - int(1.1 * retention_ms))
 
     async def get_historical_prices(self, crypto_id: str, days: int = 7, vs_currency: str = None) -> Optional[HistoricalPriceData]:
         """
         NEW: Fetches historical market data (prices, market caps, volumes) for a cryptocurrency.
         'days' can be 1, 7, 14, 30, 90, 180, 365, max.
         """
-        vs_currencies = vs_currencies or self.vs_currency
-        url = f"{self.base_url}/coins/{crypto_id}/market_chart?vs_currency={vs_currencies}&days={days}"
-        data = await self._make_request(url)
-        return HistoricalPriceData(**data) if data else None
+        series = await self.get_price_series(crypto_id, days, vs_currency)
+        return series.to_historical_price_data() if series else None
 
     async def get_top_n_cryptos_by_market_cap(self, top_n: int = 10, vs_currency: str = None) -> Optional[List[TopCrypto]]:
         """
         NEW: Fetches a list of top N cryptocurrencies by market capitalization.
         """
-        vs_currencies = vs_currencies or self.vs_currency
-        url = f"{self.base_url}/coins/markets?vs_currency={vs_currencies}&order=market_cap_desc&per_page={top_n}&page=1&sparkline=false"
-        data = await self._make_request(url)
-        return [TopCrypto(**item) for item in data] if data else None
+        vs_currency = vs_currency or self.vs_currency
+        snapshot = self.fresh_snapshot(vs_currency)
+        if snapshot and len(snapshot.top) >= top_n:
+            return list(snapshot.top[:top_n])
+
+        ttl = settings.CACHE_TTLS.get("markets", settings.CACHE_DEFAULT_TTL)
+        data = await self.cache.get_or_load(
+            f"markets:{vs_currency}:top:{top_n}",
+            lambda: self.fetch_markets(vs_currency, top_n=top_n),
+            ttl=ttl,
+            stale_ttl=ttl * settings.CACHE_STALE_TTL_RATIO,
+        )
+        if data:
+            return [top_crypto_from_markets_item(item) for item in data]
+        stale = self.last_snapshot(vs_currency)
+        if stale and len(stale.top) >= top_n:
+            logger.warning("Serving the top %s from a %.0fs old snapshot; CoinGecko is unavailable.", top_n, stale.age)
+            return list(stale.top[:top_n])
+        return None
 
     def get_supported_cryptos_list(self) -> List[str]:
         """Returns the list of supported cryptocurrency IDs."""
         return self.supported_cryptos
 
+    async def fetch_coins_list(self) -> Optional[List[Dict]]:
+        """
+        Fetches CoinGecko's full list of coins (id, symbol, name) used to build the coin index.
+        Only the background index refresh needs it, so it runs in the background lane.
+        """
+        with upstream_priority(Priority.BACKGROUND):
+            return await self._coalesced_request("coins_list", f"{self.base_url}/coins/list")
+
+    def resolve_crypto_id(self, text: str) -> Optional[str]:
+        """Exact resolution of a CoinGecko id, symbol or name to its id."""
+        return self.coin_index.lookup(text)
+
+    def suggest_crypto_ids(self, text: str, limit: int = 3) -> List[str]:
+        """Ids within a small edit distance of `text`, closest first."""
+        return [crypto_id for crypto_id, _ in self.coin_index.fuzzy(text, limit=limit)]
+
     def get_crypto_id_from_name(self, name: str) -> Optional[str]:
         """
-        Simple helper to map common names to CoinGecko IDs.
-        In a real app, you'd use a more robust mapping or a search API.
+        Maps a coin id, symbol or name to its CoinGecko ID, tolerating small typos.
         """
-        name_lower = name.lower()
-        for crypto_id in self.supported_cryptos:
-            if name_lower in crypto_id.lower() or name_lower == crypto_id.lower().replace('-', ''):
-                return crypto_id
-        return None
+        return self.coin_index.resolve(name)
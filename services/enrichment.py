@@ -0,0 +1,127 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from ciyexa_backend.api.v1.schemas.crypto import CryptoData, TopCrypto
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.services.crypto_data_service import CryptoDataService
+from ciyexa_backend.services.governor import Priority, upstream_priority
+from ciyexa_backend.services.intent import Intent, QueryIntent
+from ciyexa_backend.services.timeseries import PriceSeries
+from ciyexa_backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CURRENT = "current"
+HISTORICAL = "historical"
+TOP = "top"
+
+
+@dataclass
+class EnrichmentResult:
+    """Data fetched for a chat query, keyed by crypto id. Fetches that failed or ran past the deadline are listed in `missing`."""
+    current: Dict[str, CryptoData] = field(default_factory=dict)
+    historical: Dict[str, PriceSeries] = field(default_factory=dict)
+    top: List[TopCrypto] = field(default_factory=list)
+    days: Optional[int] = None
+    missing: List[Tuple[str, str]] = field(default_factory=list) # (kind, crypto_id)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.current and not self.historical and not self.top
+
+
+class DataEnricher:
+    """
+    Fetches the market data a chat query needs for every coin it mentions, concurrently.
+    All fetches for a request share one deadline, so enrichment takes as long as the slowest
+    fetch (at most `deadline`) instead of the sum; the prompt is built from whatever has arrived
+    by then. Late fetches are not cancelled: they may be shared with other callers and can wait
+    on the rate limiter longer than the deadline, and finishing them fills the response cache
+    for the next query. A semaphore shared by all requests caps the number of enrichment
+    fetches in flight, late ones included.
+    """
+
+    def __init__(
+        self,
+        crypto_service: CryptoDataService,
+        deadline: float = None,
+        max_concurrency: int = None,
+        max_coins: int = None,
+    ):
+        self.crypto_service = crypto_service
+        self.deadline = deadline or settings.ENRICHMENT_DEADLINE
+        self.max_coins = max_coins or settings.ENRICHMENT_MAX_COINS
+        self._semaphore = asyncio.Semaphore(max_concurrency or settings.ENRICHMENT_MAX_CONCURRENCY)
+        self._late: Set[asyncio.Task] = set() # Fetches still running after their request moved on
+
+    def plan(self, query_intent: QueryIntent, default_days: int) -> List[Tuple[str, str, Callable[[], Awaitable]]]:
+        """
+        Lists the fetches needed to answer the query: historical prices when it mentions a time
+        range, otherwise current market data for price and comparison questions, plus the top-N
+        list for ranking questions.
+        """
+        crypto_ids = query_intent.crypto_ids[:self.max_coins]
+        planned = []
+        if query_intent.is_historical:
+            days = query_intent.days or default_days
+            planned = [
+                (HISTORICAL, crypto_id, lambda crypto_id=crypto_id: self.crypto_service.get_price_series(crypto_id, days=days))
+                for crypto_id in crypto_ids
+            ]
+        elif query_intent.is_current or Intent.COMPARISON in query_intent.intents:
+            planned = [
+                (CURRENT, crypto_id, lambda crypto_id=crypto_id: self.crypto_service.get_market_data(crypto_id))
+                for crypto_id in crypto_ids
+            ]
+        if Intent.TOP_N in query_intent.intents and query_intent.top_n:
+            top_n = min(query_intent.top_n, settings.MARKET_POLLER_TOP_N) # Served from the snapshot
+            planned.append((TOP, TOP, lambda: self.crypto_service.get_top_n_cryptos_by_market_cap(top_n)))
+        return planned
+
+    async def _limited(self, fetch: Callable[[], Awaitable]):
+        async with self._semaphore:
+            with upstream_priority(Priority.INTERACTIVE): # A user is waiting on the prompt
+                return await fetch()
+
+    def _finish_in_background(self, task: asyncio.Task) -> None:
+        self._late.add(task) # Keeps the task referenced until it completes
+        task.add_done_callback(self._late_done)
+
+    def _late_done(self, task: asyncio.Task) -> None:
+        self._late.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Late enrichment fetch failed: %s", task.exception())
+
+    async def enrich(self, query_intent: QueryIntent, default_days: int) -> EnrichmentResult:
+        result = EnrichmentResult(days=(query_intent.days or default_days) if query_intent.is_historical else None)
+        planned = self.plan(query_intent, default_days)
+        if not planned:
+            return result
+
+        tasks = {asyncio.create_task(self._limited(fetch)): (kind, crypto_id) for kind, crypto_id, fetch in planned}
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=self.deadline)
+        finally:
+            # Also reached when the request itself is cancelled, e.g. on client disconnect
+            for task in tasks:
+                if not task.done():
+                    self._finish_in_background(task)
+        if pending:
+            logger.warning("Enrichment deadline of %ss hit with %s of %s fetches pending. Using partial data.", self.deadline, len(pending), len(tasks))
+
+        for task, (kind, crypto_id) in tasks.items():
+            data = None
+            if task in done:
+                try:
+                    data = task.result()
+                except Exception as e:
+                    logger.error("Enrichment fetch failed (%s, %s): %s", kind, crypto_id, e)
+            if data is None:
+                result.missing.append((kind, crypto_id))
+            elif kind == HISTORICAL:
+                result.historical[crypto_id] = data
+            elif kind == TOP:
+                result.top = data
+            else:
+                result.current[crypto_id] = data
+        return result
@@ -0,0 +1,340 @@
+"""
+Client-side governor for CoinGecko calls: a token bucket sized to the API plan with priority
+lanes, retries with jittered exponential backoff that honour Retry-After, and a circuit breaker
+that stops calling upstream while it keeps failing.
+"""
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import httpx
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class Priority(IntEnum):
+    """Lanes of the token bucket; lower values are served first."""
+    INTERACTIVE = 0 # Chat prompt enrichment, a user is waiting on the answer
+    DEFAULT = 1 # Crypto data endpoints
+    BACKGROUND = 2 # Market poller, coin index refresh
+
+
+_current_priority: ContextVar[Priority] = ContextVar("upstream_priority", default=Priority.DEFAULT)
+
+
+@contextmanager
+def upstream_priority(priority: Priority) -> Iterator[None]:
+    """Runs the upstream calls made inside the block (and tasks started from it) in `priority`'s lane."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> Priority:
+    return _current_priority.get()
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling upstream when the breaker is open or no token was granted in time."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Grants `rate` calls per second with bursts of up to `capacity`. Waiters are served strictly
+    by lane, then in arrival order; background callers additionally leave `reserve` tokens
+    untouched so a user request arriving right after a background burst does not queue behind it.
+    """
+
+    def __init__(self, rate: float, capacity: float, reserve: float = 0.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.reserve = min(reserve, max(capacity - 1, 0.0))
+        self.tokens = capacity
+        self.paused_until = 0.0 # Monotonic time before which no token is granted (Retry-After)
+        self._updated = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = [] # Heap of (priority, arrival, future)
+        self._arrivals = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self.granted: Dict[str, int] = {priority.name.lower(): 0 for priority in Priority}
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _needed(self, priority: int) -> float:
+        return 1.0 + (self.reserve if priority == Priority.BACKGROUND else 0.0)
+
+    def _try_take(self, priority: int, now: float) -> bool:
+        if now < self.paused_until:
+            return False
+        self._refill(now)
+        if self.tokens < self._needed(priority):
+            return False
+        self.tokens -= 1.0
+        self.granted[Priority(priority).name.lower()] += 1
+        return True
+
+    async def acquire(self, priority: Priority = Priority.DEFAULT) -> None:
+        if not self._waiters and self._try_take(priority, time.monotonic()):
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._arrivals), future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.tokens += 1.0 # Granted just as the caller gave up; hand the token back
+            self._dispatch()
+            raise
+
+    def pause(self, seconds: float) -> None:
+        """Stops granting tokens for `seconds` and drains the bucket, e.g. after a 429."""
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self._refill(now)
+        self.tokens = 0.0
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        if not self._waiters:
+            return
+        now = time.monotonic()
+        self._refill(now)
+        shortfall = max(0.0, self._needed(self._waiters[0][0]) - self.tokens)
+        delay = max(self.paused_until - now, shortfall / self.rate if self.rate > 0 else 0.0, 0.0)
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _dispatch(self) -> None:
+        self._wakeup = None
+        now = time.monotonic()
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._try_take(priority, now):
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+        self._schedule()
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for `recovery_timeout`
+    seconds; then lets a single probe through (half-open) and closes again if it succeeds.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, recovery_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being rejected (the recovery timeout has not passed yet)."""
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.recovery_timeout
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def release_probe(self) -> None:
+        """Frees the half-open probe slot when the probe never reached upstream."""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("CoinGecko circuit breaker closed.")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            logger.warning(
+                "CoinGecko circuit breaker opened after %s consecutive failure(s); retrying in %ss.",
+                self.consecutive_failures, self.recovery_timeout,
+            )
+
+
+class UpstreamGovernor:
+    """
+    Runs upstream calls through the token bucket and circuit breaker, retrying throttled (429),
+    server-side (5xx) and network failures. A 429 pauses the whole bucket for Retry-After (or the
+    backoff delay), so concurrent callers hold off too instead of piling on more 429s.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float = None,
+        burst: float = None,
+        background_reserve: float = None,
+        max_retries: int = None,
+        backoff_base: float = None,
+        backoff_max: float = None,
+        max_retry_after: float = None,
+        max_queue_wait: float = None,
+        failure_threshold: int = None,
+        recovery_timeout: float = None,
+    ):
+        if rate_per_minute is None:
+            rate_per_minute = settings.COINGECKO_RATE_LIMIT_PER_MINUTE or (
+                settings.COINGECKO_PRO_RATE_LIMIT_PER_MINUTE if settings.COINGECKO_API_KEY
+                else settings.COINGECKO_FREE_RATE_LIMIT_PER_MINUTE
+            )
+        self.bucket = TokenBucket(
+            rate_per_minute / 60,
+            burst or settings.COINGECKO_RATE_LIMIT_BURST,
+            settings.COINGECKO_BACKGROUND_RESERVE if background_reserve is None else background_reserve,
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold or settings.COINGECKO_BREAKER_FAILURE_THRESHOLD,
+            settings.COINGECKO_BREAKER_RECOVERY_TIMEOUT if recovery_timeout is None else recovery_timeout,
+        )
+        self.max_retries = settings.COINGECKO_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = settings.COINGECKO_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = settings.COINGECKO_BACKOFF_MAX if backoff_max is None else backoff_max
+        self.max_retry_after = settings.COINGECKO_MAX_RETRY_AFTER if max_retry_after is None else max_retry_after
+        self.max_queue_wait = settings.COINGECKO_MAX_QUEUE_WAIT if max_queue_wait is None else max_queue_wait
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff: uniform in [0, min(max, base * 2^attempt)]."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def call(self, send: Callable[[], Awaitable[httpx.Response]], priority: Priority = None) -> httpx.Response:
+        """
+        Sends a request via `send`, retrying as configured. Returns the last response (which may
+        still be an error status) or re-raises the last network error; raises UpstreamUnavailable
+        without calling upstream while the breaker is open, while a 429 pause outlasts the queue
+        wait, or if no token is granted in time.
+        """
+        priority = current_priority() if priority is None else priority
+        paused_for = self.bucket.paused_until - time.monotonic()
+        if paused_for > self.max_queue_wait:
+            # No token can be granted before the wait would time out anyway
+            raise UpstreamUnavailable(f"throttled by upstream for another {paused_for:.1f}s")
+        if not self.breaker.allow():
+            raise UpstreamUnavailable("circuit breaker is open")
+        # The breaker counts logical calls: one failure when a call gives up, however many attempts it took
+        attempt = 0
+        while True:
+            try:
+                await asyncio.wait_for(self.bucket.acquire(priority), self.max_queue_wait)
+            except asyncio.TimeoutError:
+                self.breaker.release_probe()
+                raise UpstreamUnavailable(f"no rate limit token within {self.max_queue_wait}s")
+            except asyncio.CancelledError:
+                self.breaker.release_probe()
+                raise
+            self.calls += 1
+            last_attempt = attempt >= self.max_retries
+            try:
+                response = await send()
+            except asyncio.CancelledError:
+                self.breaker.release_probe()
+                raise
+            except httpx.RequestError as e:
+                if last_attempt or self.breaker.is_open:
+                    self.breaker.record_failure()
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning("CoinGecko request failed (%s); retrying in %.2fs.", e, delay)
+                self.retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                self.breaker.record_success()
+                return response
+
+            retry_after = parse_retry_after(response.headers.get("retry-after"))
+            delay = retry_after if retry_after is not None else self.backoff(attempt)
+            if response.status_code == 429:
+                self.throttled += 1
+                # Throttling is account-wide: hold every caller back, not just this one
+                self.bucket.pause(delay)
+            # A retry waits out the delay in the token queue, so it must also fit the queue wait
+            if last_attempt or self.breaker.is_open or delay > min(self.max_retry_after, self.max_queue_wait):
+                self.breaker.record_failure()
+                return response
+            logger.warning("CoinGecko returned %s; retrying in %.2fs.", response.status_code, delay)
+            self.retries += 1
+            attempt += 1
+            if response.status_code != 429:
+                await asyncio.sleep(delay) # After a 429 the paused bucket does the waiting
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "granted": dict(self.bucket.granted),
+            "waiting": self.bucket.waiting,
+            "breaker_state": self.breaker.state,
+            "breaker_open": int(self.breaker.is_open),
+            "breaker_opened": self.breaker.times_opened,
+            "breaker_rejected": self.breaker.rejected,
+        }
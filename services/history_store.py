@@ -0,0 +1,264 @@
+"""
+On-disk store for historical market_chart series.
+
+Each (coin, currency, granularity) series lives in its own file: a small header followed by
+fixed-size rows (timestamp, price, market cap, volume) in timestamp order. New rows are only ever
+appended, and the header's row count is updated after they are written, so a reader that maps
+`count` rows never sees a partial write. Rewrites (backfills, retention trimming) build a new file
+and swap it in with os.replace; readers that already mapped the old file keep a valid view.
+"""
+import os
+import re
+import struct
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+import numpy as np
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.services.timeseries import PriceSeries
+from ciyexa_backend.utils.logger import get_logger
+
+try:
+    import fcntl
+except ImportError: # Windows: single-process use only
+    fcntl = None
+
+logger = get_logger(__name__)
+
+ROW_DTYPE = np.dtype([
+    ("timestamp", "<i8"), # Milliseconds
+    ("price", "<f8"),
+    ("market_cap", "<f8"), # NaN if CoinGecko returned none
+    ("total_volume", "<f8"),
+])
+MAGIC = b"CXTS"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHqd") # magic, version, reserved, committed row count, last sync (unix seconds)
+HEADER_SIZE = 64 # Rows start at a fixed offset so the header can grow
+
+_UNSAFE_KEY_CHARS = re.compile(r"[^a-z0-9_.-]")
+
+
+@dataclass(frozen=True)
+class StoredSeries:
+    rows: np.ndarray # Read-only view of the requested range, backed by the file mapping
+    count: int # Committed rows in the whole file
+    last_sync: float
+    first_timestamp: Optional[int]
+    last_timestamp: Optional[int]
+
+
+def rows_from_series(series: PriceSeries) -> np.ndarray:
+    rows = np.empty(len(series), dtype=ROW_DTYPE)
+    rows["timestamp"] = series.timestamps
+    rows["price"] = series.prices
+    rows["market_cap"] = series.market_caps if len(series.market_caps) else np.nan
+    rows["total_volume"] = series.total_volumes if len(series.total_volumes) else np.nan
+    return rows
+
+
+def series_from_rows(rows: np.ndarray) -> PriceSeries:
+    """Wraps stored rows as a PriceSeries without copying them."""
+    def column(name: str) -> np.ndarray:
+        values = rows[name]
+        return np.empty(0) if np.isnan(values).any() else values
+
+    return PriceSeries(rows["timestamp"], rows["price"], column("market_cap"), column("total_volume"))
+
+
+def bucket_rows(rows: np.ndarray, step_ms: int) -> np.ndarray:
+    """Sorts rows by time and keeps the first row in each `step_ms` bucket."""
+    if len(rows) == 0:
+        return rows
+    rows = rows[np.argsort(rows["timestamp"], kind="stable")]
+    buckets = rows["timestamp"] // step_ms
+    _, first = np.unique(buckets, return_index=True)
+    return rows[first]
+
+
+@contextmanager
+def _series_lock(path: Path, blocking: bool = True) -> Iterator[bool]:
+    """
+    Exclusive advisory lock serializing writers of one series across processes. Yields whether
+    it was acquired, which is always the case when `blocking`. The lock file is deleted with its
+    series on eviction, so a lock taken on a file that was deleted meanwhile is taken again.
+    """
+    lock_path = path.with_suffix(".lock")
+    while True:
+        lock_file = open(lock_path, "a+b")
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+                try:
+                    current = os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino
+                except FileNotFoundError:
+                    current = False
+                if not current:
+                    continue
+            try:
+                yield True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return
+        finally:
+            lock_file.close()
+
+
+def default_history_store_path() -> Path:
+    if settings.HISTORY_STORE_PATH:
+        return Path(settings.HISTORY_STORE_PATH)
+    return settings.data_dir / "history"
+
+
+class HistoryStore:
+    """
+    Directory of series files, capped at `max_bytes` in total by deleting the least recently
+    synced series. Methods do blocking file I/O and are meant to run in a worker thread.
+    """
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: int = None):
+        self.root = Path(root) if root else default_history_store_path()
+        self.max_bytes = max_bytes or settings.HISTORY_STORE_MAX_BYTES
+        self._total_bytes: Optional[int] = None # Scanned lazily on the first write
+        self.evictions = 0
+
+    def path_for(self, key: str) -> Path:
+        return self.root / f"{_UNSAFE_KEY_CHARS.sub('_', key.lower())}.bin"
+
+    # --- Reads ---
+
+    def read(self, key: str, since_ms: Optional[int] = None) -> Optional[StoredSeries]:
+        """Maps the committed rows of a series and returns those at or after `since_ms`."""
+        path = self.path_for(key)
+        try:
+            with open(path, "rb") as f:
+                count, last_sync = self._read_header(f)
+                count = min(count, (os.fstat(f.fileno()).st_size - HEADER_SIZE) // ROW_DTYPE.itemsize)
+                if count <= 0:
+                    return StoredSeries(np.empty(0, dtype=ROW_DTYPE), 0, last_sync, None, None)
+                rows = np.memmap(f, dtype=ROW_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error("Unreadable history file %s: %s", path, e)
+            return None
+
+        first, last = int(rows["timestamp"][0]), int(rows["timestamp"][-1])
+        if since_ms is not None:
+            rows = rows[int(np.searchsorted(rows["timestamp"], since_ms, side="left")):]
+        return StoredSeries(rows, count, last_sync, first, last)
+
+    @staticmethod
+    def _read_header(f) -> tuple:
+        magic, version, _, count, last_sync = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("not a history series file")
+        return count, last_sync
+
+    # --- Writes ---
+
+    def write(self, key: str, rows: np.ndarray, step_ms: int, last_sync: float = None) -> int:
+        """
+        Merges freshly fetched rows into a series at `step_ms` granularity and records the sync
+        time. Rows after the stored tail are appended in place; a fetch that starts before the
+        stored tail (a backfill) replaces stored data from its first bucket on, which rewrites the
+        file. Returns the number of rows added.
+        """
+        last_sync = time.time() if last_sync is None else last_sync
+        fetched = bucket_rows(rows, step_ms)
+        path = self.path_for(key)
+        self.root.mkdir(parents=True, exist_ok=True)
+        with _series_lock(path):
+            stored = self.read(key)
+            if stored is None or stored.count == 0:
+                if len(fetched):
+                    self._rewrite(path, fetched, last_sync)
+                return len(fetched)
+
+            last_bucket = stored.last_timestamp // step_ms
+            buckets = fetched["timestamp"] // step_ms
+            if len(fetched) == 0 or buckets[0] >= last_bucket:
+                new_rows = fetched[buckets > last_bucket]
+                self._append(path, stored.count, new_rows, last_sync)
+                return len(new_rows)
+
+            kept = stored.rows[stored.rows["timestamp"] // step_ms < buckets[0]]
+            self._rewrite(path, np.concatenate([kept, fetched]), last_sync)
+            return len(kept) + len(fetched) - stored.count
+
+    def trim(self, key: str, keep_since_ms: int) -> int:
+        """Drops rows older than `keep_since_ms` by rewriting the file. Returns rows removed."""
+        path = self.path_for(key)
+        with _series_lock(path):
+            stored = self.read(key)
+            if stored is None or stored.first_timestamp is None or stored.first_timestamp >= keep_since_ms:
+                return 0
+            kept = stored.rows[stored.rows["timestamp"] >= keep_since_ms]
+            self._rewrite(path, np.array(kept), stored.last_sync)
+            return stored.count - len(kept)
+
+    def _append(self, path: Path, count: int, rows: np.ndarray, last_sync: float) -> None:
+        with open(path, "r+b") as f:
+            if len(rows):
+                f.seek(HEADER_SIZE + count * ROW_DTYPE.itemsize)
+                f.write(rows.tobytes())
+                f.flush() # Rows must be in place before the header publishes them
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, count + len(rows), last_sync))
+        self._grew(len(rows) * ROW_DTYPE.itemsize)
+
+    def _rewrite(self, path: Path, rows: np.ndarray, last_sync: float) -> None:
+        previous_size = path.stat().st_size if path.exists() else 0
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(rows), last_sync).ljust(HEADER_SIZE, b"\0"))
+            f.write(np.ascontiguousarray(rows, dtype=ROW_DTYPE).tobytes())
+        os.replace(temp_path, path)
+        self._grew(HEADER_SIZE + len(rows) * ROW_DTYPE.itemsize - previous_size)
+
+    # --- Disk budget ---
+
+    def _grew(self, delta: int) -> None:
+        if self._total_bytes is None:
+            self._total_bytes = self.disk_usage()
+        else:
+            self._total_bytes += delta
+        if self._total_bytes > self.max_bytes:
+            self.enforce_budget()
+
+    def disk_usage(self) -> int:
+        if not self.root.exists():
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(self.root) if entry.name.endswith(".bin"))
+
+    def enforce_budget(self) -> None:
+        """Deletes the least recently written series until the store fits in `max_bytes`."""
+        files = sorted(
+            (entry for entry in os.scandir(self.root) if entry.name.endswith(".bin")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        total = sum(entry.stat().st_size for entry in files)
+        for entry in files:
+            if total <= self.max_bytes:
+                break
+            path = Path(entry.path)
+            with _series_lock(path, blocking=False) as acquired:
+                if not acquired:
+                    continue # Being written, so among the most recent anyway
+                size = entry.stat().st_size
+                path.unlink(missing_ok=True)
+                path.with_suffix(".lock").unlink(missing_ok=True) # Deleted while held; see _series_lock
+            total -= size
+            self.evictions += 1
+            logger.info("History store over budget, evicted %s.", entry.name)
+        self._total_bytes = total
+
+    def stats(self) -> Dict[str, int]:
+        return {"bytes": self._total_bytes or 0, "max_bytes": self.max_bytes, "evictions": self.evictions}
@@ -0,0 +1,305 @@
+import re
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+# Common names and unambiguous tickers for the default supported coins. Tickers that are also
+# everyday English words ("link", "near", "dot", "uni", "atom", "one") are deliberately left out.
+DEFAULT_COIN_ALIASES: Dict[str, List[str]] = {
+    "bitcoin": ["btc"],
+    "ethereum": ["eth", "ether"],
+    "ripple": ["xrp"],
+    "cardano": ["ada"],
+    "solana": ["sol"],
+    "dogecoin": ["doge"],
+    "polkadot": [],
+    "litecoin": ["ltc"],
+    "chainlink": [],
+    "stellar": ["xlm", "stellar lumens"],
+    "binancecoin": ["bnb", "binance coin"],
+    "tron": ["trx"],
+    "avalanche-2": ["avalanche", "avax"],
+    "shiba-inu": ["shib"],
+    "uniswap": [],
+    "cosmos": [],
+    "near-protocol": ["near protocol"],
+    "algorand": ["algo"],
+    "vechain": ["vet"],
+    "elrond-egld": ["egld", "elrond", "multiversx"],
+}
+
+# Words too common in chat to be treated as a coin when they happen to be a coin's id, name or ticker.
+# Includes the tickers of supported coins that are ordinary English words.
+CHAT_STOPWORDS: FrozenSet[str] = frozenset("""
+a about all an and any are as at atom be best buy can coin coins crypto cryptocurrency current day do
+does dot for from get give go good has have how i in is it its just know last like link market me money
+more most my near new next now of on one or our out over past price prices sell should show tell than
+that the their them then there this time to today token tokens top uni up us value vs want was what
+when which who why will with worth would year you your
+""".split())
+
+# Words that mark a neighbouring word as a coin ("pepe price", "price of pepe", "buy pepe", "bonk vs pepe")
+COIN_CONTEXT_WORDS: FrozenSet[str] = frozenset("""
+buy buying chart coin coins compare cost crypto dump dumping hold holding market pump pumping price prices
+sell selling ticker token tokens trading versus vs worth
+""".split())
+
+NUMBER_WORDS: Dict[str, int] = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "fifteen": 15, "twenty": 20, "thirty": 30, "fifty": 50, "hundred": 100,
+}
+
+# Words that stand in for a count of 1 before a time unit ("last week", "over the past month")
+SINGULAR_MARKERS = frozenset({"last", "past", "previous", "the", "this"})
+
+TIME_UNITS_IN_DAYS: Dict[str, int] = {
+    "day": 1, "days": 1, "week": 7, "weeks": 7, "month": 30, "months": 30, "year": 365, "years": 365,
+}
+
+# Phrases that name a whole window on their own
+FIXED_RANGES_IN_DAYS: Dict[str, int] = {"yesterday": 1, "ytd": 365, "year to date": 365}
+
+
+class Intent(str, Enum):
+    NONE = "none"
+    CURRENT = "current"
+    HISTORICAL = "historical"
+    TOP_N = "top_n"
+    COMPARISON = "comparison"
+
+
+INTENT_KEYWORDS: Dict[Intent, List[str]] = {
+    Intent.CURRENT: [
+        "price", "prices", "price of", "how much", "value of", "worth", "trading at", "current price",
+        "what is the price", "cost", "now", "today", "right now",
+    ],
+    Intent.HISTORICAL: [
+        "historical", "history", "historic", "what was", "was the price", "ago", "trend", "performance",
+        "performed", "chart", "since",
+    ],
+    Intent.TOP_N: ["top", "largest", "biggest", "ranking", "rankings", "by market cap"],
+    Intent.COMPARISON: ["compare", "comparison", "compared", "vs", "versus", "against", "difference between"],
+}
+
+# Primary intent when several are present, most specific first
+INTENT_PRIORITY = (Intent.COMPARISON, Intent.TOP_N, Intent.HISTORICAL, Intent.CURRENT)
+
+DEFAULT_TOP_N = 10
+
+
+@dataclass(frozen=True)
+class QueryIntent:
+    """Everything the chat pipeline needs to know about a query, extracted in one pass."""
+    intents: FrozenSet[Intent]
+    crypto_ids: Tuple[str, ...] = () # In order of first mention, deduplicated
+    days: Optional[int] = None # Historical window, if the query mentioned one
+    top_n: Optional[int] = None
+
+    @property
+    def intent(self) -> Intent:
+        for intent in INTENT_PRIORITY:
+            if intent in self.intents:
+                return intent
+        return Intent.NONE
+
+    @property
+    def is_current(self) -> bool:
+        return Intent.CURRENT in self.intents
+
+    @property
+    def is_historical(self) -> bool:
+        return Intent.HISTORICAL in self.intents
+
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+# The same tokens before lowercasing, with a cashtag "$" if there is one
+CASED_TOKEN_RE = re.compile(r"(\$?)([A-Za-z0-9]+)")
+
+MAX_PHRASE_WORDS = 5
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def normalize_phrase(phrase: str) -> str:
+    """Canonical form used for matching: lowercase alphanumeric words joined by single spaces."""
+    return " ".join(tokenize(phrase))
+
+
+class PhraseMatcher:
+    """
+    Multi-word phrase matcher over a tokenized query.
+
+    Phrases are stored in one dict keyed by their normalized text, plus the longest phrase length
+    for each first word. Matching is a single left-to-right pass over the tokens: a token that
+    starts no phrase costs one dict lookup, so the per-query cost depends on the query length and
+    not on how many phrases are registered. Matches are resolved leftmost-longest.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        self._phrases: Dict[str, Any] = {}
+        self._max_words_by_first: Dict[str, int] = {}
+        for phrase, payload in patterns:
+            words = tokenize(phrase)
+            if not words or len(words) > MAX_PHRASE_WORDS:
+                continue
+            key = " ".join(words)
+            if key in self._phrases:
+                continue # First registration wins
+            self._phrases[key] = payload
+            if len(words) > self._max_words_by_first.get(words[0], 0):
+                self._max_words_by_first[words[0]] = len(words)
+
+    def __len__(self) -> int:
+        return len(self._phrases)
+
+    def find_all(self, tokens: List[str]) -> List[Tuple[int, int, Any]]:
+        """Returns non-overlapping (start, end, payload) token spans, leftmost-longest first."""
+        phrases, max_words_by_first = self._phrases, self._max_words_by_first
+        matches = []
+        i, n = 0, len(tokens)
+        while i < n:
+            max_words = max_words_by_first.get(tokens[i])
+            if max_words is None:
+                i += 1
+                continue
+            for length in range(min(max_words, n - i), 0, -1):
+                payload = phrases.get(" ".join(tokens[i:i + length]) if length > 1 else tokens[i])
+                if payload is not None:
+                    matches.append((i, i + length, payload))
+                    i += length
+                    break
+            else:
+                i += 1
+        return matches
+
+
+def _marked_tokens(query: str, token_count: int) -> FrozenSet[int]:
+    """
+    Positions of the tokens written as a ticker: a cashtag ("$PEPE") or, unless the whole query
+    is uppercase, an uppercase word of at least two letters ("PEPE").
+    """
+    if "$" not in query and query.islower():
+        return frozenset()
+    found = CASED_TOKEN_RE.findall(query)
+    if len(found) != token_count: # Lowercasing changed the tokens (rare non-ASCII input)
+        return frozenset()
+    shouting = not any(char.islower() for char in query)
+    return frozenset(
+        i for i, (dollar, word) in enumerate(found)
+        if dollar or (not shouting and len(word) > 1 and word.isupper())
+    )
+
+
+def _has_coin_context(tokens: List[str], start: int, end: int) -> bool:
+    before = tokens[start - 1] if start > 0 else None
+    if before in COIN_CONTEXT_WORDS or (end < len(tokens) and tokens[end] in COIN_CONTEXT_WORDS):
+        return True
+    return before == "of" and start > 1 and tokens[start - 2] in COIN_CONTEXT_WORDS
+
+
+def _parse_count(word: Optional[str]) -> Optional[int]:
+    if word is None:
+        return None
+    if word.isdigit():
+        return int(word)
+    return NUMBER_WORDS.get(word)
+
+
+class IntentClassifier:
+    """
+    Extracts intent, coin entities, historical window and top-N count from a chat query.
+
+    Coin aliases, intent keywords and time units are compiled into one PhraseMatcher when the
+    classifier is built; classifying a query is a single pass over its tokens.
+
+    `coin_aliases` maps each coin id to every phrase that identifies it in chat, the id itself
+    included if it should match. `signal_aliases` does the same for coins that are only likely
+    to be meant when there is a signal: their single-word phrases match when written as a ticker
+    ("$PEPE", "PEPE") or next to a word from COIN_CONTEXT_WORDS ("pepe price"). `tickers` maps
+    tickers of such coins to their id; they only match when written as a ticker. Phrases in
+    CHAT_STOPWORDS are never registered, and earlier registrations win.
+    """
+
+    def __init__(
+        self,
+        coin_aliases: Dict[str, Iterable[str]],
+        signal_aliases: Optional[Dict[str, Iterable[str]]] = None,
+        tickers: Optional[Dict[str, str]] = None,
+    ):
+        patterns: Dict[str, Tuple[str, Any]] = {}
+        for intent, keywords in INTENT_KEYWORDS.items():
+            for keyword in keywords:
+                patterns.setdefault(keyword, ("intent", intent))
+        for unit, days in TIME_UNITS_IN_DAYS.items():
+            patterns.setdefault(unit, ("unit", days))
+        for phrase, days in FIXED_RANGES_IN_DAYS.items():
+            patterns.setdefault(phrase, ("range", days))
+        for crypto_id, aliases in coin_aliases.items():
+            for phrase in self._phrases_for(aliases):
+                # First registration wins, so callers list preferred coins first
+                patterns.setdefault(phrase, ("coin", crypto_id))
+        for crypto_id, aliases in (signal_aliases or {}).items():
+            for phrase in self._phrases_for(aliases):
+                patterns.setdefault(phrase, ("coin" if len(tokenize(phrase)) > 1 else "signal_coin", crypto_id))
+        self._matcher = PhraseMatcher(patterns.items())
+        self._tickers = {
+            ticker: crypto_id for ticker, crypto_id in (tickers or {}).items()
+            if ticker not in CHAT_STOPWORDS and ticker not in patterns
+        }
+        self.vocabulary_size = len(self._matcher) + len(self._tickers)
+
+    @staticmethod
+    def _phrases_for(aliases: Iterable[str]) -> List[str]:
+        phrases = []
+        for alias in aliases:
+            phrases.append(alias)
+            if "-" in alias:
+                phrases.append(alias.replace("-", "")) # "shiba-inu" is also written "shibainu"
+        return [phrase for phrase in phrases if normalize_phrase(phrase) not in CHAT_STOPWORDS]
+
+    def classify(self, query: str) -> QueryIntent:
+        tokens = tokenize(query)
+        marked = _marked_tokens(query, len(tokens))
+        intents = set()
+        mentions: List[Tuple[int, str]] = [] # (token position, crypto id)
+        covered: Set[int] = set()
+        days: Optional[int] = None
+        top_n: Optional[int] = None
+        # Leftmost-longest: "near protocol" wins over "near", "price of" over "price"
+        for start, end, (kind, value) in self._matcher.find_all(tokens):
+            if marked:
+                covered.update(range(start, end))
+            if kind == "coin":
+                mentions.append((start, value))
+            elif kind == "signal_coin":
+                if start in marked or _has_coin_context(tokens, start, end):
+                    mentions.append((start, value))
+            elif kind == "intent":
+                intents.add(value)
+                if value is Intent.TOP_N and top_n is None:
+                    top_n = _parse_count(tokens[end] if end < len(tokens) else None) or DEFAULT_TOP_N
+            elif kind == "unit":
+                previous = tokens[start - 1] if start > 0 else None
+                count = _parse_count(previous)
+                if count is None and previous in SINGULAR_MARKERS:
+                    count = 1
+                if count is not None and days is None:
+                    days = count * value
+                    intents.add(Intent.HISTORICAL)
+            elif kind == "range":
+                days = days or value
+                intents.add(Intent.HISTORICAL)
+        for i in marked - covered:
+            crypto_id = self._tickers.get(tokens[i])
+            if crypto_id is not None:
+                mentions.append((i, crypto_id))
+
+        crypto_ids = list(dict.fromkeys(crypto_id for _, crypto_id in sorted(mentions))) # In order of first mention
+        if len(crypto_ids) >= 2:
+            intents.add(Intent.COMPARISON)
+        elif Intent.COMPARISON in intents and not crypto_ids:
+            intents.discard(Intent.COMPARISON)
+        return QueryIntent(intents=frozenset(intents), crypto_ids=tuple(crypto_ids), days=days, top_n=top_n)
@@ -1,34 +1,116 @@
 import httpx
+import time
+from typing import AsyncIterator, Optional
 from ciyexa_backend.core.config import settings
+from ciyexa_backend.core.http_client import HTTPClientManager
+from ciyexa_backend.core.metrics import UPSTREAM_DURATION, UPSTREAM_RESPONSES
+from ciyexa_backend.services.admission import AIMDLimiter
 from ciyexa_backend.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+class LLMServiceError(Exception):
+    """Raised when the LLM service fails, returns an error status or no response."""
+
 class LLMAgentService:
-    def __init__(self):
+    def __init__(self, http_client: Optional[HTTPClientManager] = None):
+        self.http_client = http_client or HTTPClientManager()
+        self.concurrency = AIMDLimiter() # Adapts the number of concurrent LLM calls to the API's latency
         self.llm_api_url = settings.LLM_API_BASE_URL
+        self.llm_stream_url = settings.LLM_STREAM_API_URL or settings.LLM_API_BASE_URL
 
     async def get_llm_response(self, prompt: str) -> str:
         """
         Sends a prompt to the external LLM API and returns the response.
         This service acts as a proxy to the Next.js API route that uses the AI SDK.
+        Raises LLMServiceError when the call fails, so an error is never mistaken for an answer,
+        and AdmissionRejected when no call slot frees up in time.
         """
+        await self.concurrency.acquire()
+        started = time.perf_counter()
+        outcome = "aborted" # Unless the call completes or fails, the caller was cancelled
+        overloaded = False # Timeouts, 429 and 5xx lower the concurrency limit
         try:
-            async with httpx.AsyncClient() as client:
+            async with self.http_client.session() as client:
                 response = await client.post(
                     self.llm_api_url,
                     json={"prompt": prompt},
-                    timeout=60.0 # Increased timeout for LLM responses
+                    timeout=settings.LLM_REQUEST_TIMEOUT
                 )
+                UPSTREAM_RESPONSES.labels("llm", str(response.status_code)).inc()
                 response.raise_for_status() # Raise an exception for bad status codes
                 data = response.json()
-                return data.get("response", "No response from LLM.")
+                if "response" not in data:
+                    raise LLMServiceError("LLM service returned no response.")
+                outcome = "ok"
+                return data["response"]
         except httpx.RequestError as e:
-            logger.error(f"LLM API request failed: {e}")
-            return f"Error communicating with LLM service: {e}"
+            outcome = "error"
+            overloaded = True
+            logger.error("LLM API request failed: %s", e)
+            raise LLMServiceError(f"Error communicating with LLM service: {e}") from e
         except httpx.HTTPStatusError as e:
-            logger.error(f"LLM API returned error status {e.response.status_code}: {e.response.text}")
-            return f"LLM service returned an error: {e.response.text}"
+            outcome = "error"
+            overloaded = e.response.status_code == 429 or e.response.status_code >= 500
+            logger.error("LLM API returned error status %s: %s", e.response.status_code, e.response.text)
+            raise LLMServiceError(f"LLM service returned an error: {e.response.text}") from e
+        except LLMServiceError:
+            outcome = "error"
+            raise
         except Exception as e:
-            logger.error(f"An unexpected error occurred in LLMAgentService: {e}")
-            return f"An unexpected error occurred: {e}"
+            outcome = "error"
+            logger.error("An unexpected error occurred in LLMAgentService: %s", e)
+            raise LLMServiceError(f"An unexpected error occurred: {e}") from e
+        finally:
+            elapsed = time.perf_counter() - started
+            self.concurrency.release(elapsed, overloaded, skip_adjust=outcome == "aborted")
+            UPSTREAM_DURATION.labels("llm", "chat", outcome).observe(elapsed)
+
+    async def stream_llm_response(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Streams the LLM completion as text chunks, as soon as the upstream API produces them.
+        The next upstream chunk is only read once the caller asks for it, so a slow consumer slows
+        the upstream read instead of buffering the body. Closing or cancelling the iteration
+        (e.g. when the client disconnects) closes the upstream request. The concurrency limit
+        adapts to the time to the first chunk, as stream lengths vary with the answer; streams
+        abandoned before it leave the limit unchanged.
+        """
+        await self.concurrency.acquire()
+        started = time.perf_counter()
+        first_chunk_latency = None
+        outcome = "aborted" # Unless the stream completes or fails, the consumer went away
+        overloaded = False
+        try:
+            async with self.http_client.session() as client:
+                async with client.stream(
+                    "POST",
+                    self.llm_stream_url,
+                    json={"prompt": prompt, "stream": True},
+                    timeout=settings.LLM_REQUEST_TIMEOUT # Applies between chunks, not to the whole stream
+                ) as response:
+                    UPSTREAM_RESPONSES.labels("llm", str(response.status_code)).inc()
+                    if response.is_error:
+                        outcome = "error"
+                        overloaded = response.status_code == 429 or response.status_code >= 500
+                        body = (await response.aread()).decode(errors="replace")
+                        logger.error("LLM API returned error status %s: %s", response.status_code, body)
+                        raise LLMServiceError(f"LLM service returned an error: {body}")
+                    async for chunk in response.aiter_text():
+                        if chunk:
+                            if first_chunk_latency is None:
+                                first_chunk_latency = time.perf_counter() - started
+                            yield chunk
+                    outcome = "ok"
+        except httpx.RequestError as e:
+            outcome = "error"
+            overloaded = True
+            logger.error("LLM API streaming request failed: %s", e)
+            raise LLMServiceError(f"Error communicating with LLM service: {e}") from e
+        finally:
+            elapsed = time.perf_counter() - started
+            if first_chunk_latency is not None:
+                self.concurrency.release(first_chunk_latency, overloaded)
+            else:
+                # Abandoned before the first chunk: how long the API would have taken is unknown
+                self.concurrency.release(elapsed, overloaded, skip_adjust=outcome == "aborted")
+            UPSTREAM_DURATION.labels("llm", "chat_stream", outcome).observe(elapsed)
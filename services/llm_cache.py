@@ -0,0 +1,114 @@
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.services.singleflight import SingleFlight
+
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize_query(query: str) -> str:
+    """Case-, whitespace- and punctuation-insensitive form of a chat query (any script)."""
+    return " ".join(WORD_RE.findall(query.lower()))
+
+
+@dataclass
+class CachedCompletion:
+    version: Hashable # Version of the market data the prompt was built from
+    text: str
+    latency: float # Seconds the LLM took to produce it, i.e. what each hit saves
+    stored_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.text.encode())
+
+
+class LLMResponseCache:
+    """
+    Caches LLM completions per query key (normalized query, intent and coins), tagged with the
+    version of the market data that went into the prompt. A lookup with a different version
+    drops the entry, so answers are invalidated as soon as the underlying data refreshes; entries
+    also expire after `ttl` seconds, and the least recently used are evicted beyond `max_bytes`.
+    Concurrent misses for the same key and version share one LLM call.
+    """
+
+    def __init__(self, max_bytes: int = None, ttl: float = None):
+        self.max_bytes = max_bytes or settings.LLM_CACHE_MAX_BYTES
+        self.ttl = settings.LLM_CACHE_TTL if ttl is None else ttl
+        self.single_flight = SingleFlight(name="llm")
+        self.current_bytes = 0
+        self._entries: "OrderedDict[Hashable, CachedCompletion]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    def lookup(self, key: Hashable, version: Hashable) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.version != version:
+            self.invalidations += 1
+            self._remove(key)
+            entry = None
+        elif entry is not None and time.time() - entry.stored_at >= self.ttl:
+            self.expirations += 1
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.saved_seconds += entry.latency
+        return entry.text
+
+    def store(self, key: Hashable, version: Hashable, text: str, latency: float) -> None:
+        entry = CachedCompletion(version, text, latency, time.time())
+        if entry.size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.current_bytes += entry.size
+        while self.current_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def get_or_generate(self, key: Hashable, version: Hashable, generate: Callable[[], Awaitable[str]]) -> str:
+        """
+        Returns the cached completion or calls `generate`. Exceptions raised by `generate` reach
+        every coalesced caller and nothing is cached.
+        """
+        text = self.lookup(key, version)
+        if text is not None:
+            return text
+        return await self.single_flight.do((key, version), lambda: self._generate(key, version, generate))
+
+    async def _generate(self, key: Hashable, version: Hashable, generate: Callable[[], Awaitable[str]]) -> str:
+        started = time.monotonic()
+        text = await generate()
+        self.store(key, version, text, time.monotonic() - started)
+        return text
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.single_flight.coalesced,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
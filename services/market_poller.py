@@ -0,0 +1,86 @@
+import asyncio
+from typing import List, Optional
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.services.crypto_data_service import (
+    CryptoDataService,
+    crypto_data_from_markets_item,
+    top_crypto_from_markets_item,
+)
+from ciyexa_backend.services.governor import Priority, upstream_priority
+from ciyexa_backend.services.market_snapshot import MarketSnapshot, SnapshotStore
+from ciyexa_backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class MarketDataPoller:
+    """
+    Periodically refreshes prices, 24h change and market caps for the supported coins plus the
+    top-N list in two bulk CoinGecko calls, and publishes the result as a new MarketSnapshot.
+    """
+
+    def __init__(
+        self,
+        crypto_service: CryptoDataService,
+        store: SnapshotStore,
+        crypto_ids: Optional[List[str]] = None,
+        interval: float = None,
+        top_n: int = None,
+    ):
+        self.crypto_service = crypto_service
+        self.store = store
+        self.crypto_ids = crypto_ids or settings.SUPPORTED_CRYPTOS
+        self.interval = interval or settings.MARKET_POLLER_INTERVAL
+        self.top_n = top_n or settings.MARKET_POLLER_TOP_N
+        self.vs_currency = settings.DEFAULT_VS_CURRENCY
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh_once(self) -> Optional[MarketSnapshot]:
+        """
+        Fetches both lists concurrently and publishes a snapshot. A list that fails to load keeps
+        its previous contents; if both fail, nothing is published.
+        """
+        with upstream_priority(Priority.BACKGROUND): # User-facing lookups go ahead of the refresh
+            coin_rows, top_rows = await asyncio.gather(
+                self.crypto_service.fetch_markets(self.vs_currency, crypto_ids=self.crypto_ids),
+                self.crypto_service.fetch_markets(self.vs_currency, top_n=self.top_n),
+            )
+        if coin_rows is None and top_rows is None:
+            logger.warning("Market data refresh failed. Keeping the previous snapshot.")
+            return None
+
+        previous = self.store.current
+        if coin_rows is not None:
+            coins = {row["id"]: crypto_data_from_markets_item(row, self.vs_currency) for row in coin_rows}
+        else:
+            coins = dict(previous.coins) if previous else {}
+        if top_rows is not None:
+            top = [top_crypto_from_markets_item(row) for row in top_rows]
+        else:
+            top = list(previous.top) if previous else []
+
+        snapshot = self.store.publish(coins, top, self.vs_currency)
+        logger.info("Published market snapshot v%s (%s coins, top %s).", snapshot.version, len(coins), len(top))
+        return snapshot
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                logger.error("Unexpected error while refreshing market data: %s", e)
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,80 @@
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+from ciyexa_backend.api.v1.schemas.crypto import CryptoData, TopCrypto
+from ciyexa_backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """
+    Immutable view of the market data fetched by one poller refresh.
+    Readers hold a reference to a snapshot; refreshes never modify it, they publish a new one.
+    """
+    version: int
+    fetched_at: float # Epoch seconds
+    vs_currency: str
+    coins: Mapping[str, CryptoData] = field(default_factory=lambda: MappingProxyType({}))
+    top: Tuple[TopCrypto, ...] = ()
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    @property
+    def as_of(self) -> datetime:
+        return datetime.fromtimestamp(self.fetched_at, tz=timezone.utc)
+
+
+class SnapshotStore:
+    """
+    Holds the current MarketSnapshot. Publishing swaps a single reference, so readers always
+    see either the previous or the new snapshot, never a partially updated one.
+    Listeners are called with every snapshot right after it is published; one that raises is
+    logged and does not keep the snapshot from the others.
+    """
+
+    def __init__(self):
+        self._current: Optional[MarketSnapshot] = None
+        self._listeners: List[Callable[[MarketSnapshot], object]] = []
+
+    def add_listener(self, listener: Callable[[MarketSnapshot], object]) -> None:
+        self._listeners.append(listener)
+
+    @property
+    def current(self) -> Optional[MarketSnapshot]:
+        return self._current
+
+    def publish(
+        self,
+        coins: Dict[str, CryptoData],
+        top: List[TopCrypto],
+        vs_currency: str,
+        fetched_at: Optional[float] = None,
+    ) -> MarketSnapshot:
+        version = self._current.version + 1 if self._current else 1
+        snapshot = MarketSnapshot(
+            version=version,
+            fetched_at=fetched_at if fetched_at is not None else time.time(),
+            vs_currency=vs_currency,
+            coins=MappingProxyType(dict(coins)),
+            top=tuple(top),
+        )
+        self._current = snapshot
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error("Market snapshot listener %r failed: %s", listener, e)
+        return snapshot
+
+    def fresh(self, max_age: float) -> Optional[MarketSnapshot]:
+        """Returns the current snapshot if it is younger than `max_age` seconds."""
+        snapshot = self._current
+        if snapshot is None or snapshot.age > max_age:
+            return None
+        return snapshot
@@ -0,0 +1,203 @@
+import asyncio
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Set, Tuple
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.core.responses import encode_json
+from ciyexa_backend.services.market_snapshot import MarketSnapshot
+from ciyexa_backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+FRAME_PREFIX = b'{"type":"prices","data":{'
+FRAME_SUFFIX = b"}}"
+MAX_QUEUED_MESSAGES = 32 # Replies waiting for a client that does not read them
+
+
+class PriceSubscriber:
+    """
+    One connected client. Updates waiting to be sent are kept per coin, so a client that falls
+    behind receives the latest value of each coin once instead of every intermediate one; the
+    backlog can never exceed the number of coins it is subscribed to. Other messages (replies to
+    the client's requests) wait in `messages`, in order.
+    """
+    __slots__ = ("send", "close", "topics", "pending", "messages", "sending", "closed")
+
+    def __init__(self, send: Callable[[str], Awaitable[None]], close: Callable[[], Awaitable[None]]):
+        self.send = send
+        self.close = close
+        self.topics: Set[str] = set()
+        self.pending: Dict[str, bytes] = {}
+        self.messages: Deque[str] = deque()
+        self.sending = False
+        self.closed = False
+
+
+class PriceFeed:
+    """
+    Fans market snapshot refreshes out to WebSocket subscribers. Each refresh encodes the coins
+    whose figures changed once, and every subscriber of a coin is sent those same bytes. Clients
+    have no task of their own while idle: a send task runs only while a client has updates to
+    deliver, and a client whose send does not complete within `send_timeout` is disconnected
+    rather than holding up the others. That task is the only writer to the connection, so other
+    messages for the client go through `send_message` rather than being sent directly.
+    """
+
+    def __init__(self, send_timeout: float = None, max_subscriptions: int = None):
+        self.send_timeout = send_timeout or settings.WS_SEND_TIMEOUT
+        self.max_subscriptions = max_subscriptions or settings.WS_MAX_SUBSCRIPTIONS
+        self._subscribers: Dict[str, Set[PriceSubscriber]] = defaultdict(set) # Coin id -> subscribers
+        self._latest: Dict[str, Tuple[tuple, bytes]] = {} # Coin id -> (compared figures, encoded update)
+        self._sends: Set[asyncio.Task] = set()
+        self.connections = 0
+        self.broadcasts = 0
+        self.updates = 0
+        self.messages_sent = 0
+        self.coalesced = 0
+        self.slow_disconnects = 0
+
+    def connect(self, send: Callable[[str], Awaitable[None]], close: Callable[[], Awaitable[None]]) -> PriceSubscriber:
+        self.connections += 1
+        return PriceSubscriber(send, close)
+
+    def disconnect(self, subscriber: PriceSubscriber) -> None:
+        if subscriber.closed:
+            return
+        subscriber.closed = True
+        subscriber.pending.clear()
+        subscriber.messages.clear()
+        for topic in subscriber.topics:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[topic]
+        self.connections -= 1
+
+    def subscribe(self, subscriber: PriceSubscriber, crypto_ids: Iterable[str]) -> List[str]:
+        """
+        Adds subscriptions, up to `max_subscriptions` per client, and queues the latest known
+        figures of the newly subscribed coins. Returns the coin ids that were added.
+        """
+        added = []
+        for crypto_id in crypto_ids:
+            if crypto_id in subscriber.topics:
+                continue
+            if len(subscriber.topics) >= self.max_subscriptions:
+                break
+            subscriber.topics.add(crypto_id)
+            self._subscribers[crypto_id].add(subscriber)
+            added.append(crypto_id)
+            latest = self._latest.get(crypto_id)
+            if latest is not None:
+                self._deliver(subscriber, crypto_id, latest[1])
+        return added
+
+    def unsubscribe(self, subscriber: PriceSubscriber, crypto_ids: Iterable[str]) -> List[str]:
+        removed = []
+        for crypto_id in crypto_ids:
+            if crypto_id not in subscriber.topics:
+                continue
+            subscriber.topics.discard(crypto_id)
+            subscriber.pending.pop(crypto_id, None)
+            subscribers = self._subscribers.get(crypto_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[crypto_id]
+            removed.append(crypto_id)
+        return removed
+
+    def publish(self, snapshot: MarketSnapshot) -> int:
+        """Snapshot listener: sends the coins whose figures changed to their subscribers. Returns how many changed."""
+        currency = snapshot.vs_currency
+        changed = 0
+        for crypto_id, data in snapshot.coins.items():
+            market_data = data.market_data
+            if market_data is None:
+                continue
+            figures = (
+                market_data.current_price.get(currency),
+                market_data.market_cap.get(currency),
+                market_data.total_volume.get(currency),
+                market_data.price_change_percentage_24h,
+            )
+            latest = self._latest.get(crypto_id)
+            if latest is not None and latest[0] == figures:
+                continue
+            update = encode_json(crypto_id) + b":" + encode_json({
+                "price": figures[0],
+                "market_cap": figures[1],
+                "total_volume": figures[2],
+                "price_change_percentage_24h": figures[3],
+                "vs_currency": currency,
+                "as_of": data.as_of,
+            })
+            self._latest[crypto_id] = (figures, update)
+            changed += 1
+            for subscriber in self._subscribers.get(crypto_id, ()):
+                self._deliver(subscriber, crypto_id, update)
+        self.broadcasts += 1
+        self.updates += changed
+        return changed
+
+    def send_message(self, subscriber: PriceSubscriber, message: Any) -> bool:
+        """
+        Queues a JSON message for the client, sent before its next price update. Returns False
+        without queueing when MAX_QUEUED_MESSAGES are already waiting; the caller should drop
+        the client, which is not reading.
+        """
+        if subscriber.closed:
+            return True
+        if len(subscriber.messages) >= MAX_QUEUED_MESSAGES:
+            return False
+        subscriber.messages.append(encode_json(message).decode())
+        self._wake(subscriber)
+        return True
+
+    def _deliver(self, subscriber: PriceSubscriber, crypto_id: str, update: bytes) -> None:
+        if crypto_id in subscriber.pending:
+            self.coalesced += 1
+        subscriber.pending[crypto_id] = update
+        self._wake(subscriber)
+
+    def _wake(self, subscriber: PriceSubscriber) -> None:
+        if not subscriber.sending:
+            subscriber.sending = True
+            task = asyncio.get_running_loop().create_task(self._send_pending(subscriber))
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+
+    async def _send_pending(self, subscriber: PriceSubscriber) -> None:
+        try:
+            while (subscriber.messages or subscriber.pending) and not subscriber.closed:
+                if subscriber.messages:
+                    text = subscriber.messages.popleft()
+                else:
+                    batch, subscriber.pending = subscriber.pending, {}
+                    text = (FRAME_PREFIX + b",".join(batch.values()) + FRAME_SUFFIX).decode()
+                await asyncio.wait_for(subscriber.send(text), self.send_timeout)
+                self.messages_sent += 1
+        except asyncio.TimeoutError:
+            self.slow_disconnects += 1
+            logger.info("Disconnecting a price subscriber that did not keep up for %.1fs.", self.send_timeout)
+            self.disconnect(subscriber)
+            try:
+                await asyncio.wait_for(subscriber.close(), self.send_timeout)
+            except Exception:
+                pass
+        except Exception as e: # Connection already gone; the endpoint cleans up when its receive fails
+            logger.debug("Price update not delivered: %s", e)
+            self.disconnect(subscriber)
+        finally:
+            subscriber.sending = False
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "connections": self.connections,
+            "subscriptions": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "broadcasts": self.broadcasts,
+            "updates": self.updates,
+            "messages_sent": self.messages_sent,
+            "coalesced": self.coalesced,
+            "slow_disconnects": self.slow_disconnects,
+        }
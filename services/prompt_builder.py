@@ -0,0 +1,170 @@
+import math
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Tuple
+from ciyexa_backend.api.v1.schemas.crypto import CryptoData, TopCrypto
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.services.timeseries import PriceSeries
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception: # Optional dependency (or its encoding files are unavailable); fall back to an estimate
+    _encoding = None
+
+# Templates are bound once at import; each section lists its column names once, then one compact row per coin
+QUESTION = "Question: {query}\n".format
+CURRENT_HEADER = "Current market data ({currency}{as_of}):\ncoin|price|24h|market cap\n".format
+CURRENT_ROW = "{name} ({symbol})|{price}|{change}|{market_cap}\n".format
+HISTORY_HEADER = "Price history, last {days} days ({currency}):\ncoin|latest|change|low|high|max drawdown|volatility\n".format
+HISTORY_ROW = "{coin}|{latest}|{change}|{low}|{high}|{drawdown}|{volatility}\n".format
+TOP_HEADER = "Top {count} by market cap ({currency}):\n#|coin|price|24h|market cap\n".format
+TOP_ROW = "{rank}|{name} ({symbol})|{price}|{change}|{market_cap}\n".format
+OMITTED = "({count} more rows left out for length)\n".format
+INSTRUCTION = "Answer concisely from this data, then address any other parts of the question."
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in `text` with tiktoken's cl100k encoding when installed, otherwise about four characters per token."""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+# Prefixed to amounts in these currencies; amounts in other ones are followed by the currency code
+CURRENCY_SYMBOLS = {"usd": "$", "eur": "€", "gbp": "£", "jpy": "¥", "cny": "¥", "inr": "₹", "krw": "₩"}
+
+
+def _money(value: Optional[float], currency: str) -> str:
+    if value is None:
+        return "n/a"
+    for threshold, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M")):
+        if abs(value) >= threshold:
+            amount = f"{value / threshold:,.2f}{suffix}"
+            break
+    else:
+        amount = f"{value:,.2f}" if abs(value) >= 0.01 else f"{value:.6g}"
+    symbol = CURRENCY_SYMBOLS.get(currency)
+    return f"{symbol}{amount}" if symbol else f"{amount} {currency.upper()}"
+
+
+def _percent(value: Optional[float], signed: bool = True) -> str:
+    if value is None:
+        return "n/a"
+    return f"{value:+.2f}%" if signed else f"{value:.2f}%"
+
+
+@dataclass(frozen=True)
+class BuiltPrompt:
+    prompt: str
+    tokens: int
+    rows: int # Data rows included
+    omitted: int # Data rows left out to stay within the budget
+
+
+class PromptContextBuilder:
+    """
+    Turns enrichment data into a compact LLM prompt: one table per kind of data with its column
+    names written once, figures rounded and summarized (historical series become one row of
+    statistics). Sections are filled in priority order (current data, history, top-N) until
+    `token_budget` is reached; rows that do not fit are left out and counted.
+    """
+
+    def __init__(self, token_budget: int = None, vs_currency: str = None):
+        self.token_budget = token_budget or settings.PROMPT_TOKEN_BUDGET
+        self.vs_currency = vs_currency or settings.DEFAULT_VS_CURRENCY
+
+    def build(
+        self,
+        user_query: str,
+        current: Iterable[CryptoData] = (),
+        historical: Iterable[Tuple[str, PriceSeries]] = (),
+        days: Optional[int] = None,
+        top: Sequence[TopCrypto] = (),
+    ) -> Optional[BuiltPrompt]:
+        """Returns None when none of the data yields a row."""
+        currency = self.vs_currency
+        sections: List[Tuple[str, List[str]]] = []
+
+        current_rows, timestamps = [], []
+        for data in current:
+            row = self._current_row(data, currency)
+            if row:
+                current_rows.append(row)
+                if data.as_of:
+                    timestamps.append(data.as_of)
+        if current_rows:
+            as_of = f", as of {min(timestamps):%Y-%m-%d %H:%M} UTC" if timestamps else ""
+            sections.append((CURRENT_HEADER(currency=currency.upper(), as_of=as_of), current_rows))
+        history_rows = [row for row in (self._history_row(crypto_id, series, currency) for crypto_id, series in historical) if row]
+        if history_rows:
+            sections.append((HISTORY_HEADER(days=days, currency=currency.upper()), history_rows))
+        top_rows = [self._top_row(item, currency) for item in top]
+        if top_rows:
+            sections.append((TOP_HEADER(count=len(top_rows), currency=currency.upper()), top_rows))
+        if not sections:
+            return None
+
+        parts = [QUESTION(query=user_query)]
+        used = count_tokens(parts[0]) + count_tokens(INSTRUCTION) + count_tokens(OMITTED(count=99))
+        included = omitted = 0
+        for header, rows in sections:
+            header_tokens = count_tokens(header)
+            header_added = False
+            for row in rows:
+                row_tokens = count_tokens(row) + (0 if header_added else header_tokens)
+                if used + row_tokens > self.token_budget:
+                    omitted += 1
+                    continue
+                if not header_added:
+                    parts.append(header)
+                    header_added = True
+                parts.append(row)
+                used += row_tokens
+                included += 1
+        if not included:
+            return None
+        if omitted:
+            parts.append(OMITTED(count=omitted))
+        parts.append(INSTRUCTION)
+        prompt = "".join(parts)
+        return BuiltPrompt(prompt, count_tokens(prompt), included, omitted)
+
+    @staticmethod
+    def _current_row(data: CryptoData, currency: str) -> Optional[str]:
+        market_data = data.market_data
+        price = market_data.current_price.get(currency) if market_data else None
+        if price is None:
+            return None
+        return CURRENT_ROW(
+            name=data.name,
+            symbol=data.symbol.upper(),
+            price=_money(price, currency),
+            change=_percent(market_data.price_change_percentage_24h),
+            market_cap=_money(market_data.market_cap.get(currency), currency),
+        )
+
+    @staticmethod
+    def _history_row(crypto_id: str, series: PriceSeries, currency: str) -> Optional[str]:
+        trend = series.summary()
+        if trend is None:
+            return None
+        return HISTORY_ROW(
+            coin=crypto_id,
+            latest=_money(trend.end_price, currency),
+            change=_percent(trend.change_percentage),
+            low=_money(trend.low, currency),
+            high=_money(trend.high, currency),
+            drawdown=_percent(trend.max_drawdown_percentage, signed=False),
+            volatility=_percent(trend.volatility_percentage, signed=False),
+        )
+
+    @staticmethod
+    def _top_row(item: TopCrypto, currency: str) -> str:
+        return TOP_ROW(
+            rank=item.market_cap_rank,
+            name=item.name,
+            symbol=item.symbol.upper(),
+            price=_money(item.current_price, currency),
+            change=_percent(item.price_change_percentage_24h),
+            market_cap=_money(item.market_cap, currency),
+        )
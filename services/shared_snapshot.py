@@ -0,0 +1,265 @@
+"""
+Market snapshot shared between worker processes through an mmap'd file (on /dev/shm where available).
+One refresher process polls CoinGecko and writes each snapshot into the region; every worker follows
+it and serves from its local SnapshotStore, so upstream traffic does not grow with the worker count.
+
+The file lives in a directory private to the service's user (0700) and is created 0600; both sides
+refuse a file or directory another user could have created or written, since a planted file would
+let that user feed prices to every worker.
+
+Layout: a fixed header (magic, layout version, sequence number, payload length) followed by the
+JSON-encoded snapshot. Writes follow the seqlock protocol: the writer makes the sequence number odd,
+writes the payload and length, then makes it even again. A reader that sees an odd number, or a
+different number after decoding, has raced a write and tries again.
+"""
+import asyncio
+import fcntl
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from ciyexa_backend.api.v1.schemas.crypto import CryptoData, TopCrypto
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.core.responses import encode_json
+from ciyexa_backend.services.market_snapshot import MarketSnapshot, SnapshotStore
+from ciyexa_backend.utils.files import owned_privately
+from ciyexa_backend.utils.logger import get_logger
+
+try:
+    import orjson
+except ImportError: # Optional dependency; falls back to the standard library decoder
+    orjson = None
+
+logger = get_logger(__name__)
+
+MAGIC = b"CXMS"
+LAYOUT_VERSION = 1
+HEADER = struct.Struct("<4sIQQ") # magic, layout version, sequence number, payload length
+SEQUENCE = struct.Struct("<Q")
+SEQUENCE_OFFSET = 8
+LENGTH_OFFSET = 16
+PAYLOAD_OFFSET = 32 # Header padded to a cache-line friendly size
+READ_ATTEMPTS = 3
+
+
+def default_shared_snapshot_path() -> Path:
+    if settings.SNAPSHOT_SHARED_PATH:
+        return Path(settings.SNAPSHOT_SHARED_PATH)
+    shm = Path("/dev/shm")
+    # Per user: a fixed name in a shared directory could be created first by anyone
+    return (shm if shm.is_dir() else Path(tempfile.gettempdir())) / f"ciyexa-{os.getuid()}" / "market-snapshot"
+
+
+class UntrustedSnapshotFile(RuntimeError):
+    """The shared snapshot file, or its directory, is not owned by this user or is writable by others."""
+
+
+def _check_trusted(fd: int, path: Path) -> None:
+    if not (owned_privately(os.fstat(fd)) and owned_privately(os.stat(path.parent))):
+        raise UntrustedSnapshotFile(f"{path} or its directory is not owned by this user or is writable by others.")
+
+
+def _loads(data) -> Any:
+    if orjson is not None:
+        return orjson.loads(data) # Accepts the memoryview directly, no copy of the payload
+    return json.loads(bytes(data))
+
+
+class SharedSnapshotWriter:
+    """
+    Writes snapshots into the shared region; used as a SnapshotStore listener in the refresher
+    process. An exclusive lock on the file keeps a second refresher from writing at the same time.
+    """
+
+    def __init__(self, path: Optional[Path] = None, capacity: int = None):
+        self.path = path or default_shared_snapshot_path()
+        self.capacity = capacity or settings.SNAPSHOT_SHARED_MAX_BYTES
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+
+    def open(self) -> None:
+        """Creates or reuses the region. Raises UntrustedSnapshotFile if another user could have planted or written it."""
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        # Reuse the existing file rather than replacing it, so workers that mapped it keep following
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        try:
+            _check_trusted(fd, self.path)
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise RuntimeError(f"Another refresher is already writing the shared snapshot at {self.path}.")
+        except BaseException:
+            os.close(fd)
+            raise
+        size = PAYLOAD_OFFSET + self.capacity
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self._fd = fd
+        self._map = mmap.mmap(fd, size)
+        magic, layout, sequence, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or layout != LAYOUT_VERSION:
+            HEADER.pack_into(self._map, 0, MAGIC, LAYOUT_VERSION, 0, 0)
+        elif sequence % 2:
+            # A previous writer died mid-write; drop the torn payload
+            SEQUENCE.pack_into(self._map, LENGTH_OFFSET, 0)
+            SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, sequence + 1)
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._fd is not None:
+            os.close(self._fd) # Also releases the lock
+            self._fd = None
+
+    def publish(self, snapshot: MarketSnapshot) -> None:
+        payload = encode_json({
+            "fetched_at": snapshot.fetched_at,
+            "vs_currency": snapshot.vs_currency,
+            "coins": dict(snapshot.coins),
+            "top": list(snapshot.top),
+        })
+        if len(payload) > self.capacity:
+            logger.error("Market snapshot of %s bytes does not fit the %s byte shared region. Not published.", len(payload), self.capacity)
+            return
+        sequence = SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0]
+        SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, sequence + 1) # Odd: write in progress
+        self._map[PAYLOAD_OFFSET:PAYLOAD_OFFSET + len(payload)] = payload
+        SEQUENCE.pack_into(self._map, LENGTH_OFFSET, len(payload))
+        SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, sequence + 2)
+
+
+class SharedSnapshotReader:
+    """Maps the shared region read-only and decodes the payload only when the sequence number has moved."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or default_shared_snapshot_path()
+        self.sequence = 0 # Of the last payload returned
+        self.torn_reads = 0
+        self._map: Optional[mmap.mmap] = None
+        self._inode: Optional[int] = None
+        self._rejected_inode: Optional[int] = None
+
+    def _ensure_mapped(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.close()
+            return False
+        if self._map is not None and stat.st_ino == self._inode:
+            return True
+        # First read, or the file was replaced: map the current one
+        self.close()
+        if stat.st_size < PAYLOAD_OFFSET or stat.st_ino == self._rejected_inode:
+            return False
+        with open(os.open(self.path, os.O_RDONLY | os.O_NOFOLLOW), "rb") as f:
+            try:
+                _check_trusted(f.fileno(), self.path)
+            except UntrustedSnapshotFile as e:
+                logger.error("Not following the shared market snapshot: %s", e)
+                self._rejected_inode = stat.st_ino # Logged once per file
+                return False
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._inode = os.fstat(f.fileno()).st_ino # The file mapped, even if it was swapped since stat
+        self.sequence = 0
+        return True
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._inode = None
+
+    def read_if_changed(self) -> Optional[Dict[str, Any]]:
+        """Returns the decoded payload if a new snapshot was written since the last call, otherwise None."""
+        if not self._ensure_mapped():
+            return None
+        magic, layout, _, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or layout != LAYOUT_VERSION:
+            return None
+        for _ in range(READ_ATTEMPTS):
+            sequence = SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0]
+            if sequence == self.sequence:
+                return None
+            if sequence % 2 == 0:
+                length = SEQUENCE.unpack_from(self._map, LENGTH_OFFSET)[0]
+                if not length:
+                    return None
+                if PAYLOAD_OFFSET + length > len(self._map):
+                    self.close() # The writer grew the file; map it again on the next call
+                    return None
+                try:
+                    with memoryview(self._map) as view, view[PAYLOAD_OFFSET:PAYLOAD_OFFSET + length] as payload:
+                        data = _loads(payload)
+                except ValueError:
+                    data = None # Payload overwritten while decoding; the sequence check below catches it
+                if SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0] == sequence and data is not None:
+                    self.sequence = sequence
+                    return data
+            self.torn_reads += 1
+            time.sleep(0) # Let the writer finish
+        return None
+
+
+class SharedSnapshotFollower:
+    """
+    Worker side of the shared snapshot: checks the region's sequence number every `interval`
+    seconds and republishes new snapshots into the local SnapshotStore, which also notifies its
+    listeners (e.g. the WebSocket price feed). Requests keep reading the local store, so the hot
+    path costs the same as with an in-process poller.
+    """
+
+    def __init__(self, store: SnapshotStore, reader: Optional[SharedSnapshotReader] = None, interval: float = None):
+        self.store = store
+        self.reader = reader or SharedSnapshotReader()
+        self.interval = interval or settings.SNAPSHOT_SHARED_POLL_INTERVAL
+        self.updates = 0
+        self.errors = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def poll_once(self) -> Optional[MarketSnapshot]:
+        data = self.reader.read_if_changed()
+        if data is None:
+            return None
+        coins = {crypto_id: CryptoData.model_validate(item) for crypto_id, item in data["coins"].items()}
+        top = [TopCrypto.model_validate(item) for item in data["top"]]
+        snapshot = self.store.publish(coins, top, data["vs_currency"], fetched_at=data["fetched_at"])
+        self.updates += 1
+        return snapshot
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.reader.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self.poll_once()
+            except Exception as e:
+                self.errors += 1
+                logger.error("Could not load the shared market snapshot: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.store.current
+        return {
+            "updates": self.updates,
+            "errors": self.errors,
+            "torn_reads": self.reader.torn_reads,
+            "sequence": self.reader.sequence,
+            "age_seconds": snapshot.age if snapshot else None,
+        }
@@ -0,0 +1,61 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key onto one in-flight task.
+
+    Every caller awaiting the same key receives the same result or exception. A cancelled
+    caller only stops waiting; the shared task keeps running for the others and is cancelled
+    only once every caller has gone away.
+    """
+
+    def __init__(self, name: str = "single_flight"):
+        self.name = name
+        self.executions = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self._calls: Dict[Hashable, _Call] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done() and call.waiters == 1:
+                # Last interested caller left: stop the upstream work and let the next caller start afresh
+                self._forget(key, call)
+                call.task.cancel()
+                self.cancelled += 1
+            raise
+        finally:
+            call.waiters -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"executions": self.executions, "coalesced": self.coalesced, "cancelled": self.cancelled, "in_flight": self.in_flight}
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
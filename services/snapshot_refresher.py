@@ -0,0 +1,64 @@
+"""
+Refresher process for SNAPSHOT_MODE=shared: the one process per host that calls CoinGecko for the
+market snapshot and the coin list. Workers read the snapshot from the shared region and reload the
+coin index from its on-disk snapshot when it changes, so they make no upstream calls for either.
+
+    python -m ciyexa_backend.services.snapshot_refresher
+"""
+import asyncio
+import signal
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.core.http_client import HTTPClientManager
+from ciyexa_backend.services.coin_index import CoinIndexRefresher, load_coin_index
+from ciyexa_backend.services.crypto_data_service import CryptoDataService
+from ciyexa_backend.services.market_poller import MarketDataPoller
+from ciyexa_backend.services.market_snapshot import SnapshotStore
+from ciyexa_backend.services.shared_snapshot import SharedSnapshotWriter
+from ciyexa_backend.utils.logger import get_logger, setup_logging
+
+logger = get_logger(__name__)
+
+
+async def run_refresher(stop: asyncio.Event = None) -> None:
+    """Polls market data into the shared region until `stop` is set (or SIGINT/SIGTERM arrives)."""
+    stop = stop or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    writer = SharedSnapshotWriter()
+    writer.open()
+    http_client = HTTPClientManager()
+    await http_client.start()
+    store = SnapshotStore()
+    store.add_listener(writer.publish)
+    crypto_service = CryptoDataService(http_client=http_client, snapshots=store)
+
+    def use_coin_index(index, classifier):
+        crypto_service.coin_index = index
+
+    coin_index = await asyncio.to_thread(load_coin_index)
+    use_coin_index(coin_index, None)
+    coin_index_refresher = CoinIndexRefresher(crypto_service.fetch_coins_list, use_coin_index)
+    market_poller = MarketDataPoller(crypto_service, store)
+    logger.info("Publishing market snapshots to %s every %ss.", writer.path, market_poller.interval)
+    try:
+        if settings.COIN_INDEX_REFRESH_ENABLED:
+            await coin_index_refresher.start(coin_index)
+        await market_poller.start()
+        await stop.wait()
+    finally:
+        await market_poller.stop()
+        await coin_index_refresher.stop()
+        await crypto_service.cache.close()
+        await http_client.close()
+        writer.close()
+
+
+def main() -> None:
+    setup_logging()
+    asyncio.run(run_refresher())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+NumPy-backed historical series: parsing CoinGecko's market_chart payload into arrays, downsampling
+(LTTB and OHLC bucketing) and vectorized indicators.
+"""
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, List, Optional
+import numpy as np
+from ciyexa_backend.api.v1.schemas.crypto import HistoricalPriceData, SeriesSummary
+
+MS_PER_YEAR = 365 * 24 * 3600 * 1000
+MAX_EMA_EXPONENT = 200.0 # Natural log bound on the per-block weights in ema(), far below float64 overflow
+
+
+class DownsampleMethod(str, Enum):
+    LTTB = "lttb"
+    OHLC = "ohlc"
+
+
+INDICATORS = ("sma", "ema", "returns", "volatility", "drawdown")
+
+
+def _pairs(rows: List[List[float]]) -> np.ndarray:
+    return np.array(rows, dtype=np.float64).reshape(-1, 2)
+
+
+def _align(rows: List[List[float]], timestamps: np.ndarray) -> np.ndarray:
+    """Values of a [timestamp, value] list on the price timestamps, interpolating if the axes differ."""
+    pairs = _pairs(rows)
+    if len(pairs) == 0:
+        return np.empty(0)
+    if len(pairs) == len(timestamps) and np.array_equal(pairs[:, 0], timestamps):
+        return pairs[:, 1]
+    return np.interp(timestamps, pairs[:, 0], pairs[:, 1])
+
+
+def _pairs_array(timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """[timestamp, value] rows as one contiguous float64 array, which orjson encodes natively."""
+    return np.column_stack((timestamps.astype(np.float64), values)).reshape(-1, 2)
+
+
+def _pairs_list(timestamps: np.ndarray, values: np.ndarray) -> List[List[float]]:
+    return _pairs_array(timestamps, values).tolist() if len(values) else []
+
+
+@dataclass(frozen=True)
+class PriceSeries:
+    """One market_chart response as parallel arrays on the price timestamps (milliseconds)."""
+    timestamps: np.ndarray # int64
+    prices: np.ndarray # float64
+    market_caps: np.ndarray # float64, empty if CoinGecko returned none
+    total_volumes: np.ndarray # float64, empty if CoinGecko returned none
+
+    @classmethod
+    def from_market_chart(cls, data: Dict[str, List[List[float]]]) -> "PriceSeries":
+        prices = _pairs(data.get("prices") or [])
+        prices = prices[~np.isnan(prices).any(axis=1)]
+        timestamps = prices[:, 0]
+        return cls(
+            timestamps=timestamps.astype(np.int64),
+            prices=prices[:, 1],
+            market_caps=_align(data.get("market_caps") or [], timestamps),
+            total_volumes=_align(data.get("total_volumes") or [], timestamps),
+        )
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def take(self, indices: np.ndarray) -> "PriceSeries":
+        def pick(values: np.ndarray) -> np.ndarray:
+            return values[indices] if len(values) else values
+
+        return PriceSeries(self.timestamps[indices], self.prices[indices], pick(self.market_caps), pick(self.total_volumes))
+
+    def to_market_chart(self) -> Dict[str, List[List[float]]]:
+        return {
+            "prices": _pairs_list(self.timestamps, self.prices),
+            "market_caps": _pairs_list(self.timestamps, self.market_caps),
+            "total_volumes": _pairs_list(self.timestamps, self.total_volumes),
+        }
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Same shape as to_market_chart, as NumPy arrays for direct JSON encoding."""
+        return {
+            "prices": _pairs_array(self.timestamps, self.prices),
+            "market_caps": _pairs_array(self.timestamps[:len(self.market_caps)], self.market_caps),
+            "total_volumes": _pairs_array(self.timestamps[:len(self.total_volumes)], self.total_volumes),
+        }
+
+    def to_historical_price_data(self) -> HistoricalPriceData:
+        # The arrays are already typed, so skip Pydantic's per-element validation
+        return HistoricalPriceData.model_construct(**self.to_market_chart())
+
+    @property
+    def fingerprint(self) -> tuple:
+        """Cheap identity of the data: series only change by moving their ends or growing."""
+        if len(self) == 0:
+            return (0,)
+        return (len(self), int(self.timestamps[0]), int(self.timestamps[-1]), float(self.prices[-1]))
+
+    @property
+    def periods_per_year(self) -> Optional[float]:
+        if len(self) < 2:
+            return None
+        step = float(np.median(np.diff(self.timestamps)))
+        return MS_PER_YEAR / step if step > 0 else None
+
+    def summary(self) -> Optional[SeriesSummary]:
+        if len(self) == 0:
+            return None
+        prices = self.prices
+        start, end = float(prices[0]), float(prices[-1])
+        log_returns = np.diff(np.log(prices)) if (prices > 0).all() else np.empty(0)
+        volatility = None
+        if len(log_returns) >= 2 and self.periods_per_year:
+            volatility = float(np.std(log_returns, ddof=1) * np.sqrt(self.periods_per_year) * 100)
+        return SeriesSummary(
+            points=len(self),
+            start_price=start,
+            end_price=end,
+            change_percentage=(end / start - 1) * 100 if start else 0.0,
+            high=float(prices.max()),
+            low=float(prices.min()),
+            volatility_percentage=volatility,
+            max_drawdown_percentage=float(drawdown(prices).min()),
+        )
+
+
+# --- Downsampling ---
+
+def lttb_indices(timestamps: np.ndarray, values: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: picks `n_out` points that preserve the visual shape of the
+    series. Keeps the first and last point; from each bucket in between, keeps the point forming
+    the largest triangle with the previously kept point and the average of the next bucket.
+    """
+    n = len(values)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:n_out])
+
+    x = timestamps.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64) # Bucket boundaries, excluding both ends
+    next_starts = np.append(edges[1:-1], n - 1)
+    next_ends = np.append(edges[2:], n)
+    counts = next_ends - next_starts
+    avg_x = np.add.reduceat(x, next_starts) / counts
+    avg_y = np.add.reduceat(values, next_starts) / counts
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - avg_x[i]) * (values[start:end] - values[a])
+            - (x[a] - x[start:end]) * (avg_y[i] - values[a])
+        )
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def ohlc_buckets(timestamps: np.ndarray, values: np.ndarray, n_out: int):
+    """
+    Splits the series into `n_out` equal time buckets and returns
+    (bucket_start_times, open, high, low, close, last_index_per_bucket). Empty buckets are dropped.
+    """
+    n = len(values)
+    if n == 0:
+        empty = np.empty(0)
+        return empty.astype(np.int64), empty, empty, empty, empty, empty.astype(np.int64)
+    bounds = np.linspace(timestamps[0], timestamps[-1], n_out + 1)[:-1]
+    starts = np.unique(np.searchsorted(timestamps, bounds, side="left"))
+    starts = starts[starts < n]
+    last = np.append(starts[1:], n) - 1
+    return (
+        timestamps[starts],
+        values[starts],
+        np.maximum.reduceat(values, starts),
+        np.minimum.reduceat(values, starts),
+        values[last],
+        last,
+    )
+
+
+# --- Indicators (NaN where not yet defined) ---
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    if window <= len(values):
+        sums = np.cumsum(np.insert(values, 0, 0.0))
+        out[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return out
+
+
+def ema(values: np.ndarray, span: int) -> np.ndarray:
+    """
+    Exponential moving average with alpha = 2 / (span + 1), seeded with the first value.
+    The recurrence is unrolled into a weighted cumulative sum, computed in blocks short enough
+    that the weights cannot overflow.
+    """
+    n = len(values)
+    out = np.empty(n)
+    if n == 0:
+        return out
+    alpha = 2.0 / (span + 1)
+    decay = 1.0 - alpha
+    block = max(1, int(MAX_EMA_EXPONENT / -np.log(decay)))
+    out[0] = previous = values[0]
+    for start in range(1, n, block):
+        chunk = values[start:start + block]
+        powers = decay ** -np.arange(len(chunk), dtype=np.float64)
+        weighted = np.cumsum(alpha * chunk * powers)
+        out[start:start + len(chunk)] = (decay * previous + weighted) / powers
+        previous = out[start + len(chunk) - 1]
+    return out
+
+
+def returns(values: np.ndarray) -> np.ndarray:
+    """Percentage change from the previous point."""
+    out = np.full(len(values), np.nan)
+    if len(values) > 1:
+        out[1:] = (values[1:] / values[:-1] - 1) * 100
+    return out
+
+
+def rolling_volatility(values: np.ndarray, window: int, periods_per_year: float) -> np.ndarray:
+    """Annualized standard deviation of log returns over the trailing `window` returns, in percent."""
+    out = np.full(len(values), np.nan)
+    if window < 2 or window >= len(values) or (values <= 0).any():
+        return out
+    log_returns = np.diff(np.log(values))
+    sums = np.cumsum(np.insert(log_returns, 0, 0.0))
+    squares = np.cumsum(np.insert(log_returns ** 2, 0, 0.0))
+    window_sum = sums[window:] - sums[:-window]
+    window_squares = squares[window:] - squares[:-window]
+    variance = np.maximum((window_squares - window_sum ** 2 / window) / (window - 1), 0.0)
+    out[window:] = np.sqrt(variance * periods_per_year) * 100
+    return out
+
+
+def drawdown(values: np.ndarray) -> np.ndarray:
+    """Percentage below the running maximum (0 at new highs)."""
+    if len(values) == 0:
+        return np.empty(0)
+    return (values / np.maximum.accumulate(values) - 1) * 100
+
+
+def downsample_and_analyze(
+    series: PriceSeries,
+    points: Optional[int] = None,
+    method: DownsampleMethod = DownsampleMethod.LTTB,
+    indicators: tuple = (),
+    window: int = 20,
+    include_summary: bool = False,
+) -> Dict:
+    """
+    Builds the /crypto/historical response body, with series as NumPy arrays. Indicators are computed on the full-resolution
+    series and then sampled at the returned points, except `returns`, which is the change between
+    consecutive returned points.
+    """
+    body: Dict = {}
+    if points is not None and points < len(series):
+        if method == DownsampleMethod.OHLC:
+            bucket_starts, opens, highs, lows, closes, indices = ohlc_buckets(series.timestamps, series.prices, points)
+            body["ohlc"] = np.column_stack((bucket_starts.astype(np.float64), opens, highs, lows, closes))
+        else:
+            indices = lttb_indices(series.timestamps, series.prices, points)
+    else:
+        indices = np.arange(len(series))
+    sampled = series.take(indices)
+    body.update(sampled.to_arrays())
+
+    if indicators:
+        computed = {}
+        for name in indicators:
+            if name == "sma":
+                values = sma(series.prices, window)[indices]
+            elif name == "ema":
+                values = ema(series.prices, window)[indices]
+            elif name == "volatility":
+                values = rolling_volatility(series.prices, window, series.periods_per_year or 1.0)[indices]
+            elif name == "drawdown":
+                values = drawdown(series.prices)[indices]
+            else:
+                values = returns(sampled.prices)
+            defined = ~np.isnan(values)
+            computed[name] = _pairs_array(sampled.timestamps[defined], values[defined])
+        body["indicators"] = computed
+    if include_summary:
+        summary = series.summary()
+        body["summary"] = summary.model_dump() if summary else None
+    return body
@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from ciyexa_backend.main import app
+from ciyexa_backend.api.v1.dependencies import get_llm_service
+from ciyexa_backend.api.v1.endpoints import agent
+from ciyexa_backend.benchmarks.fake_servers import FakeLLM, run_server
+from ciyexa_backend.services.admission import AdmissionController, AdmissionRejected, AIMDLimiter
+from ciyexa_backend.services.llm_agent import LLMAgentService
+
+
+@pytest.mark.asyncio
+async def test_admission_limits_clients_and_sheds_instead_of_waiting():
+    """Test per-client 429s, hand-over of released slots to the queue, and 503s for a full or hopeless queue."""
+    controller = AdmissionController(max_in_flight=2, max_per_client=2, max_queue=1, queue_timeout=1.0)
+    release_a1 = await controller.acquire("a")
+    release_a2 = await controller.acquire("a")
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire("a")
+    assert rejected.value.status_code == 429
+
+    waiter = asyncio.create_task(controller.acquire("b"))
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire("c")
+    assert (rejected.value.status_code, rejected.value.reason) == (503, "queue_full")
+
+    release_a1()
+    release_a1() # Releasing twice gives back one slot
+    release_b = await waiter
+    assert (controller.in_flight, controller.queued) == (2, 0)
+
+    controller.service_time = 30.0 # Each request holds its slot for 30s, so the next one would wait 15s
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire("c")
+    assert (rejected.value.status_code, rejected.value.reason, rejected.value.retry_after) == (503, "shed", 15)
+
+    release_a2()
+    release_b()
+    stats = controller.stats()
+    assert (stats["in_flight"], stats["clients"], stats["admitted"]) == (0, 0, 3)
+    assert (stats["rejected_client_limit"], stats["rejected_queue_full"], stats["rejected_shed"]) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_aimd_limit_follows_llm_latency():
+    """Test that fast LLM calls grow the limit additively and a slow one cuts it multiplicatively."""
+    limiter = AIMDLimiter(initial=4, min_limit=2, max_limit=8, latency_target=1.0, backoff=0.5, max_wait=0.05)
+    for _ in range(8):
+        await limiter.acquire()
+        limiter.release(0.1)
+    assert limiter.limit > 5
+
+    await limiter.acquire()
+    limiter.release(5.0)
+    assert int(limiter.limit) == 2
+    await limiter.acquire()
+    limiter.release(5.0) # Within one latency target of the last cut, so no further cut
+    assert int(limiter.limit) == 2 and limiter.decreases == 1
+
+    await limiter.acquire()
+    await limiter.acquire()
+    with pytest.raises(AdmissionRejected) as rejected:
+        await limiter.acquire()
+    assert rejected.value.reason == "llm_overloaded"
+
+
+@pytest.mark.asyncio
+async def test_abandoned_llm_stream_leaves_the_limit_unchanged():
+    """Test that a stream cancelled before its first chunk frees its slot without counting as a fast call."""
+    fake_llm = FakeLLM(["token "], latency=1.0)
+    with run_server(fake_llm.app) as llm_url:
+        service = LLMAgentService()
+        service.llm_stream_url = f"{llm_url}/api/chat"
+        service.concurrency = AIMDLimiter(initial=4, min_limit=2, max_limit=8, latency_target=1.0)
+        first_chunk = asyncio.create_task(service.stream_llm_response("What is Bitcoin?").__anext__())
+        await asyncio.sleep(0.1)
+        first_chunk.cancel() # The client disconnected
+        with pytest.raises(asyncio.CancelledError):
+            await first_chunk
+    limiter = service.concurrency
+    assert (limiter.in_flight, limiter.limit, limiter.increases, limiter.decreases) == (0, 4.0, 0, 0)
+
+
+def test_chat_over_client_limit_gets_429(mocker):
+    """Test that the chat endpoint answers a client over its limit with 429 and Retry-After, without calling the LLM."""
+    controller = AdmissionController(max_in_flight=10, max_per_client=1)
+    mocker.patch.object(agent, "admission", controller)
+    get_llm_response = mocker.patch.object(get_llm_service(), "get_llm_response", new_callable=mocker.AsyncMock)
+    release = asyncio.run(controller.acquire("testclient")) # A request from the same client still running
+
+    response = TestClient(app).post("/api/v1/agent/chat", json={"query": "What is a blockchain?"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert response.json()["reason"] == "client_limit"
+    get_llm_response.assert_not_called()
+    release()
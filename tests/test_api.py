@@ -2,8 +2,11 @@ import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch
 from ciyexa_backend.main import app
+from ciyexa_backend.api.v1.endpoints import agent
 from ciyexa_backend.api.v1.schemas.crypto import CryptoData, MarketData, HistoricalPriceData, TopCrypto
 from ciyexa_backend.core.config import settings
+from ciyexa_backend.services.llm_cache import LLMResponseCache
+from ciyexa_backend.services.timeseries import PriceSeries
 
 client = TestClient(app)
 
@@ -25,6 +28,7 @@ MOCK_HISTORICAL_DATA = HistoricalPriceData(
     market_caps=[[1678886400000, 380000000000.0], [1678972800000, 390000000000.0]],
     total_volumes=[[1678886400000, 10000000000.0], [1678972800000, 11000000000.0]]
 )
+MOCK_PRICE_SERIES = PriceSeries.from_market_chart(MOCK_HISTORICAL_DATA.model_dump())
 MOCK_TOP_CRYPTOS = [
     TopCrypto(
         id="bitcoin", symbol="btc", name="Bitcoin", image="url",
@@ -41,6 +45,9 @@ def mock_services(mocker):
     """
     Fixture to mock external service dependencies for all tests.
     """
+    # Start every test with an empty LLM response cache
+    mocker.patch.object(agent, "llm_cache", LLMResponseCache())
+
     # Mock LLMAgentService
     mocker.patch('ciyexa_backend.services.llm_agent.LLMAgentService.get_llm_response',
                  new_callable=AsyncMock, return_value=MOCK_LLM_RESPONSE)
@@ -48,8 +55,8 @@ def mock_services(mocker):
     # Mock CryptoDataService
     mocker.patch('ciyexa_backend.services.crypto_data_service.CryptoDataService.get_market_data',
                  new_callable=AsyncMock, return_value=MOCK_CRYPTO_MARKET_DATA)
-    mocker.patch('ciyexa_backend.services.crypto_data_service.CryptoDataService.get_historical_prices',
-                 new_callable=AsyncMock, return_value=MOCK_HISTORICAL_DATA)
+    mocker.patch('ciyexa_backend.services.crypto_data_service.CryptoDataService.get_price_series',
+                 new_callable=AsyncMock, return_value=MOCK_PRICE_SERIES)
     mocker.patch('ciyexa_backend.services.crypto_data_service.CryptoDataService.get_top_n_cryptos_by_market_cap',
                  new_callable=AsyncMock, return_value=MOCK_TOP_CRYPTOS)
     
@@ -90,13 +97,13 @@ async def test_chat_current_crypto_query(mocker):
     assert response.json()["source"] == "Hybrid (LLM + Current Crypto Data)"
     mock_get_market_data.assert_called_once_with("bitcoin")
     # Check if LLM was called with enriched prompt
-    assert "Current Price (USD): $70,000.00" in mock_llm_response.call_args[0][0]
+    assert "Bitcoin (BTC)|$70,000.00|+2.50%|$1.30T" in mock_llm_response.call_args[0][0]
 
 @pytest.mark.asyncio
 async def test_chat_historical_crypto_query(mocker):
     """Test chat endpoint with a historical crypto price query."""
-    mock_get_historical_prices = mocker.patch('ciyexa_backend.services.crypto_data_service.CryptoDataService.get_historical_prices',
-                                              new_callable=AsyncMock, return_value=MOCK_HISTORICAL_DATA)
+    mock_get_price_series = mocker.patch('ciyexa_backend.services.crypto_data_service.CryptoDataService.get_price_series',
+                                              new_callable=AsyncMock, return_value=MOCK_PRICE_SERIES)
     mock_llm_response = mocker.patch('ciyexa_backend.services.llm_agent.LLMAgentService.get_llm_response',
                                      new_callable=AsyncMock, return_value="AI response with historical Bitcoin price.")
 
@@ -104,20 +111,20 @@ async def test_chat_historical_crypto_query(mocker):
     assert response.status_code == 200
     assert response.json()["response"] == "AI response with historical Bitcoin price."
     assert response.json()["source"] == "Hybrid (LLM + Historical Crypto Data)"
-    mock_get_historical_prices.assert_called_once_with("bitcoin", days=7)
+    mock_get_price_series.assert_called_once_with("bitcoin", days=7)
     # Check if LLM was called with enriched prompt
-    assert "Latest recorded price (approx): $20,500.00 USD." in mock_llm_response.call_args[0][0]
+    assert "bitcoin|$20,500.00|+2.50%|" in mock_llm_response.call_args[0][0]
 
 @pytest.mark.asyncio
 async def test_get_historical_crypto_data_success(mocker):
     """Test fetching historical crypto data directly."""
-    mock_get_historical_prices = mocker.patch('ciyexa_backend.services.crypto_data_service.CryptoDataService.get_historical_prices',
-                                              new_callable=AsyncMock, return_value=MOCK_HISTORICAL_DATA)
+    mock_get_price_series = mocker.patch('ciyexa_backend.services.crypto_data_service.CryptoDataService.get_price_series',
+                                              new_callable=AsyncMock, return_value=MOCK_PRICE_SERIES)
     
     response = client.get("/api/v1/crypto/historical/bitcoin?days=7")
     assert response.status_code == 200
     assert response.json() == MOCK_HISTORICAL_DATA.model_dump(mode='json')
-    mock_get_historical_prices.assert_called_once_with("bitcoin", 7)
+    mock_get_price_series.assert_called_once_with("bitcoin", 7)
 
 @pytest.mark.asyncio
 async def test_get_historical_crypto_data_not_found():
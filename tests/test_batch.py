@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+from ciyexa_backend.main import app
+from ciyexa_backend.api.v1.dependencies import get_crypto_service
+from ciyexa_backend.benchmarks.fake_servers import FakeCoinGecko, run_server
+from ciyexa_backend.services.crypto_data_service import CryptoDataService
+from ciyexa_backend.services.governor import UpstreamGovernor
+
+
+@pytest.mark.asyncio
+async def test_batch_uses_two_bulk_calls_for_many_coins_and_currencies():
+    """Test that 20 coins in 3 currencies take one /coins/markets and one /simple/price call."""
+    fake = FakeCoinGecko()
+    crypto_ids = [f"coin-{i}" for i in range(20)]
+    with run_server(fake.app) as base_url:
+        service = CryptoDataService(governor=UpstreamGovernor(rate_per_minute=6000))
+        service.base_url = base_url
+        data, errors = await service.get_market_data_batch(crypto_ids, ["usd", "eur", "btc"])
+
+    assert errors == {}
+    assert list(data) == crypto_ids
+    price = FakeCoinGecko._price("coin-3")
+    assert data["coin-3"].market_data.current_price == {"usd": price, "eur": price, "btc": price}
+    assert data["coin-3"].market_data.market_cap["eur"] == price * 1e6
+    assert fake.requests == {"/coins/markets": 1, "/simple/price": 1}
+
+
+def test_batch_endpoint_reports_errors_per_id(mocker):
+    """Test GET and POST /crypto/batch: resolved coins in data, unknown and unavailable ones in errors, both keyed as requested."""
+    service = CryptoDataService()
+    mocker.patch.dict(app.dependency_overrides, {get_crypto_service: lambda: service})
+    row = {"id": "bitcoin", "symbol": "btc", "name": "Bitcoin", "current_price": 50000.0, "market_cap": 1e12, "total_volume": 1e10}
+    mocker.patch.object(service, "fetch_markets", return_value=[row])
+    client = TestClient(app)
+
+    response = client.get("/api/v1/crypto/batch", params={"ids": "btc,eth,not-a-coin,bitcoin"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["vs_currencies"] == ["usd"]
+    assert list(body["data"]) == ["btc", "bitcoin"] # Keyed as requested, like errors
+    assert body["data"]["btc"]["id"] == "bitcoin"
+    assert body["data"]["bitcoin"]["market_data"]["current_price"] == {"usd": 50000.0}
+    assert set(body["errors"]) == {"eth", "not-a-coin"}
+
+    response = client.post("/api/v1/crypto/batch", json={"ids": ["bitcoin"], "vs_currencies": ["usd", "not a currency"]})
+    assert response.status_code == 422
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from ciyexa_backend.services.batcher import MicroBatcher
+from ciyexa_backend.services.crypto_data_service import CryptoDataService
+
+
+def markets_row(crypto_id, price):
+    return {
+        "id": crypto_id, "symbol": crypto_id[:3], "name": crypto_id.title(),
+        "current_price": price, "market_cap": price * 1000, "total_volume": price * 10,
+        "price_change_percentage_24h": 1.5,
+    }
+
+
+@pytest.mark.asyncio
+async def test_lookups_within_window_are_dispatched_together():
+    """Test that keys submitted within the window go out in one dispatch and results are split back."""
+    dispatched = []
+
+    async def dispatch(keys):
+        dispatched.append(sorted(keys))
+        return {key: key.upper() for key in keys if key != "missing"}
+
+    batcher = MicroBatcher(dispatch, window=0.01, max_batch_size=100)
+    results = await asyncio.gather(*(batcher.submit(k) for k in ["btc", "eth", "btc", "missing"]))
+
+    assert results == ["BTC", "ETH", "BTC", None]
+    assert dispatched == [["btc", "eth", "missing"]]
+    assert batcher.stats()["batches"] == 1
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_dispatched_without_waiting_for_the_window():
+    """Test that reaching max_batch_size flushes immediately, and errors reach every caller."""
+    async def dispatch(keys):
+        raise RuntimeError("bulk call failed")
+
+    batcher = MicroBatcher(dispatch, window=60, max_batch_size=2)
+    results = await asyncio.wait_for(
+        asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True), timeout=1
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_market_data_lookups_share_one_markets_call(mocker):
+    """Test that concurrent single-coin lookups hit /coins/markets once with all ids."""
+    service = CryptoDataService()
+    make_request = mocker.patch.object(
+        service, "_make_request", new_callable=mocker.AsyncMock,
+        return_value=[markets_row("bitcoin", 70000.0), markets_row("ethereum", 3500.0)],
+    )
+
+    bitcoin, ethereum, unknown = await asyncio.gather(
+        service.get_market_data("bitcoin"), service.get_market_data("ethereum"), service.get_market_data("unknown-coin")
+    )
+
+    make_request.assert_called_once()
+    assert "ids=bitcoin,ethereum,unknown-coin" in make_request.call_args[0][0]
+    assert bitcoin.market_data.current_price == {"usd": 70000.0}
+    assert ethereum.name == "Ethereum"
+    assert unknown is None
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from ciyexa_backend.services.cache import CacheEntry, MemoryCacheBackend, TTLCache
+
+
+@pytest.mark.asyncio
+async def test_fresh_entries_are_served_from_cache():
+    """Test that a second lookup within the TTL does not call the loader."""
+    cache = TTLCache(MemoryCacheBackend(max_bytes=10_000))
+    loader = AsyncMock(return_value={"bitcoin": {"usd": 70000.0}})
+
+    assert await cache.get_or_load("price:bitcoin", loader, ttl=60) == {"bitcoin": {"usd": 70000.0}}
+    assert await cache.get_or_load("price:bitcoin", loader, ttl=60) == {"bitcoin": {"usd": 70000.0}}
+    loader.assert_awaited_once()
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_entries_are_served_while_one_refresh_runs():
+    """Test stale-while-revalidate: stale data is returned and only one refresh is scheduled."""
+    backend = MemoryCacheBackend(max_bytes=10_000)
+    cache = TTLCache(backend)
+    await backend.set("price:bitcoin", CacheEntry(value="old", size=5, stored_at=0, ttl=1, stale_ttl=1e12))
+    refreshed = asyncio.Event()
+
+    async def loader():
+        refreshed.set()
+        return "new"
+
+    assert await cache.get_or_load("price:bitcoin", loader, ttl=60, stale_ttl=60) == "old"
+    assert await cache.get_or_load("price:bitcoin", loader, ttl=60, stale_ttl=60) == "old"
+    await asyncio.wait_for(refreshed.wait(), timeout=1)
+    await asyncio.sleep(0)
+
+    assert cache.refreshes == 1
+    assert await cache.get_or_load("price:bitcoin", loader, ttl=60) == "new"
+
+
+@pytest.mark.asyncio
+async def test_failed_loads_are_not_cached():
+    """Test that a None result (upstream failure) is retried on the next call."""
+    cache = TTLCache(MemoryCacheBackend(max_bytes=10_000))
+    loader = AsyncMock(side_effect=[None, {"ok": True}])
+
+    assert await cache.get_or_load("markets", loader, ttl=60) is None
+    assert await cache.get_or_load("markets", loader, ttl=60) == {"ok": True}
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_evicts_least_recently_used_by_bytes():
+    """Test that the byte cap evicts the least recently used entries first."""
+    backend = MemoryCacheBackend(max_bytes=25)
+    for key in ("a", "b"):
+        await backend.set(key, CacheEntry(value=key, size=10, stored_at=1e12, ttl=60, stale_ttl=0))
+    await backend.get("a")
+    await backend.set("c", CacheEntry(value="c", size=10, stored_at=1e12, ttl=60, stale_ttl=0))
+
+    assert await backend.get("b") is None
+    assert await backend.get("a") is not None
+    assert backend.stats() == {"entries": 2, "bytes": 20, "evictions": 1}
@@ -0,0 +1,117 @@
+import pytest
+from unittest.mock import AsyncMock
+from fastapi.testclient import TestClient
+from ciyexa_backend.main import app
+from ciyexa_backend.services.coin_index import CoinIndex, CoinIndexRefresher, load_coin_index, save_coin_index
+from ciyexa_backend.services.intent import Intent
+
+COINS_LIST = [
+    {"id": "bitcoin-cash", "symbol": "bch", "name": "Bitcoin Cash"},
+    {"id": "wrapped-bitcoin", "symbol": "wbtc", "name": "Wrapped Bitcoin"},
+    {"id": "batcat", "symbol": "btc", "name": "BatCat"}, # Collides with Bitcoin's ticker
+    {"id": "pepe", "symbol": "pepe", "name": "Pepe"},
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return CoinIndex.from_coins_list(COINS_LIST)
+
+
+def test_exact_lookup_by_id_symbol_and_name(index):
+    """Test O(1) resolution of ids, tickers and names, with supported coins winning ticker collisions."""
+    assert index.lookup("bitcoin") == "bitcoin"
+    assert index.lookup("BTC") == "bitcoin"
+    assert index.lookup("XRP") == "ripple"
+    assert index.lookup("Bitcoin Cash") == "bitcoin-cash"
+    assert index.lookup("unknown-coin") is None
+
+
+def test_prefix_and_fuzzy_lookup(index):
+    """Test prefix completion and typo-tolerant resolution."""
+    assert {entry.id for entry in index.prefix("bitcoin")} == {"bitcoin", "bitcoin-cash"}
+    assert index.fuzzy("etherum") == [("ethereum", 1)]
+    assert index.resolve("solanna") == "solana"
+    assert index.resolve("zzzzzz") is None
+
+
+def test_chat_detection_uses_whole_words(index):
+    """Test that entity detection covers the full list without substring false positives."""
+    classifier = index.build_intent_classifier()
+    assert classifier.classify("price of bitcoin cash").crypto_ids == ("bitcoin-cash",)
+    assert classifier.classify("is pepe pumping").crypto_ids == ("pepe",)
+    assert classifier.classify("the price is near its high").crypto_ids == ()
+
+
+def test_common_word_coins_are_not_chat_mentions():
+    """Test that coins whose id or name is an ordinary word are not detected in chat, unlike distinctive ones."""
+    index = CoinIndex.from_coins_list(COINS_LIST + [
+        {"id": "tell", "symbol": "tell", "name": "Tell"},
+        {"id": "what", "symbol": "what", "name": "What"},
+        {"id": "just", "symbol": "jst", "name": "JUST"},
+        {"id": "curious", "symbol": "cur", "name": "Curious"},
+        {"id": "doing", "symbol": "doing", "name": "Doing"},
+    ])
+    classifier = index.build_intent_classifier()
+    assert classifier.classify("tell me the bitcoin price today").crypto_ids == ("bitcoin",)
+    assert classifier.classify("just curious about bitcoin").crypto_ids == ("bitcoin",)
+    assert classifier.classify("what is bitcoin doing").crypto_ids == ("bitcoin",)
+    assert classifier.classify("wrapped bitcoin vs pepe").crypto_ids == ("wrapped-bitcoin", "pepe")
+    assert index.lookup("just") == "just" # Still resolvable by id
+
+
+def test_other_coins_need_a_signal_to_be_chat_mentions():
+    """Test that single-word coins outside the supported list only match as a ticker or next to a coin word."""
+    index = CoinIndex.from_coins_list(COINS_LIST + [
+        {"id": "hello", "symbol": "hello", "name": "Hello"},
+        {"id": "bonk", "symbol": "bonk", "name": "Bonk"},
+        {"id": "dogwifcoin", "symbol": "wif", "name": "dogwifhat"},
+    ])
+    classifier = index.build_intent_classifier()
+    assert classifier.classify("hello bitcoin").crypto_ids == ("bitcoin",)
+    assert classifier.classify("hello bitcoin").intent is not Intent.COMPARISON
+    assert classifier.classify("Hello, what is bonk?").crypto_ids == ()
+    assert classifier.classify("what is the bonk price").crypto_ids == ("bonk",)
+    assert classifier.classify("price of dogwifhat").crypto_ids == ("dogwifcoin",)
+    assert classifier.classify("is BONK up?").crypto_ids == ("bonk",)
+    assert classifier.classify("thoughts on $WIF and bitcoin").crypto_ids == ("dogwifcoin", "bitcoin")
+    assert classifier.classify("THOUGHTS ON WIF").crypto_ids == () # All caps is no signal
+    assert classifier.classify("bitcoin cash or ethereum").crypto_ids == ("bitcoin-cash", "ethereum")
+
+
+def test_snapshot_round_trip(index, tmp_path):
+    """Test that the compact on-disk snapshot reloads into an equivalent index."""
+    path = tmp_path / "coins_list.json.gz"
+    save_coin_index(index, path)
+    reloaded = load_coin_index(path)
+    assert len(reloaded) == len(index)
+    assert reloaded.lookup("wbtc") == "wrapped-bitcoin"
+    assert len(load_coin_index(tmp_path / "missing.json.gz")) == len(CoinIndex.seed())
+
+
+@pytest.mark.asyncio
+async def test_refresh_installs_index_when_it_cannot_be_persisted(tmp_path):
+    """Test that a refreshed index is handed over even if the data directory is not writable."""
+    (tmp_path / "read-only").write_text("") # A file where the directory should be
+    updates = []
+    refresher = CoinIndexRefresher(
+        AsyncMock(return_value=COINS_LIST), lambda index, classifier: updates.append(index),
+        path=tmp_path / "read-only" / "coins_list.json.gz",
+    )
+    index = await refresher.refresh_once()
+    assert updates == [index] and "pepe" in index
+
+
+def test_crypto_endpoints_resolve_through_the_index(mocker):
+    """Test that /crypto/* accepts tickers and suggests close matches for unknown ids."""
+    client = TestClient(app)
+    get_market_data = mocker.patch(
+        'ciyexa_backend.services.crypto_data_service.CryptoDataService.get_market_data',
+        new_callable=AsyncMock, return_value=None,
+    )
+    client.get("/api/v1/crypto/BTC")
+    get_market_data.assert_called_once_with("bitcoin")
+
+    response = client.get("/api/v1/crypto/etherium")
+    assert response.status_code == 404
+    assert "Did you mean: ethereum?" in response.json()["detail"]
@@ -0,0 +1,105 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from fastapi.testclient import TestClient
+from ciyexa_backend.main import app
+from ciyexa_backend.api.v1.schemas.crypto import CryptoData, MarketData
+from ciyexa_backend.services.coin_index import CoinIndex
+from ciyexa_backend.services.enrichment import DataEnricher
+from ciyexa_backend.services.timeseries import PriceSeries
+
+PRICES = {"bitcoin": 70000.0, "ethereum": 3500.0, "solana": 150.0}
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return CoinIndex.seed().build_intent_classifier()
+
+
+def market_data(crypto_id):
+    return CryptoData(
+        id=crypto_id, symbol=crypto_id[:3], name=crypto_id.title(),
+        market_data=MarketData(current_price={"usd": PRICES[crypto_id]}, market_cap={}, total_volume={}, price_change_percentage_24h=1.0),
+    )
+
+
+def slow_crypto_service(delays):
+    """Crypto service whose fetches take `delays[crypto_id]` seconds and record peak concurrency."""
+    service = MagicMock()
+    service.in_flight = service.peak = 0
+    service.completed = []
+
+    async def fetch(crypto_id, days=None):
+        service.in_flight += 1
+        service.peak = max(service.peak, service.in_flight)
+        try:
+            await asyncio.sleep(delays[crypto_id])
+            service.completed.append(crypto_id)
+        finally:
+            service.in_flight -= 1
+        if days is None:
+            return market_data(crypto_id)
+        return PriceSeries.from_market_chart({"prices": [[0, PRICES[crypto_id]]]})
+
+    service.get_market_data = AsyncMock(side_effect=fetch)
+    service.get_price_series = AsyncMock(side_effect=fetch)
+    return service
+
+
+@pytest.mark.asyncio
+async def test_fetches_run_concurrently(classifier):
+    """Test that enrichment latency is bounded by the slowest fetch rather than the sum."""
+    service = slow_crypto_service({"bitcoin": 0.2, "ethereum": 0.2, "solana": 0.2})
+    enricher = DataEnricher(service, deadline=2)
+    started = time.monotonic()
+    result = await enricher.enrich(classifier.classify("compare bitcoin, ethereum and solana over the last month"), 7)
+    assert time.monotonic() - started < 0.35
+    assert list(result.historical) == ["bitcoin", "ethereum", "solana"]
+    assert result.days == 30
+    service.get_price_series.assert_any_await("solana", days=30)
+
+
+@pytest.mark.asyncio
+async def test_deadline_returns_partial_results(classifier):
+    """Test that fetches still running at the deadline are left out as missing, but still finish and so fill the cache."""
+    service = slow_crypto_service({"bitcoin": 0.01, "ethereum": 0.5})
+    enricher = DataEnricher(service, deadline=0.2)
+    started = time.monotonic()
+    result = await enricher.enrich(classifier.classify("price of bitcoin and ethereum"), 7)
+    assert time.monotonic() - started < 0.4
+    assert list(result.current) == ["bitcoin"]
+    assert result.missing == [("current", "ethereum")]
+    assert service.in_flight == 1
+
+    await asyncio.sleep(0.5)
+    assert service.completed == ["bitcoin", "ethereum"]
+    assert service.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped_across_requests(classifier):
+    """Test that the shared semaphore limits fetches in flight across concurrent requests."""
+    service = slow_crypto_service({"bitcoin": 0.05, "ethereum": 0.05, "solana": 0.05})
+    enricher = DataEnricher(service, deadline=2, max_concurrency=2)
+    query_intent = classifier.classify("bitcoin vs ethereum vs solana")
+    results = await asyncio.gather(*(enricher.enrich(query_intent, 7) for _ in range(3)))
+    assert service.peak == 2
+    assert all(len(result.current) == 3 for result in results)
+
+
+def test_chat_comparison_prompt_includes_every_coin(mocker):
+    """Test that /agent/chat puts data for all compared coins into the LLM prompt."""
+    mocker.patch(
+        'ciyexa_backend.services.crypto_data_service.CryptoDataService.get_market_data',
+        new_callable=AsyncMock, side_effect=market_data,
+    )
+    get_llm_response = mocker.patch(
+        'ciyexa_backend.services.llm_agent.LLMAgentService.get_llm_response',
+        new_callable=AsyncMock, return_value="Comparison.",
+    )
+    response = TestClient(app).post("/api/v1/agent/chat", json={"query": "Compare BTC, ETH and SOL"})
+    assert response.json()["source"] == "Hybrid (LLM + Current Crypto Data)"
+    prompt = get_llm_response.call_args[0][0]
+    for price in ("$70,000.00", "$3,500.00", "$150.00"):
+        assert price in prompt
@@ -0,0 +1,92 @@
+import asyncio
+import time
+import pytest
+from ciyexa_backend.benchmarks.fake_servers import FakeCoinGecko, run_server
+from ciyexa_backend.services.crypto_data_service import CryptoDataService, crypto_data_from_markets_item
+from ciyexa_backend.services.governor import CircuitBreaker, Priority, TokenBucket, UpstreamGovernor
+
+
+def governed_service(base_url, **governor_options):
+    options = {"rate_per_minute": 6000, "burst": 10, "backoff_base": 0.01, **governor_options}
+    service = CryptoDataService(governor=UpstreamGovernor(**options))
+    service.base_url = base_url
+    return service
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_serves_interactive_lane_first():
+    """Test that waiting user-facing calls get tokens before background ones that queued earlier."""
+    bucket = TokenBucket(rate=20.0, capacity=1.0)
+    await bucket.acquire()
+    order = []
+
+    async def acquire(priority):
+        await bucket.acquire(priority)
+        order.append(priority)
+
+    background = asyncio.create_task(acquire(Priority.BACKGROUND))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(acquire(Priority.INTERACTIVE))
+    await asyncio.gather(background, interactive)
+    assert order == [Priority.INTERACTIVE, Priority.BACKGROUND]
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_honoured_on_429():
+    """Test that a 429 is retried after its Retry-After delay instead of surfacing as an error."""
+    fake = FakeCoinGecko()
+    fake.fail_next(429, retry_after="0.3")
+    with run_server(fake.app) as base_url:
+        service = governed_service(base_url)
+        started = time.monotonic()
+        prices = await service.get_current_prices(["bitcoin"])
+        elapsed = time.monotonic() - started
+
+    assert prices == {"bitcoin": {"usd": FakeCoinGecko._price("bitcoin")}}
+    assert fake.total_requests == 2
+    assert elapsed >= 0.3
+    assert service.governor.throttled == 1
+
+
+@pytest.mark.asyncio
+async def test_429_pause_longer_than_the_queue_wait_fails_fast():
+    """Test that a Retry-After beyond the queue wait returns the 429, and queued calls fail without waiting it out."""
+    fake = FakeCoinGecko()
+    fake.fail_next(429, retry_after="5")
+    with run_server(fake.app) as base_url:
+        service = governed_service(base_url, max_queue_wait=1.0)
+        started = time.monotonic()
+        assert await service.get_current_prices(["bitcoin"]) is None
+        assert await service.get_current_prices(["ethereum"]) is None
+        elapsed = time.monotonic() - started
+
+    assert fake.total_requests == 1
+    assert elapsed < 1.0
+    assert service.governor.breaker.consecutive_failures == 1
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_stops_upstream_calls_and_serves_snapshot(mocker):
+    """
+    Test that repeated failed calls open the breaker, counting a call once however often it was retried,
+    after which the last snapshot is served without calling upstream.
+    """
+    mocker.patch("ciyexa_backend.core.config.settings.SNAPSHOT_MAX_AGE", 0.0)
+    fake = FakeCoinGecko()
+    fake.fail_next(503, times=100)
+    with run_server(fake.app) as base_url:
+        service = governed_service(base_url, max_retries=1, failure_threshold=2, recovery_timeout=60)
+        row = {"id": "bitcoin", "symbol": "btc", "name": "Bitcoin", "current_price": 50000.0, "fetched_at": time.time() - 120}
+        service.snapshots.publish({"bitcoin": crypto_data_from_markets_item(row, "usd")}, [], "usd")
+
+        data = await service.get_market_data("bitcoin")
+        assert data.market_data.current_price == {"usd": 50000.0}
+        assert service.governor.breaker.state == CircuitBreaker.CLOSED # One call, two attempts
+        assert await service.get_current_prices(["ethereum"]) is None
+        assert service.governor.breaker.state == CircuitBreaker.OPEN
+        failed_requests = fake.total_requests
+
+        assert await service.get_market_data("bitcoin") is not None
+        assert await service.get_current_prices(["cardano"]) is None
+    assert fake.total_requests == failed_requests == 4
+    assert service.governor.breaker.rejected == 1
@@ -0,0 +1,87 @@
+import time
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock
+from ciyexa_backend.services.crypto_data_service import CryptoDataService
+from ciyexa_backend.services.history_store import ROW_DTYPE, HistoryStore
+
+HOUR_MS = 3600 * 1000
+
+
+def rows(timestamps, price=1.0):
+    result = np.zeros(len(timestamps), dtype=ROW_DTYPE)
+    result["timestamp"] = timestamps
+    result["price"] = price
+    return result
+
+
+def market_chart(start_ms, end_ms, step_ms):
+    points = [[t, 100.0 + t / HOUR_MS] for t in range(start_ms, end_ms + 1, step_ms)]
+    return {"prices": points, "market_caps": [[t, 1e9] for t, _ in points], "total_volumes": [[t, 1e7] for t, _ in points]}
+
+
+def test_append_backfill_and_concurrent_readers(tmp_path):
+    """Test appends, backfill rewrites and that views mapped before a rewrite stay valid."""
+    store = HistoryStore(tmp_path)
+    assert store.write("btc", rows([0, HOUR_MS, 2 * HOUR_MS]), HOUR_MS) == 3
+    before = store.read("btc")
+
+    # The tail fetch overlaps the last stored hour; only later buckets are appended
+    assert store.write("btc", rows([2 * HOUR_MS + 60_000, 3 * HOUR_MS, 4 * HOUR_MS]), HOUR_MS) == 2
+    assert store.read("btc").rows["timestamp"].tolist() == [i * HOUR_MS for i in range(5)]
+    assert store.read("btc", since_ms=3 * HOUR_MS).rows["timestamp"].tolist() == [3 * HOUR_MS, 4 * HOUR_MS]
+
+    # A fetch starting before the tail replaces stored data from its first bucket on
+    store.write("btc", rows([HOUR_MS, 2 * HOUR_MS], price=2.0), HOUR_MS)
+    assert store.read("btc").rows["price"].tolist() == [1.0, 2.0, 2.0]
+    assert before.rows["timestamp"].tolist() == [0, HOUR_MS, 2 * HOUR_MS]
+
+    assert store.trim("btc", keep_since_ms=HOUR_MS) == 1
+    assert store.read("btc").first_timestamp == HOUR_MS
+
+
+def test_disk_budget_evicts_least_recently_written(tmp_path):
+    """Test that the store deletes the oldest series once it exceeds its byte budget."""
+    store = HistoryStore(tmp_path, max_bytes=2000)
+    store.write("old", rows(range(0, 40 * HOUR_MS, HOUR_MS)), HOUR_MS)
+    time.sleep(0.01)
+    store.write("new", rows(range(0, 40 * HOUR_MS, HOUR_MS)), HOUR_MS)
+    assert store.read("old") is None
+    assert store.read("new") is not None
+    assert store.disk_usage() <= 2000
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["new.bin", "new.lock"] # Lock files go with their series
+
+
+@pytest.mark.asyncio
+async def test_service_fetches_only_the_missing_tail(tmp_path, mocker):
+    """Test full fetch on a cold store, tail-only sync when stale and no upstream calls on a warm restart."""
+    mocker.patch.dict("ciyexa_backend.core.config.settings.CACHE_TTLS", {"market_chart_hourly": 600.0})
+    now_ms = int(time.time() * 1000)
+    requested_urls = []
+
+    async def make_request(url):
+        requested_urls.append(url)
+        if "/range" in url:
+            return market_chart(now_ms - HOUR_MS, now_ms, 5 * 60 * 1000)
+        return market_chart(now_ms - 7 * 24 * HOUR_MS - 2 * HOUR_MS, now_ms - 2 * HOUR_MS, HOUR_MS)
+
+    service = CryptoDataService(history_store=HistoryStore(tmp_path))
+    mocker.patch.object(service, "_make_request", side_effect=make_request)
+    series = await service.get_price_series("bitcoin", days=7)
+    assert series.timestamps[0] >= now_ms - 7 * 24 * HOUR_MS
+    assert series.timestamps[-1] == now_ms - 2 * HOUR_MS
+    assert "market_chart?vs_currency=usd&days=7" in requested_urls[0]
+
+    await service.get_price_series("bitcoin", days=7)
+    assert len(requested_urls) == 1 # Synced less than a cache TTL ago
+
+    mocker.patch.dict("ciyexa_backend.core.config.settings.CACHE_TTLS", {"market_chart_hourly": 0.0})
+    series = await service.get_price_series("bitcoin", days=7)
+    assert f"/range?vs_currency=usd&from={(now_ms - 2 * HOUR_MS) // 1000}" in requested_urls[1]
+    assert series.timestamps[-1] == now_ms # The latest fetched price is served even within a stored bucket
+
+    mocker.patch.dict("ciyexa_backend.core.config.settings.CACHE_TTLS", {"market_chart_hourly": 600.0})
+    restarted = CryptoDataService(history_store=HistoryStore(tmp_path))
+    upstream = mocker.patch.object(restarted, "_make_request", new_callable=AsyncMock)
+    assert (await restarted.get_price_series("bitcoin", days=7)).timestamps[-1] >= now_ms - HOUR_MS
+    upstream.assert_not_awaited()
@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from ciyexa_backend.main import app
+from ciyexa_backend.api.v1.dependencies import get_crypto_service, get_data_enricher, get_llm_service
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.core.http_client import HTTPClientManager
+
+
+def test_lifespan_injects_shared_client(mocker):
+    """Test that the lifespan hook starts one pooled client and shares it between the injected services."""
+    mocker.patch.object(settings, "MARKET_POLLER_ENABLED", False)
+    mocker.patch.object(settings, "COIN_INDEX_REFRESH_ENABLED", False)
+    with TestClient(app):
+        http_client = app.state.http_client
+        assert http_client.is_started
+        assert get_llm_service().http_client is http_client
+        assert get_crypto_service().http_client is http_client
+        assert get_data_enricher().crypto_service is get_crypto_service()
+    assert not http_client.is_started
+
+
+@pytest.mark.asyncio
+async def test_close_drains_in_flight_requests():
+    """Test that close() waits for in-flight sessions before closing the pool."""
+    manager = HTTPClientManager()
+    await manager.start()
+    released = asyncio.Event()
+
+    async def in_flight_request():
+        async with manager.session():
+            await released.wait()
+
+    task = asyncio.create_task(in_flight_request())
+    await asyncio.sleep(0)
+    assert manager.in_flight == 1
+
+    close_task = asyncio.create_task(manager.close(grace_period=5))
+    await asyncio.sleep(0.01)
+    assert not close_task.done()
+
+    released.set()
+    await asyncio.wait_for(close_task, timeout=1)
+    await task
+    assert manager.in_flight == 0
+    assert not manager.is_started
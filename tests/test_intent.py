@@ -0,0 +1,37 @@
+import pytest
+from ciyexa_backend.services.coin_index import CoinIndex
+from ciyexa_backend.services.intent import Intent
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return CoinIndex.seed().build_intent_classifier()
+
+
+@pytest.mark.parametrize("query, intent, crypto_ids, days", [
+    ("What is the price of Bitcoin?", Intent.CURRENT, ("bitcoin",), None),
+    ("What was the price of Bitcoin 7 days ago?", Intent.HISTORICAL, ("bitcoin",), 7),
+    ("how much is near protocol worth", Intent.CURRENT, ("near-protocol",), None),
+    ("BTC vs ETH over the past two weeks", Intent.COMPARISON, ("bitcoin", "ethereum"), 14),
+    ("compare bitcoin, ethereum and solana over the last month", Intent.COMPARISON, ("bitcoin", "ethereum", "solana"), 30),
+    ("Explain what decentralized finance (DeFi) is.", Intent.NONE, (), None),
+])
+def test_classify(classifier, query, intent, crypto_ids, days):
+    """Test intent, entity and time range extraction for representative chat queries."""
+    result = classifier.classify(query)
+    assert result.intent == intent
+    assert result.crypto_ids == crypto_ids
+    assert result.days == days
+
+
+def test_matches_respect_word_boundaries(classifier):
+    """Test that aliases only match whole words, e.g. 'sol' inside 'solution' is not Solana."""
+    assert classifier.classify("is there a solution for gas fees").crypto_ids == ()
+    assert classifier.classify("what is the price of sol").crypto_ids == ("solana",)
+
+
+def test_top_n_count_is_parsed(classifier):
+    """Test top-N extraction with digits, number words and the default."""
+    assert classifier.classify("top 5 coins by market cap").top_n == 5
+    assert classifier.classify("show me the top ten").top_n == 10
+    assert classifier.classify("biggest coins").intent == Intent.TOP_N
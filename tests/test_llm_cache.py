@@ -0,0 +1,88 @@
+import asyncio
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock
+from ciyexa_backend.main import app
+from ciyexa_backend.api.v1.dependencies import get_crypto_service, get_llm_service
+from ciyexa_backend.api.v1.endpoints import agent
+from ciyexa_backend.api.v1.schemas.crypto import CryptoData, MarketData
+from ciyexa_backend.services.llm_agent import LLMServiceError
+from ciyexa_backend.services.llm_cache import LLMResponseCache
+from ciyexa_backend.services.prompt_builder import PromptContextBuilder
+
+client = TestClient(app)
+
+
+def bitcoin(price, currency="usd"):
+    return CryptoData(id="bitcoin", symbol="btc", name="Bitcoin", market_data=MarketData(
+        current_price={currency: price}, market_cap={currency: price * 2e7}, total_volume={currency: price * 4e5},
+    ))
+
+
+@pytest.mark.parametrize("currency", ["usd", "eur"])
+def test_equivalent_queries_hit_until_the_market_data_changes(mocker, currency):
+    """Test that rephrased-but-equal queries share an answer and a price refresh invalidates it, in any prompt currency."""
+    mocker.patch.object(agent, "llm_cache", LLMResponseCache())
+    mocker.patch.object(agent, "context_builder", PromptContextBuilder(vs_currency=currency))
+    get_market_data = mocker.patch.object(
+        get_crypto_service(), "get_market_data", new_callable=AsyncMock, return_value=bitcoin(70000.0, currency),
+    )
+    llm = mocker.patch.object(get_llm_service(), "get_llm_response", new_callable=AsyncMock, return_value="Bitcoin is at $70,000.")
+
+    for query in ("What is the price of Bitcoin?", "what is the price of   bitcoin"):
+        response = client.post("/api/v1/agent/chat", json={"query": query})
+        assert response.json()["response"] == "Bitcoin is at $70,000."
+    assert llm.await_count == 1
+
+    get_market_data.return_value = bitcoin(71000.0, currency)
+    llm.return_value = "Bitcoin is at $71,000."
+    response = client.post("/api/v1/agent/chat", json={"query": "What is the price of Bitcoin?"})
+    assert response.json()["response"] == "Bitcoin is at $71,000."
+    assert llm.await_count == 2
+    stats = agent.llm_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 2, 1)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_call_and_errors_are_not_cached():
+    """Test single-flight on misses, and that a failed generation is retried by the next caller."""
+    cache = LLMResponseCache()
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        if calls == 1:
+            raise LLMServiceError("LLM service returned an error")
+        return "answer"
+
+    results = await asyncio.gather(*(cache.get_or_generate("key", 1, generate) for _ in range(10)), return_exceptions=True)
+    assert calls == 1
+    assert all(isinstance(result, LLMServiceError) for result in results)
+
+    assert await cache.get_or_generate("key", 1, generate) == "answer"
+    assert await cache.get_or_generate("key", 1, generate) == "answer"
+    assert calls == 2
+    assert cache.stats()["saved_seconds"] >= 0.05
+
+
+def test_llm_errors_are_not_cached_by_the_endpoint(mocker):
+    """Test that a 5xx from the LLM API is answered with an error and the next identical query calls the LLM again."""
+    mocker.patch.object(agent, "llm_cache", LLMResponseCache())
+    # Keep these calls out of the process-wide metrics other tests read
+    mocker.patch("ciyexa_backend.services.llm_agent.UPSTREAM_RESPONSES")
+    mocker.patch("ciyexa_backend.services.llm_agent.UPSTREAM_DURATION")
+    request = httpx.Request("POST", "http://llm.test/api/chat")
+    post = mocker.patch.object(httpx.AsyncClient, "post", new_callable=AsyncMock, side_effect=[
+        httpx.Response(503, text="Error: upstream overloaded", request=request),
+        httpx.Response(200, json={"response": "AI is artificial intelligence."}, request=request),
+    ])
+
+    response = client.post("/api/v1/agent/chat", json={"query": "What is AI?"})
+    assert response.status_code == 500
+    response = client.post("/api/v1/agent/chat", json={"query": "What is AI?"})
+    assert response.status_code == 200
+    assert response.json()["response"] == "AI is artificial intelligence."
+    assert post.await_count == 2
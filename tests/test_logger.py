@@ -0,0 +1,46 @@
+import io
+import json
+import logging
+from fastapi.testclient import TestClient
+from ciyexa_backend.main import app
+from ciyexa_backend.utils.logger import build_queue_logging, request_id_var
+
+
+def test_queue_logging_writes_json_with_request_id_and_samples_info():
+    """Test that records reach the stream via the listener thread, with sampling applied to INFO only."""
+    stream = io.StringIO()
+    handler, listener = build_queue_logging(stream, "json", {"test.noisy": 0.0}, queue_size=100)
+    quiet, noisy = logging.getLogger("test.quiet"), logging.getLogger("test.noisy.child")
+    for logger in (quiet, noisy):
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    listener.start()
+    try:
+        token = request_id_var.set("req-1")
+        items = ["a"]
+        quiet.info("Fetched %s", items)
+        items.append("b") # Arguments are merged when the record is queued
+        request_id_var.reset(token)
+        noisy.info("Sampled out")
+        noisy.warning("Kept: %d", 3)
+    finally:
+        listener.stop()
+        for logger in (quiet, noisy):
+            logger.removeHandler(handler)
+            logger.propagate = True
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(e["logger"], e["message"], e["request_id"]) for e in entries] == [
+        ("test.quiet", "Fetched ['a']", "req-1"),
+        ("test.noisy.child", "Kept: 3", "-"),
+    ]
+    assert handler.filters[1].dropped == 1
+
+
+def test_request_id_header_is_echoed_or_generated():
+    """Test that a valid X-Request-ID is echoed back and an invalid one is replaced."""
+    client = TestClient(app)
+    assert client.get("/", headers={"X-Request-ID": "abc-123"}).headers["X-Request-ID"] == "abc-123"
+    generated = client.get("/", headers={"X-Request-ID": "bad id\n"}).headers["X-Request-ID"]
+    assert generated != "bad id\n" and len(generated) == 16
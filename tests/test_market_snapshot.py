@@ -0,0 +1,80 @@
+import pytest
+from ciyexa_backend.services.crypto_data_service import CryptoDataService
+from ciyexa_backend.services.market_poller import MarketDataPoller
+from ciyexa_backend.services.market_snapshot import SnapshotStore
+
+
+def markets_row(crypto_id, price, rank):
+    return {
+        "id": crypto_id, "symbol": crypto_id[:3], "name": crypto_id.title(), "image": "url",
+        "current_price": price, "market_cap": price * 1000, "market_cap_rank": rank,
+        "total_volume": price * 10, "price_change_percentage_24h": 1.5, "fetched_at": 1700000000.0,
+    }
+
+
+ROWS = [markets_row("bitcoin", 70000.0, 1), markets_row("ethereum", 3500.0, 2)]
+
+
+@pytest.fixture
+def service():
+    return CryptoDataService(snapshots=SnapshotStore())
+
+
+@pytest.mark.asyncio
+async def test_poller_publishes_snapshot_served_without_upstream_calls(service, mocker):
+    """Test that reads are served from the published snapshot once the poller has refreshed it."""
+    fetch_markets = mocker.patch.object(service, "fetch_markets", new_callable=mocker.AsyncMock, return_value=ROWS)
+    poller = MarketDataPoller(service, service.snapshots, crypto_ids=["bitcoin", "ethereum"], top_n=2)
+
+    snapshot = await poller.refresh_once()
+    assert snapshot.version == 1
+    assert fetch_markets.await_count == 2
+
+    make_request = mocker.patch.object(service, "_make_request", new_callable=mocker.AsyncMock)
+    bitcoin = await service.get_market_data("bitcoin")
+    top = await service.get_top_n_cryptos_by_market_cap(2)
+
+    make_request.assert_not_called()
+    assert bitcoin.market_data.current_price == {"usd": 70000.0}
+    assert bitcoin.as_of.timestamp() == 1700000000.0
+    assert [c.id for c in top] == ["bitcoin", "ethereum"]
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_previous_snapshot(service, mocker):
+    """Test that a refresh where both upstream calls fail leaves the old snapshot in place."""
+    mocker.patch.object(service, "fetch_markets", new_callable=mocker.AsyncMock, side_effect=[ROWS, ROWS, None, None])
+    poller = MarketDataPoller(service, service.snapshots, top_n=2)
+
+    first = await poller.refresh_once()
+    assert await poller.refresh_once() is None
+    assert service.snapshots.current is first
+
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_falls_back_to_live_fetch(service, mocker):
+    """Test that a snapshot older than SNAPSHOT_MAX_AGE is ignored."""
+    service.snapshots.publish({}, [], "usd", fetched_at=0)
+    live_rows = [{k: v for k, v in row.items() if k != "fetched_at"} for row in ROWS]
+    make_request = mocker.patch.object(service, "_make_request", new_callable=mocker.AsyncMock, return_value=live_rows)
+
+    top = await service.get_top_n_cryptos_by_market_cap(2)
+
+    make_request.assert_called_once()
+    assert [c.id for c in top] == ["bitcoin", "ethereum"]
+    assert top[0].as_of is not None
+
+
+def test_failing_listener_does_not_stop_the_others():
+    """Test that every listener gets the snapshot even when one before it raises."""
+    store = SnapshotStore()
+    received = []
+
+    def broken(snapshot):
+        raise ValueError("listener bug")
+
+    store.add_listener(broken)
+    store.add_listener(received.append)
+    snapshot = store.publish({}, [], "usd")
+    assert received == [snapshot]
+    assert store.current is snapshot
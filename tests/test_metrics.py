@@ -0,0 +1,52 @@
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock
+from ciyexa_backend.main import app
+from ciyexa_backend.api.v1.dependencies import get_llm_service
+from ciyexa_backend.api.v1.endpoints import agent
+from ciyexa_backend.core.metrics import MetricsRegistry, stats_collector
+from ciyexa_backend.services.llm_cache import LLMResponseCache
+
+
+def test_registry_renders_prometheus_text():
+    """Test counter, histogram and collector output in the text exposition format."""
+    registry = MetricsRegistry()
+    requests = registry.counter("app_requests", "Requests.", ("route",))
+    latency = registry.histogram("app_latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    requests.labels('/a"b').inc()
+    requests.labels('/a"b').inc(2)
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+    registry.add_collector("one", stats_collector("app_cache", "one", lambda: {"hits": 3, "misses": 1, "state": "ok"}, ("hits", "misses")))
+    registry.add_collector("two", stats_collector("app_cache", "two", lambda: {"hits": 0, "misses": 0}, ("hits", "misses")))
+
+    lines = registry.render().splitlines()
+    assert 'app_requests_total{route="/a\\"b"} 3' in lines
+    assert 'app_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'app_latency_seconds_bucket{le="1"} 2' in lines
+    assert 'app_latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "app_latency_seconds_count 3" in lines
+    assert 'app_cache_hit_ratio{component="one"} 0.75' in lines
+    assert lines.count("# TYPE app_cache_hits_total counter") == 1 # One family for both components
+    assert 'app_cache_hits_total{component="two"} 0' in lines
+    assert not any(line.startswith("app_cache_state") for line in lines)
+
+
+def test_metrics_endpoint_reports_routes_and_chat_stages(mocker):
+    """Test that /metrics labels requests by route template and records chat pipeline stages."""
+    mocker.patch.object(agent, "llm_cache", LLMResponseCache())
+    mocker.patch.object(get_llm_service(), "get_llm_response", new_callable=AsyncMock, return_value="Answer.")
+    client = TestClient(app)
+    assert client.post("/api/v1/agent/chat", json={"query": "What is a blockchain?"}).status_code == 200
+    client.get("/api/v1/crypto/historical/not-a-coin", params={"days": 0})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'ciyexa_http_requests_total{method="POST",route="/api/v1/agent/chat",status="200"}' in body
+    assert 'route="/api/v1/crypto/historical/{crypto_id}",status="422"' in body
+    assert "not-a-coin" not in body
+    for stage in ("intent", "llm"):
+        assert f'ciyexa_chat_stage_duration_seconds_count{{stage="{stage}"}}' in body
+    assert 'ciyexa_upstream_request_duration_seconds_count{upstream="llm",endpoint="chat",outcome="ok"}' not in body # LLM call was mocked
+    assert "ciyexa_http_requests_in_flight 0" in body
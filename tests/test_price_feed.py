@@ -0,0 +1,108 @@
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from ciyexa_backend.main import app
+from ciyexa_backend.api.v1.endpoints import crypto
+from ciyexa_backend.api.v1.schemas.crypto import CryptoData, MarketData
+from ciyexa_backend.services.market_snapshot import SnapshotStore
+from ciyexa_backend.services.price_feed import MAX_QUEUED_MESSAGES, PriceFeed
+
+
+def publish_prices(store: SnapshotStore, prices):
+    coins = {
+        crypto_id: CryptoData(id=crypto_id, symbol=crypto_id[:3], name=crypto_id.title(), market_data=MarketData(
+            current_price={"usd": price}, market_cap={"usd": price * 1e6}, total_volume={"usd": price * 1e4},
+        ))
+        for crypto_id, price in prices.items()
+    }
+    store.publish(coins, [], "usd")
+
+
+@pytest.mark.asyncio
+async def test_feed_sends_changes_and_disconnects_slow_consumers():
+    """Test fan-out of changed coins only, coalescing for a stuck client and its disconnection."""
+    feed = PriceFeed(send_timeout=0.2)
+    store = SnapshotStore()
+    store.add_listener(feed.publish)
+    fast_frames, closed = [], []
+
+    async def fast_send(text):
+        fast_frames.append(json.loads(text))
+
+    async def stuck_send(text):
+        await asyncio.Event().wait()
+
+    async def close():
+        closed.append(True)
+
+    fast = feed.connect(fast_send, close)
+    stuck = feed.connect(stuck_send, close)
+    feed.subscribe(fast, ["bitcoin", "ethereum"])
+    feed.subscribe(stuck, ["bitcoin"])
+    for bitcoin_price in (100.0, 101.0, 102.0):
+        publish_prices(store, {"bitcoin": bitcoin_price, "ethereum": 10.0})
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.3)
+
+    assert [sorted(frame["data"]) for frame in fast_frames] == [["bitcoin", "ethereum"], ["bitcoin"], ["bitcoin"]]
+    assert fast_frames[-1]["data"]["bitcoin"]["price"] == 102.0
+    assert feed.coalesced == 1 # The stuck client's second pending bitcoin update replaced the first
+    assert feed.slow_disconnects == 1 and closed == [True]
+    assert feed.stats()["connections"] == 1 and feed.stats()["subscriptions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_replies_and_updates_share_one_writer():
+    """Test that replies queued while a price frame is being sent wait for it, in order, and unread replies are capped."""
+    feed = PriceFeed(send_timeout=0.5)
+    store = SnapshotStore()
+    store.add_listener(feed.publish)
+    sent, in_send = [], []
+
+    async def slow_send(text):
+        in_send.append(True)
+        assert len(in_send) == 1 # Never two sends on one connection at once
+        await asyncio.sleep(0.02)
+        sent.append(json.loads(text)["type"])
+        in_send.pop()
+
+    async def close():
+        pass
+
+    subscriber = feed.connect(slow_send, close)
+    feed.subscribe(subscriber, ["bitcoin"])
+    publish_prices(store, {"bitcoin": 100.0})
+    await asyncio.sleep(0)
+    assert feed.send_message(subscriber, {"type": "subscribed"})
+    assert feed.send_message(subscriber, {"type": "error"})
+    await asyncio.sleep(0.1)
+    assert sent == ["prices", "subscribed", "error"]
+
+    stuck = feed.connect(lambda text: asyncio.Event().wait(), close)
+    assert all(feed.send_message(stuck, {"type": "error"}) for _ in range(MAX_QUEUED_MESSAGES))
+    assert not feed.send_message(stuck, {"type": "error"})
+    await asyncio.sleep(0.6)
+    assert feed.slow_disconnects == 1
+
+
+def test_ws_prices_subscribes_by_symbol_and_sends_latest_prices(mocker):
+    """Test /ws/prices: query string subscription, latest figures after the reply on subscribe, and protocol errors."""
+    feed = PriceFeed()
+    mocker.patch.object(crypto, "price_feed", feed)
+    store = SnapshotStore()
+    store.add_listener(feed.publish)
+    publish_prices(store, {"bitcoin": 100.0, "ethereum": 10.0})
+
+    with TestClient(app).websocket_connect("/api/v1/ws/prices?ids=btc,not-a-coin") as websocket:
+        assert websocket.receive_json() == {"type": "subscribed", "ids": ["bitcoin"], "unknown": ["not-a-coin"]}
+        frame = websocket.receive_json()
+        assert frame["type"] == "prices" and list(frame["data"]) == ["bitcoin"]
+        assert frame["data"]["bitcoin"]["price"] == 100.0
+
+        websocket.send_json({"action": "subscribe", "ids": ["ethereum"]})
+        assert websocket.receive_json()["ids"] == ["ethereum"] # One writer per client: the reply, then the prices
+        assert list(websocket.receive_json()["data"]) == ["ethereum"]
+
+        websocket.send_text("not json")
+        assert websocket.receive_json()["type"] == "error"
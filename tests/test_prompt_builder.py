@@ -0,0 +1,62 @@
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock
+from ciyexa_backend.main import app
+from ciyexa_backend.api.v1.dependencies import get_crypto_service, get_llm_service
+from ciyexa_backend.api.v1.endpoints import agent
+from ciyexa_backend.api.v1.schemas.crypto import CryptoData, MarketData, TopCrypto
+from ciyexa_backend.services.llm_cache import LLMResponseCache
+from ciyexa_backend.services.prompt_builder import PromptContextBuilder, count_tokens
+
+
+def top_cryptos(count):
+    return [
+        TopCrypto(
+            id=f"coin-{rank}", symbol=f"c{rank}", name=f"Coin {rank}", image="url", current_price=1000.0 / rank,
+            market_cap=1e12 / rank, market_cap_rank=rank, total_volume=1e9, price_change_percentage_24h=1.5,
+        )
+        for rank in range(1, count + 1)
+    ]
+
+
+def test_builder_keeps_prompt_within_token_budget():
+    """Test that rows past the budget are left out and counted, with each table header written once."""
+    bitcoin = CryptoData(id="bitcoin", symbol="btc", name="Bitcoin", market_data=MarketData(
+        current_price={"usd": 70000.0}, market_cap={"usd": 1.3e12}, total_volume={"usd": 3e10}, price_change_percentage_24h=2.5,
+    ))
+    builder = PromptContextBuilder(token_budget=300)
+    built = builder.build("How does bitcoin rank?", current=[bitcoin], top=top_cryptos(100))
+
+    assert built.tokens == count_tokens(built.prompt) <= 300
+    assert built.omitted > 0 and built.rows + built.omitted == 101
+    assert built.prompt.count("#|coin|price|24h|market cap") == 1
+    assert "Bitcoin (BTC)|$70,000.00|+2.50%|$1.30T" in built.prompt # Higher priority than the top-N rows
+    assert f"({built.omitted} more rows left out for length)" in built.prompt
+    assert builder.build("What is a blockchain?") is None
+
+
+def test_amounts_are_written_in_the_prompt_currency():
+    """Test that amounts carry the symbol of the builder's currency, or its code when it has no symbol here."""
+    prices = {"eur": 65000.0, "chf": 62000.0}
+    bitcoin = CryptoData(id="bitcoin", symbol="btc", name="Bitcoin", market_data=MarketData(
+        current_price=prices, market_cap={currency: price * 2e7 for currency, price in prices.items()}, total_volume={},
+        price_change_percentage_24h=2.5,
+    ))
+    assert "Bitcoin (BTC)|€65,000.00|+2.50%|€1.30T" in PromptContextBuilder(vs_currency="eur").build("btc?", current=[bitcoin]).prompt
+    assert "Bitcoin (BTC)|62,000.00 CHF|+2.50%|1.24T CHF" in PromptContextBuilder(vs_currency="chf").build("btc?", current=[bitcoin]).prompt
+
+
+def test_chat_top_n_query_is_enriched_with_ranking(mocker):
+    """Test that a ranking question without coin names gets the top-N list in the prompt."""
+    mocker.patch.object(agent, "llm_cache", LLMResponseCache())
+    get_top_n = mocker.patch.object(
+        get_crypto_service(), "get_top_n_cryptos_by_market_cap", new_callable=AsyncMock, return_value=top_cryptos(5)
+    )
+    get_llm_response = mocker.patch.object(get_llm_service(), "get_llm_response", new_callable=AsyncMock, return_value="Ranking.")
+    response = TestClient(app).post("/api/v1/agent/chat", json={"query": "What are the top 5 cryptocurrencies?"})
+
+    assert response.status_code == 200
+    assert response.json()["source"] == "Hybrid (LLM + Current Crypto Data)"
+    get_top_n.assert_awaited_once_with(5)
+    prompt = get_llm_response.call_args[0][0]
+    assert "Top 5 by market cap (USD):" in prompt
+    assert "5|Coin 5 (C5)|$200.00|+1.50%|$200.00B" in prompt
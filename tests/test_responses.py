@@ -0,0 +1,47 @@
+import numpy as np
+from datetime import datetime, timezone
+from fastapi.testclient import TestClient
+from ciyexa_backend.main import app
+from ciyexa_backend.api.v1.dependencies import get_crypto_service
+from ciyexa_backend.api.v1.endpoints import crypto
+from ciyexa_backend.api.v1.schemas.crypto import TopCrypto
+from ciyexa_backend.core.responses import encode_json
+from ciyexa_backend.services.market_snapshot import SnapshotStore
+
+TOP = [
+    TopCrypto(
+        id="bitcoin", symbol="btc", name="Bitcoin", image="url", current_price=70000.0, market_cap=1.3e12,
+        market_cap_rank=1, total_volume=3e10, as_of=datetime(2024, 5, 1, tzinfo=timezone.utc),
+    ),
+]
+
+
+def test_encode_json_handles_models_and_arrays():
+    """Test that the encoder accepts Pydantic models and NumPy arrays and matches Pydantic's JSON."""
+    assert encode_json({"series": np.array([[1.0, 2.5]])}) == b'{"series":[[1.0,2.5]]}'
+    assert encode_json(TOP[0]) == TOP[0].model_dump_json().encode()
+
+
+def test_snapshot_responses_are_encoded_once_and_revalidated_with_etags(mocker):
+    """Test ETag/If-None-Match on snapshot-backed responses and that a new snapshot changes the ETag."""
+    store = SnapshotStore()
+    mocker.patch.object(get_crypto_service(), "snapshots", store)
+    get_top = mocker.patch.object(get_crypto_service(), "get_top_n_cryptos_by_market_cap")
+    client = TestClient(app)
+
+    store.publish({}, TOP, "usd")
+    first = client.get("/api/v1/crypto/top/1")
+    assert first.status_code == 200
+    assert first.json()["data"][0]["id"] == "bitcoin"
+    etag = first.headers["etag"]
+    hits = crypto.encoded_responses.hits
+    not_modified = client.get("/api/v1/crypto/top/1", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert crypto.encoded_responses.hits == hits + 1
+    get_top.assert_not_called()
+
+    store.publish({}, [TOP[0].model_copy(update={"current_price": 71000.0})], "usd")
+    changed = client.get("/api/v1/crypto/top/1", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
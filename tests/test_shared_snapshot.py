@@ -0,0 +1,114 @@
+import pytest
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.services.coin_index import CoinIndexRefresher, CoinIndexWatcher
+from ciyexa_backend.services.crypto_data_service import CryptoDataService
+from ciyexa_backend.services.market_poller import MarketDataPoller
+from ciyexa_backend.services.market_snapshot import SnapshotStore
+from ciyexa_backend.services.shared_snapshot import (
+    SEQUENCE,
+    SEQUENCE_OFFSET,
+    SharedSnapshotFollower,
+    SharedSnapshotReader,
+    SharedSnapshotWriter,
+    UntrustedSnapshotFile,
+)
+
+ROWS = [
+    {"id": crypto_id, "symbol": crypto_id[:3], "name": crypto_id.title(), "image": "url", "current_price": price,
+     "market_cap": price * 1000, "market_cap_rank": rank, "total_volume": price * 10, "price_change_percentage_24h": 1.5}
+    for crypto_id, price, rank in (("bitcoin", 70000.0, 1), ("ethereum", 3500.0, 2))
+]
+
+
+@pytest.mark.asyncio
+async def test_workers_follow_snapshot_written_by_refresher(tmp_path, mocker):
+    """Test that snapshots polled by the refresher reach every worker's store without upstream calls."""
+    path = tmp_path / "snapshot"
+    writer = SharedSnapshotWriter(path, capacity=64 * 1024)
+    writer.open()
+    refresher_store = SnapshotStore()
+    refresher_store.add_listener(writer.publish)
+    refresher_service = CryptoDataService(snapshots=refresher_store)
+    mocker.patch.object(refresher_service, "fetch_markets", new_callable=mocker.AsyncMock, return_value=ROWS)
+    poller = MarketDataPoller(refresher_service, refresher_store, crypto_ids=["bitcoin", "ethereum"], top_n=2)
+    published = await poller.refresh_once()
+
+    workers = [SharedSnapshotFollower(SnapshotStore(), SharedSnapshotReader(path)) for _ in range(3)]
+    for follower in workers:
+        snapshot = follower.poll_once()
+        assert snapshot.fetched_at == published.fetched_at # Ages out like the refresher's own snapshot
+        assert snapshot.coins["bitcoin"] == published.coins["bitcoin"]
+        assert [c.id for c in snapshot.top] == ["bitcoin", "ethereum"]
+        assert follower.poll_once() is None # Unchanged sequence number, nothing decoded
+
+    worker_service = CryptoDataService(snapshots=workers[0].store)
+    make_request = mocker.patch.object(worker_service, "_make_request", new_callable=mocker.AsyncMock)
+    bitcoin = await worker_service.get_market_data("bitcoin")
+    make_request.assert_not_called()
+    assert bitcoin.market_data.current_price == {"usd": 70000.0}
+
+    with pytest.raises(RuntimeError):
+        SharedSnapshotWriter(path).open() # Only one refresher per region
+    writer.close()
+
+
+def test_reader_skips_snapshot_being_written(tmp_path):
+    """Test that a reader never returns a payload while the sequence number marks a write in progress."""
+    path = tmp_path / "snapshot"
+    writer = SharedSnapshotWriter(path, capacity=64 * 1024)
+    writer.open()
+    store = SnapshotStore()
+    writer.publish(store.publish({}, [], "usd", fetched_at=1700000000.0))
+    reader = SharedSnapshotReader(path)
+    assert reader.read_if_changed()["fetched_at"] == 1700000000.0
+
+    sequence = SEQUENCE.unpack_from(writer._map, SEQUENCE_OFFSET)[0]
+    SEQUENCE.pack_into(writer._map, SEQUENCE_OFFSET, sequence + 1) # Writer stopped mid-write
+    assert reader.read_if_changed() is None
+    assert reader.torn_reads > 0
+    writer.close()
+
+    # A restarted refresher drops the torn payload, and readers keep following the same file
+    writer = SharedSnapshotWriter(path, capacity=64 * 1024)
+    writer.open()
+    assert reader.read_if_changed() is None
+    writer.publish(store.publish({}, [], "usd", fetched_at=1700000015.0))
+    assert reader.read_if_changed()["fetched_at"] == 1700000015.0
+    writer.close()
+
+
+def test_region_other_users_could_write_is_refused(tmp_path):
+    """Test that the region is created private, and neither side uses one that other users can write."""
+    path = tmp_path / "shared" / "snapshot"
+    writer = SharedSnapshotWriter(path, capacity=64 * 1024)
+    writer.open()
+    writer.publish(SnapshotStore().publish({}, [], "usd", fetched_at=1700000000.0))
+    writer.close()
+    assert (path.parent.stat().st_mode & 0o777, path.stat().st_mode & 0o777) == (0o700, 0o600)
+
+    path.chmod(0o666) # As if planted by another user
+    assert SharedSnapshotReader(path).read_if_changed() is None
+    with pytest.raises(UntrustedSnapshotFile):
+        SharedSnapshotWriter(path).open()
+    path.chmod(0o600)
+    assert SharedSnapshotReader(path).read_if_changed()["fetched_at"] == 1700000000.0
+
+
+@pytest.mark.asyncio
+async def test_workers_reload_coin_index_written_by_refresher(tmp_path, monkeypatch, mocker):
+    """Test that a worker picks up the coin list the refresher rewrites, and ignores an unchanged file."""
+    monkeypatch.setattr(settings, "COIN_INDEX_PATH", str(tmp_path / "coins_list.json.gz"))
+    monkeypatch.setattr(settings, "COIN_INDEX_BUNDLE_PATH", str(tmp_path / "startup_bundle.pickle"))
+    refresher = CoinIndexRefresher(mocker.AsyncMock(return_value=ROWS), lambda index, classifier: None)
+    current = await refresher.refresh_once()
+    updates = []
+    watcher = CoinIndexWatcher(lambda index, classifier: updates.append((index, classifier)))
+    await watcher.start(current)
+    assert await watcher.refresh_once() is None
+
+    refresher.fetch_coins_list.return_value = ROWS + [{"id": "pepe", "symbol": "pepe", "name": "Pepe"}]
+    await refresher.refresh_once()
+    index = await watcher.refresh_once()
+    assert updates == [(index, updates[0][1])] and "pepe" in index
+    assert updates[0][1].classify("price of pepe").crypto_ids == ("pepe",)
+    await watcher.stop()
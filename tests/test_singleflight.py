@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from ciyexa_backend.services.crypto_data_service import CryptoDataService
+from ciyexa_backend.services.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """Test that concurrent callers with the same key await one shared call."""
+    single_flight = SingleFlight()
+    release = asyncio.Event()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"bitcoin": 70000.0}
+
+    waiters = [asyncio.create_task(single_flight.do("bitcoin", fetch)) for _ in range(50)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert calls == 1
+    assert all(result == {"bitcoin": 70000.0} for result in results)
+    assert single_flight.stats() == {"executions": 1, "coalesced": 49, "cancelled": 0, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_every_caller():
+    """Test that an exception from the shared call reaches all waiters and is not remembered."""
+    single_flight = SingleFlight()
+
+    async def failing_fetch():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*(single_flight.do("k", failing_fetch) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert await single_flight.do("k", AsyncMock(return_value="ok")) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_caller_keeps_the_call_alive_for_others():
+    """Test cancellation semantics: the shared call is only cancelled when its last caller leaves."""
+    single_flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        return "done"
+
+    first = asyncio.create_task(single_flight.do("k", fetch))
+    second = asyncio.create_task(single_flight.do("k", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await second == "done"
+    assert first.cancelled()
+
+    release.clear()
+    only = asyncio.create_task(single_flight.do("k", fetch))
+    await asyncio.sleep(0)
+    only.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await only
+    assert single_flight.cancelled == 1
+    assert single_flight.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_crypto_service_coalesces_identical_upstream_requests(mocker):
+    """Test that concurrent identical CoinGecko lookups result in a single upstream request."""
+    service = CryptoDataService()
+
+    async def slow_response(url):
+        await asyncio.sleep(0.01)
+        return {"bitcoin": {"usd": 70000.0}}
+
+    make_request = mocker.patch.object(service, "_make_request", side_effect=slow_response)
+    results = await asyncio.gather(*(service.get_current_prices(["bitcoin"]) for _ in range(20)))
+
+    assert make_request.call_count == 1
+    assert all(result == {"bitcoin": {"usd": 70000.0}} for result in results)
+    assert service.single_flight.coalesced == 19
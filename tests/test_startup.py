@@ -0,0 +1,68 @@
+import os
+import time
+from fastapi.testclient import TestClient
+from ciyexa_backend.main import app
+from ciyexa_backend.api.v1.dependencies import get_crypto_service
+from ciyexa_backend.api.v1.endpoints import agent
+from ciyexa_backend.core.config import settings
+from ciyexa_backend.services import coin_index
+from ciyexa_backend.services.coin_index import CoinIndex, load_coin_artifacts, load_startup_bundle, save_coin_index
+
+COINS = [{"id": "bitcoin", "symbol": "btc", "name": "Bitcoin"}, {"id": "pepe", "symbol": "pepe", "name": "Pepe"}]
+
+
+def test_startup_bundle_replaces_index_build(tmp_path, monkeypatch, mocker):
+    """
+    Test that the first start bundles the built artifacts, later starts load them, and stale bundles
+    or ones other users could have written are rebuilt.
+    """
+    snapshot_path, bundle_path = tmp_path / "coins_list.json.gz", tmp_path / "startup_bundle.pickle"
+    monkeypatch.setattr(settings, "COIN_INDEX_PATH", str(snapshot_path))
+    monkeypatch.setattr(settings, "COIN_INDEX_BUNDLE_PATH", str(bundle_path))
+    save_coin_index(CoinIndex.from_coins_list(COINS, fetched_at=1700000000.0), snapshot_path)
+
+    index, classifier = load_coin_artifacts()
+    assert bundle_path.exists()
+    from_coins_list = mocker.spy(CoinIndex, "from_coins_list")
+    index, classifier = load_coin_artifacts()
+    from_coins_list.assert_not_called()
+    assert index.fetched_at == 1700000000.0
+    assert classifier.classify("price of pepe").crypto_ids == ("pepe",)
+    assert index.resolve("bitconi") == "bitcoin" # The fuzzy index is rebuilt on demand
+    assert bundle_path.stat().st_mode & 0o777 == 0o600
+
+    bundle_path.chmod(0o664) # Another user could have replaced it
+    assert load_startup_bundle() is None
+    bundle_path.chmod(0o600)
+    tmp_path.chmod(0o777)
+    assert load_startup_bundle() is None
+    tmp_path.chmod(0o700)
+    assert load_startup_bundle() is not None
+
+    later = time.time() + 10
+    os.utime(snapshot_path, (later, later)) # A newer coin list snapshot
+    assert load_startup_bundle() is None
+    os.utime(snapshot_path, (0, 0))
+    monkeypatch.setattr(coin_index, "BUNDLE_FORMAT", coin_index.BUNDLE_FORMAT + 1)
+    assert load_startup_bundle() is None
+
+
+def test_ready_only_after_warm_up(tmp_path, monkeypatch):
+    """Test that /ready answers 503 until warm-up has installed the full coin index, then 200."""
+    snapshot_path = tmp_path / "coins_list.json.gz"
+    monkeypatch.setattr(settings, "COIN_INDEX_PATH", str(snapshot_path))
+    monkeypatch.setattr(settings, "COIN_INDEX_BUNDLE_PATH", str(tmp_path / "startup_bundle.pickle"))
+    monkeypatch.setattr(settings, "COIN_INDEX_REFRESH_ENABLED", False)
+    monkeypatch.setattr(settings, "MARKET_POLLER_ENABLED", False)
+    save_coin_index(CoinIndex.from_coins_list(COINS, fetched_at=1700000000.0), snapshot_path)
+    monkeypatch.setattr(get_crypto_service(), "coin_index", get_crypto_service().coin_index)
+    monkeypatch.setattr(agent, "intent_classifier", agent.intent_classifier)
+
+    assert TestClient(app).get("/ready").status_code == 503 # Lifespan not started
+    with TestClient(app) as client:
+        deadline = time.monotonic() + 5
+        while client.get("/ready").status_code != 200:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert "pepe" in get_crypto_service().coin_index
+        assert agent.intent_classifier.classify("price of pepe").crypto_ids == ("pepe",)
@@ -0,0 +1,82 @@
+import json
+import time
+import httpx
+import pytest
+from ciyexa_backend.main import app
+from ciyexa_backend.api.v1.dependencies import get_llm_service
+from ciyexa_backend.api.v1.endpoints import agent
+from ciyexa_backend.benchmarks.fake_servers import FakeLLM, run_server
+from ciyexa_backend.services.llm_agent import LLMAgentService
+from ciyexa_backend.services.llm_cache import LLMResponseCache
+
+CHUNKS = ["Bitcoin ", "is ", "a ", "decentralized ", "currency."]
+
+
+def read_events(response):
+    """Yields (event, data, seconds since the request started) from an SSE response."""
+    started = time.monotonic()
+    event = None
+    for line in response.iter_lines():
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            yield event, json.loads(line[len("data: "):]), time.monotonic() - started
+
+
+@pytest.mark.asyncio
+async def test_service_streams_chunks_before_completion():
+    """Test that the first chunk arrives long before the full completion has been generated."""
+    fake_llm = FakeLLM(CHUNKS, chunk_delay=0.1)
+    with run_server(fake_llm.app) as llm_url:
+        service = LLMAgentService()
+        service.llm_stream_url = f"{llm_url}/api/chat"
+        started = time.monotonic()
+        received = []
+        async for chunk in service.stream_llm_response("What is Bitcoin?"):
+            if not received:
+                ttfb = time.monotonic() - started
+            received.append(chunk)
+        total = time.monotonic() - started
+
+    assert "".join(received) == "".join(CHUNKS)
+    assert total >= 0.4
+    assert ttfb < total / 2
+
+
+def test_stream_endpoint_forwards_llm_chunks_as_sse(mocker):
+    """Test /agent/chat/stream end to end over real sockets against a local mock LLM server."""
+    fake_llm = FakeLLM(CHUNKS, chunk_delay=0.1)
+    with run_server(fake_llm.app) as llm_url, run_server(app) as app_url:
+        mocker.patch.object(get_llm_service(), "llm_stream_url", f"{llm_url}/api/chat")
+        mocker.patch.object(agent, "llm_cache", LLMResponseCache())
+        with httpx.Client(timeout=10) as client:
+            with client.stream("POST", f"{app_url}/api/v1/agent/chat/stream", json={"query": "What is AI?"}) as response:
+                assert response.headers["content-type"].startswith("text/event-stream")
+                events = list(read_events(response))
+
+    names = [name for name, _, _ in events]
+    assert names == ["meta"] + ["delta"] * len(CHUNKS) + ["done"]
+    assert events[0][1]["source"] == "LLM"
+    assert "".join(data["text"] for name, data, _ in events if name == "delta") == "".join(CHUNKS)
+    first_delta_at = events[1][2]
+    assert first_delta_at < events[-1][2] / 2
+
+
+def test_client_disconnect_cancels_upstream_request(mocker):
+    """Test that closing the SSE connection aborts the in-flight upstream LLM stream."""
+    fake_llm = FakeLLM(["token "] * 50, chunk_delay=0.1)
+    with run_server(fake_llm.app) as llm_url, run_server(app) as app_url:
+        mocker.patch.object(get_llm_service(), "llm_stream_url", f"{llm_url}/api/chat")
+        mocker.patch.object(agent, "llm_cache", LLMResponseCache())
+        with httpx.Client(timeout=10) as client:
+            with client.stream("POST", f"{app_url}/api/v1/agent/chat/stream", json={"query": "What is AI?"}) as response:
+                for name, _, _ in read_events(response):
+                    if name == "delta":
+                        break
+
+        deadline = time.monotonic() + 5
+        while fake_llm.streams_aborted == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    assert fake_llm.streams_aborted == 1
+    assert fake_llm.streams_completed == 0
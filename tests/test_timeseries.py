@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock
+from fastapi.testclient import TestClient
+from ciyexa_backend.main import app
+from ciyexa_backend.services.crypto_data_service import CryptoDataService
+from ciyexa_backend.services.timeseries import PriceSeries, drawdown, ema, lttb_indices, ohlc_buckets, sma
+
+HOUR_MS = 3600 * 1000
+
+
+def market_chart(prices):
+    timestamps = [i * HOUR_MS for i in range(len(prices))]
+    return {
+        "prices": [[t, p] for t, p in zip(timestamps, prices)],
+        "market_caps": [[t, p * 1000] for t, p in zip(timestamps, prices)],
+        "total_volumes": [[t, 5.0] for t in timestamps],
+    }
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(7)
+    return PriceSeries.from_market_chart(market_chart((100 + np.cumsum(rng.normal(size=2000))).tolist()))
+
+
+def test_indicators_match_reference_implementations():
+    """Test the vectorized indicators against straightforward loops."""
+    values = np.random.default_rng(1).uniform(50, 150, size=5000)
+    expected_ema = [values[0]]
+    alpha = 2 / 21
+    for value in values[1:]:
+        expected_ema.append(alpha * value + (1 - alpha) * expected_ema[-1])
+    np.testing.assert_allclose(ema(values, 20), expected_ema, rtol=1e-9)
+    np.testing.assert_allclose(sma(values, 20)[19:], [values[i - 19:i + 1].mean() for i in range(19, 5000)])
+    assert np.isnan(sma(values, 20)[:19]).all()
+    assert drawdown(np.array([1.0, 2.0, 1.0, 3.0])).tolist() == [0.0, 0.0, -50.0, 0.0]
+
+
+def test_downsampling(series):
+    """Test that LTTB keeps the endpoints and spikes, and OHLC buckets cover every point."""
+    spiked = series.prices.copy()
+    spiked[1234] += 50
+    indices = lttb_indices(series.timestamps, spiked, 200)
+    assert len(indices) == 200 and indices[0] == 0 and indices[-1] == len(series) - 1
+    assert np.all(np.diff(indices) > 0)
+    assert 1234 in indices
+
+    starts, opens, highs, lows, closes, last = ohlc_buckets(series.timestamps, series.prices, 50)
+    assert len(starts) == 50
+    assert highs.max() == series.prices.max() and lows.min() == series.prices.min()
+    assert opens[0] == series.prices[0] and closes[-1] == series.prices[-1]
+
+
+def test_historical_endpoint_downsamples_and_computes_indicators(mocker, series):
+    """Test /crypto/historical with server-side downsampling, indicators and summary."""
+    mocker.patch(
+        'ciyexa_backend.services.crypto_data_service.CryptoDataService.get_price_series',
+        new_callable=AsyncMock, return_value=series,
+    )
+    client = TestClient(app)
+    response = client.get("/api/v1/crypto/historical/bitcoin?days=90&points=100&method=ohlc&indicators=sma,drawdown&summary=true")
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["prices"]) == len(body["ohlc"]) == len(body["market_caps"]) == 100
+    assert len(body["ohlc"][0]) == 5
+    assert set(body["indicators"]) == {"sma", "drawdown"}
+    assert body["summary"]["points"] == 2000
+    assert body["summary"]["end_price"] == pytest.approx(series.prices[-1])
+
+    response = client.get("/api/v1/crypto/historical/bitcoin?indicators=rsi")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_parsed_series_is_reused_while_cached(mocker):
+    """Test that cache hits return the already-parsed arrays instead of re-parsing the payload."""
+    service = CryptoDataService()
+    make_request = mocker.patch.object(service, "_make_request", new_callable=AsyncMock, return_value=market_chart([1.0, 2.0, 3.0]))
+    first = await service.get_price_series("bitcoin", days=7)
+    second = await service.get_price_series("bitcoin", days=7)
+    assert first is second
+    assert first.prices.tolist() == [1.0, 2.0, 3.0]
+    make_request.assert_awaited_once()
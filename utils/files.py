@@ -0,0 +1,13 @@
+import os
+import stat
+
+
+def owned_privately(st: os.stat_result) -> bool:
+    """
+    Whether a file or directory belongs to this user and no other user can write to it, i.e. its
+    contents can be trusted as this service's own. Always False where ownership cannot be checked
+    this way (Windows).
+    """
+    if not hasattr(os, "getuid"):
+        return False
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
@@ -1,14 +1,204 @@
+import atexit
+import copy
+import json
 import logging
+import queue
+import random
+import re
 import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, TextIO, Tuple
+from ciyexa_backend.core.config import settings
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(request_id)s - %(message)s"
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$") # Accepted client-supplied request ids
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_listener: Optional[QueueListener] = None
+_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the id of the request being handled ("-" outside requests)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a share of the INFO and DEBUG records of chosen loggers. `rates` maps a logger
+    name (or a parent's name) to the fraction kept; warnings and errors are never sampled.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.dropped = 0
+        self._rate_by_logger: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._rate_by_logger.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._rate_by_logger[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with the request id and any exception traceback."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to a bounded queue drained by a QueueListener thread, so the event loop never
+    waits on stdout. Records that do not fit in a full queue are dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments here, while they still hold their current values, but leave the
+        # formatting (timestamps, JSON encoding) to the listener thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def build_queue_logging(
+    stream: TextIO = None,
+    log_format: str = None,
+    sampling_rates: Dict[str, float] = None,
+    queue_size: int = None,
+) -> Tuple[NonBlockingQueueHandler, QueueListener]:
+    """Creates the queue handler for the loggers and the (not yet started) listener writing to `stream`."""
+    log_format = log_format or settings.LOG_FORMAT
+    if log_format not in ("text", "json"):
+        raise ValueError(f"Unknown LOG_FORMAT '{log_format}'. Expected 'text' or 'json'.")
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JSONFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size or settings.LOG_QUEUE_SIZE))
+    handler.addFilter(RequestContextFilter())
+    handler.addFilter(SamplingFilter(settings.LOG_SAMPLING_RATES if sampling_rates is None else sampling_rates))
+    return handler, QueueListener(handler.queue, output, respect_handler_level=True)
+
+
+def setup_logging() -> QueueListener:
+    """
+    Routes the root logger through a queue to a background thread writing to stdout.
+    Safe to call more than once; the listener is stopped (and the queue flushed) at exit.
+    """
+    global _handler, _listener
+    if _listener is not None:
+        return _listener
+    _handler, _listener = build_queue_logging()
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(settings.LOG_LEVEL)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Writes out queued records and stops the listener thread."""
+    global _handler, _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().removeHandler(_handler)
+    _handler = _listener = None
+
+
+def logging_stats() -> Dict[str, int]:
+    """Records dropped because the queue was full or by sampling since setup_logging()."""
+    if _handler is None:
+        return {"dropped": 0, "sampled_out": 0, "queued": 0}
+    sampling = next(f for f in _handler.filters if isinstance(f, SamplingFilter))
+    return {"dropped": _handler.dropped, "sampled_out": sampling.dropped, "queued": _handler.queue.qsize()}
+
+
+class RequestIdMiddleware:
+    """
+    Pure ASGI middleware giving every HTTP request an id for its log records: the client's
+    X-Request-ID header if it is a plausible id, otherwise a new one. The id is echoed back in
+    the response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.LOG_REQUEST_ID_HEADER.lower().encode()
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                candidate = value.decode("latin-1")
+                request_id = candidate if REQUEST_ID_RE.match(candidate) else None
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+
+        async def send_with_id(message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (self.header, request_id.encode())]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
 
-def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
 
 def get_logger(name: str):
     return logging.getLogger(name)